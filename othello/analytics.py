@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Statistics about the finished games, computed with NumPy.
+
+The final boards, scores and move logs of all the games are loaded at once
+into arrays, and every statistic is computed with array operations over all
+the games instead of looping over them:
+
+- heatmaps: how often every square ends with a white or black disc.
+- openings: the most played sequences of the first OPENING_PLIES moves.
+- players: average final disc differential of every player.
+- mobility: average amount of moves the player to move had, by ply.
+"""
+from django.core.cache import cache
+from othello import batch
+from othello.batch import check_numpy, np
+from othello.models import Game, Move, Player, INIT_BOARD, WHITE, BLACK
+
+OPENING_PLIES = 4
+TOP_OPENINGS = 10
+# A game can't have more moves than this (60 empty squares at the start)
+MAX_PLIES = 60
+
+CACHE_KEY = 'othello.analytics.report'
+# Seconds the report of the /analytics endpoint is reused
+CACHE_TIMEOUT = 10 * 60
+
+
+def finished_games(games=None):
+    if games is None:
+        games = Game.objects.all()
+    return games.filter(winner__isnull=False)
+
+
+def load_boards(games):
+    """
+    Returns a N x 64 array with the final board of the games
+    """
+    boards = list(games.values_list('board', flat=True).iterator())
+    cells = np.frombuffer(str(''.join(boards)), dtype=np.uint8) - ord('0')
+    return cells.reshape(-1, 64)
+
+
+def load_moves(games):
+    """
+    Returns a N x MAX_PLIES array with the square (row * 8 + column) of
+    every move of the games, and another one with the color that made it.
+    Both have -1 after the last move of each game
+    """
+    moves = Move.objects.filter(game__in=games.values('id'))\
+        .order_by('game', 'id')\
+        .values_list('game', 'color', 'row', 'column')
+    moves = np.array(list(moves.iterator()), dtype=np.int64).reshape(-1, 4)
+    ids, starts, game = np.unique(moves[:, 0], return_index=True,
+                                  return_inverse=True)
+    # Position of every move inside its game
+    ply = np.arange(len(moves)) - starts[game]
+
+    squares = np.empty((len(ids), MAX_PLIES), dtype=np.int8)
+    squares.fill(-1)
+    colors = squares.copy()
+    squares[game, ply] = moves[:, 2] * 8 + moves[:, 3]
+    colors[game, ply] = moves[:, 1]
+    return squares, colors
+
+
+def heatmaps(cells):
+    """
+    Returns the fraction of the games that ended with a white disc, and with
+    a black one, on every square (as 8 x 8 arrays)
+    """
+    if not len(cells):
+        return np.zeros((8, 8)), np.zeros((8, 8))
+    white = (cells == WHITE).mean(axis=0).reshape(8, 8)
+    black = (cells == BLACK).mean(axis=0).reshape(8, 8)
+    return white, black
+
+
+def openings(squares, plies=OPENING_PLIES, top=TOP_OPENINGS):
+    """
+    Returns the `top` most played sequences of the first `plies` moves, as
+    a list of (squares, games)
+    """
+    squares = squares[(squares[:, :plies] >= 0).all(axis=1), :plies]
+    # Every sequence as a single number, with one base-64 digit per move
+    keys = squares.astype(np.int64).dot(64 ** np.arange(plies))
+    keys, counts = np.unique(keys, return_counts=True)
+    result = []
+    for i in np.argsort(-counts, kind='mergesort')[:top]:
+        sequence = (keys[i] // 64 ** np.arange(plies)) % 64
+        result.append((sequence.tolist(), int(counts[i])))
+    return result
+
+
+def differentials(player1, player2, score1, score2):
+    """
+    Returns the ids of the players, how many games they played and their
+    average final disc differential
+    """
+    players = np.concatenate((player1, player2))
+    diff = np.concatenate((score1 - score2, score2 - score1))
+    games = np.bincount(players)
+    total = np.bincount(players, weights=diff)
+    ids = np.flatnonzero(games)
+    return ids, games[ids], total[ids] / games[ids]
+
+
+def mobility(squares, colors):
+    """
+    Returns the average amount of moves available to the player to move at
+    every ply (only the plies that some game reached)
+    """
+    white, black = batch.from_boards([INIT_BOARD] * len(squares))
+    result = []
+    for ply in xrange(MAX_PLIES):
+        playing = np.flatnonzero(squares[:, ply] >= 0)
+        if not len(playing):
+            break
+        is_white = colors[playing, ply] == WHITE
+        w, b = white[playing], black[playing]
+        own = np.where(is_white, w, b)
+        opp = np.where(is_white, b, w)
+        result.append(batch.count(batch.legal_moves(own, opp)).mean())
+
+        move = np.left_shift(np.uint64(1),
+                             squares[playing, ply].astype(np.uint64))
+        own, opp = batch.play(own, opp, move)
+        white[playing] = np.where(is_white, own, opp)
+        black[playing] = np.where(is_white, opp, own)
+    return result
+
+
+def report(games=None):
+    """
+    Returns all the statistics about the finished `games` (all the
+    finished games if not provided)
+    """
+    check_numpy()
+    games = finished_games(games)
+
+    white, black = heatmaps(load_boards(games))
+
+    scores = np.array(list(games.values_list(
+        'player1', 'player2', 'score_player1', 'score_player2').iterator()),
+        dtype=np.int64).reshape(-1, 4)
+    ids, played, average = differentials(*scores.T)
+    names = dict(Player.objects.filter(id__in=ids.tolist())
+                 .values_list('id', 'name'))
+    players = {}
+    for id, n, diff in zip(ids.tolist(), played.tolist(), average.tolist()):
+        players[names[id]] = {'games': n, 'differential': round(diff, 2)}
+
+    squares, colors = load_moves(games)
+
+    return {
+        'games': len(scores),
+        'heatmap_white': np.round(white, 4).tolist(),
+        'heatmap_black': np.round(black, 4).tolist(),
+        'openings': [{'moves': ['(%d,%d)' % divmod(s, 8) for s in sequence],
+                      'games': n}
+                     for sequence, n in openings(squares)],
+        'players': players,
+        'mobility': [round(m, 2) for m in mobility(squares, colors)],
+    }
+
+
+def cached_report():
+    """
+    Same as `report()`, reusing the last one for CACHE_TIMEOUT seconds
+    """
+    result = cache.get(CACHE_KEY)
+    if result is None:
+        result = report()
+        cache.set(CACHE_KEY, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Move generation for many boards at once, using NumPy.
+
+The boards are arrays of bitboards (numpy.uint64) with the same layout used
+by othello.solver: the bit `row * 8 + column` is the square in the same
+position of `Game.board`. Every function works on whole arrays, applying
+the operation to all the boards at the same time.
+
+`generate()` is the entry point for callers that have boards in any of the
+supported forms:
+
+- a N x 2 array of bitboards (white discs, black discs).
+- a N x 64 array with the squares of the boards (BLANK, WHITE or BLACK).
+- a list of `Game.board`.
+
+The results are the same the rules of `Game` give for each board.
+"""
+from othello.models import BLACK, WHITE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def check_numpy():
+    if np is None:
+        raise Exception('NumPy is required for this. Install it with: '
+                        'pip install numpy')
+
+
+if np is not None:
+    FULL = np.uint64(0xFFFFFFFFFFFFFFFF)
+    NOT_FIRST_COLUMN = np.uint64(0xFEFEFEFEFEFEFEFE)
+    NOT_LAST_COLUMN = np.uint64(0x7F7F7F7F7F7F7F7F)
+
+    # See othello.solver
+    LEFT_DIRECTIONS = ((np.uint64(1), NOT_FIRST_COLUMN),
+                       (np.uint64(8), FULL),
+                       (np.uint64(9), NOT_FIRST_COLUMN),
+                       (np.uint64(7), NOT_LAST_COLUMN))
+    RIGHT_DIRECTIONS = ((np.uint64(1), NOT_LAST_COLUMN),
+                        (np.uint64(8), FULL),
+                        (np.uint64(7), NOT_FIRST_COLUMN),
+                        (np.uint64(9), NOT_LAST_COLUMN))
+
+    # Value of the bit of every square
+    SQUARES = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+    # Amount of bits set in every byte
+    POPCOUNT = np.array([bin(i).count('1') for i in xrange(256)],
+                        dtype=np.uint8)
+
+
+def from_cells(cells):
+    """
+    Returns the (white, black) bitboards of a N x 64 array with the squares
+    of N boards (BLANK, WHITE or BLACK)
+    """
+    check_numpy()
+    cells = np.asarray(cells)
+    white = (cells == WHITE).astype(np.uint64).dot(SQUARES)
+    black = (cells == BLACK).astype(np.uint64).dot(SQUARES)
+    return white, black
+
+
+def from_boards(boards):
+    """
+    Returns the (white, black) bitboards of a list of `Game.board`
+    """
+    check_numpy()
+    cells = np.frombuffer(str(''.join(boards)), dtype=np.uint8) - ord('0')
+    return from_cells(cells.reshape(-1, 64))
+
+
+def to_boards(white, black):
+    """
+    Returns the `Game.board` of every pair of bitboards
+    """
+    check_numpy()
+    cells = np.zeros((len(white), 64), dtype=np.uint8)
+    cells[(white[:, None] & SQUARES) != 0] = WHITE
+    cells[(black[:, None] & SQUARES) != 0] = BLACK
+    cells += ord('0')
+    return [cells[i].tostring() for i in xrange(len(cells))]
+
+
+def to_bitboards(boards):
+    """
+    Returns the (white, black) bitboards of `boards`, in any of the forms
+    described at the beginning of this module
+    """
+    check_numpy()
+    if not isinstance(boards, np.ndarray):
+        return from_boards(boards)
+    if boards.ndim != 2 or boards.shape[1] not in (2, 64):
+        raise Exception('Invalid boards shape %s. It should be (N, 2) or '
+                        '(N, 64)' % (boards.shape,))
+    if boards.shape[1] == 64:
+        return from_cells(boards)
+    boards = boards.astype(np.uint64)
+    return boards[:, 0], boards[:, 1]
+
+
+def count(bits):
+    """
+    Returns the amount of discs in every bitboard
+    """
+    check_numpy()
+    bits = np.ascontiguousarray(bits, dtype=np.uint64)
+    return POPCOUNT[bits.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def legal_moves(own, opp):
+    """
+    Returns the squares where the owners of `own` can play
+    """
+    check_numpy()
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for d, mask in LEFT_DIRECTIONS:
+        o = opp & mask
+        x = (own << d) & o
+        for i in xrange(5):
+            x |= (x << d) & o
+        moves |= (x << d) & mask
+    for d, mask in RIGHT_DIRECTIONS:
+        o = opp & mask
+        x = (own >> d) & o
+        for i in xrange(5):
+            x |= (x >> d) & o
+        moves |= (x >> d) & mask
+    return moves & empty
+
+
+def flips(own, opp, move):
+    """
+    Returns the discs of `opp` flipped when playing on `move` (one square
+    per board)
+    """
+    check_numpy()
+    flipped = np.zeros(np.broadcast(own, opp, move).shape, dtype=np.uint64)
+    zero = np.uint64(0)
+    for directions, shift in ((LEFT_DIRECTIONS, np.left_shift),
+                              (RIGHT_DIRECTIONS, np.right_shift)):
+        for d, mask in directions:
+            o = opp & mask
+            # The line of discs of the opponent starting next to the move
+            line = shift(move, d) & o
+            for i in xrange(5):
+                line |= shift(line, d) & o
+            # It's flipped if it ends with a disc of the player
+            closed = (shift(line, d) & mask & own) != zero
+            flipped |= np.where(closed, line, zero)
+    return flipped
+
+
+def play(own, opp, move):
+    """
+    Returns the (own, opp) bitboards after playing on `move`
+    """
+    flipped = flips(own, opp, move)
+    return own | move | flipped, opp & ~flipped
+
+
+def all_flips(own, opp):
+    """
+    Returns a N x 64 array with the discs of `opp` flipped when playing on
+    every square (0 where the move isn't valid)
+    """
+    check_numpy()
+    result = np.zeros((len(own), 64), dtype=np.uint64)
+    # Only the valid moves are played
+    boards, squares = np.nonzero(
+        (legal_moves(own, opp)[:, None] & SQUARES) != 0)
+    result[boards, squares] = flips(own[boards], opp[boards],
+                                    SQUARES[squares])
+    return result
+
+
+def generate(boards, color):
+    """
+    Returns the valid moves of the player with `color` (a single color, or
+    one for each board) in every board:
+
+    - a bitboard with the squares where it can play in each board.
+    - a N x 64 array with the discs flipped by playing on each square.
+    - a N x 2 array with the amount of (white, black) discs of each board.
+    """
+    white, black = to_bitboards(boards)
+    is_white = np.asarray(color) == WHITE
+    own = np.where(is_white, white, black)
+    opp = np.where(is_white, black, white)
+    discs = np.column_stack((count(white), count(black)))
+    return legal_moves(own, opp), all_flips(own, opp), discs
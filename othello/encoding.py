@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Encodings of the responses of the game API.
+
+Clients choose one with the Accept header:
+
+- application/json (default)
+- application/x-msgpack, if the msgpack package is installed
+- application/x-othello, a fixed binary layout:
+
+    1 byte     flags (see below)
+    16 bytes   board, if HAS_BOARD. 2 bits per square, the first square in
+               the most significant bits
+    1 byte     length of the game id, if HAS_GAME
+    n bytes    game id (UTF-8)
+    2 bytes    length of the error (big endian), if HAS_ERROR
+    n bytes    error (UTF-8)
+
+  STATUS is set when the status is True (is_turn) or 'succeed' (move).
+"""
+import binascii
+import struct
+
+from django.utils import simplejson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+BINARY = 'application/x-othello'
+
+HAS_ERROR = 1
+HAS_STATUS = 2
+STATUS = 4
+HAS_BOARD = 8
+HAS_GAME = 16
+
+# Fields of the responses that can be encoded with the binary layout
+BINARY_FIELDS = frozenset(['error', 'status', 'board', 'game'])
+
+
+def _quality(params):
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def negotiate(accept):
+    """
+    Returns the content type to use for the Accept header `accept`: the
+    one of the supported types with the highest `q` (the first one on a
+    tie), or JSON if the header doesn't accept any of them
+    """
+    best, best_quality = JSON, 0.0
+    for media_type in accept.split(','):
+        params = media_type.split(';')
+        media_type = params[0].strip()
+        if media_type in (JSON, 'application/*', '*/*'):
+            content_type = JSON
+        elif media_type == BINARY or \
+                media_type == MSGPACK and msgpack is not None:
+            content_type = media_type
+        else:
+            continue
+        quality = _quality(params[1:])
+        if quality > best_quality:
+            best, best_quality = content_type, quality
+    return best
+
+
+def pack_board(board):
+    return binascii.unhexlify('%032x' % int(board, 4))
+
+
+def unpack_board(data):
+    n = int(binascii.hexlify(data), 16)
+    return ''.join(str((n >> (2 * i)) & 3) for i in xrange(63, -1, -1))
+
+
+def encode_binary(data):
+    flags = 0
+    parts = []
+    if 'status' in data:
+        flags |= HAS_STATUS
+        if data['status'] in (True, 'succeed'):
+            flags |= STATUS
+    if 'board' in data:
+        flags |= HAS_BOARD
+        parts.append(pack_board(data['board']))
+    if 'game' in data:
+        flags |= HAS_GAME
+        game = data['game'].encode('utf-8')
+        parts.append(struct.pack('>B', len(game)) + game)
+    if data.get('error'):
+        flags |= HAS_ERROR
+        error = unicode(data['error']).encode('utf-8')
+        parts.append(struct.pack('>H', len(error)) + error)
+    return chr(flags) + ''.join(parts)
+
+
+def decode_binary(content):
+    """
+    Returns the data encoded by `encode_binary`. The status is returned as
+    a boolean
+    """
+    flags = ord(content[0])
+    i = 1
+    data = {}
+    if flags & HAS_STATUS:
+        data['status'] = bool(flags & STATUS)
+    if flags & HAS_BOARD:
+        data['board'] = unpack_board(content[i:i + 16])
+        i += 16
+    if flags & HAS_GAME:
+        length = struct.unpack('>B', content[i])[0]
+        data['game'] = content[i + 1:i + 1 + length].decode('utf-8')
+        i += 1 + length
+    if flags & HAS_ERROR:
+        length = struct.unpack('>H', content[i:i + 2])[0]
+        data['error'] = content[i + 2:i + 2 + length].decode('utf-8')
+    return data
+
+
+def encode(data, accept=''):
+    """
+    Returns (content, content type) of `data` in the encoding chosen by the
+    Accept header `accept` (JSON if none of the accepted ones can be used)
+    """
+    content_type = negotiate(accept)
+    if content_type == BINARY and set(data) <= BINARY_FIELDS:
+        return encode_binary(data), BINARY
+    if content_type == MSGPACK:
+        return msgpack.packb(data), MSGPACK
+    return simplejson.dumps(data), JSON
+
+
+def decode(content, content_type):
+    """
+    Returns the data of a response created with `encode`
+    """
+    content_type = content_type.split(';')[0].strip()
+    if content_type == BINARY:
+        return decode_binary(content)
+    if content_type == MSGPACK:
+        return msgpack.unpackb(content)
+    return simplejson.loads(content)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming export of the stored games.
+
+Games are read in chunks of CHUNK_SIZE (ordered by id), together with the
+moves of each chunk, so memory usage doesn't depend on how many games are
+stored.
+"""
+import csv
+from datetime import datetime
+from itertools import groupby
+
+from django.db.models import Q
+from django.utils import simplejson
+from othello.models import Game, Move
+
+CHUNK_SIZE = 500
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+CONTENT_TYPES = {NDJSON: 'application/x-ndjson',
+                 CSV: 'text/csv'}
+
+CSV_HEADER = ('game', 'player1', 'player2', 'score_player1', 'score_player2',
+              'winner', 'board', 'moves')
+
+
+def parse_date(value):
+    """
+    Parses a YYYY-MM-DD date. Returns None if no value is provided
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise Exception('Invalid date %s. It should be: YYYY-MM-DD' % value)
+
+
+def filter_games(since=None, until=None, player=None):
+    """
+    Returns the games to be exported
+
+    The date range is applied to the last time the turn changed in the game
+    (which is when the game finished, for finished games)
+    """
+    games = Game.objects.all()
+    if since is not None:
+        games = games.filter(timeout_turn_change__gte=since)
+    if until is not None:
+        games = games.filter(timeout_turn_change__lt=until)
+    if player:
+        games = games.filter(Q(player1__name=player) |
+                             Q(player2__name=player))
+    return games
+
+
+def iter_games(games, chunk_size=CHUNK_SIZE):
+    """
+    Yields (game, moves) for every game in `games`
+
+    `moves` is a list of (color, row, column) in the order they were made
+    """
+    games = games.select_related('player1', 'player2', 'winner')\
+        .order_by('id')
+    last_id = 0
+    while 1:
+        chunk = list(games.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+
+        moves = Move.objects.filter(game__in=[g.id for g in chunk])\
+            .order_by('game', 'id')\
+            .values_list('game', 'color', 'row', 'column')
+        moves_by_game = {}
+        for game_id, game_moves in groupby(moves, lambda m: m[0]):
+            moves_by_game[game_id] = [m[1:] for m in game_moves]
+
+        for g in chunk:
+            yield g, moves_by_game.get(g.id, [])
+        last_id = chunk[-1].id
+
+
+def game_record(game, moves):
+    return {
+        'game': unicode(game),
+        'player1': game.player1.name if game.player1_id else None,
+        'player2': game.player2.name if game.player2_id else None,
+        'score_player1': game.score_player1,
+        'score_player2': game.score_player2,
+        'winner': game.winner.name if game.winner_id else None,
+        'board': game.board,
+        'moves': [list(m) for m in moves],
+    }
+
+
+class _Echo(object):
+    """
+    File-like object that returns what is written on it, so `csv.writer`
+    can be used to format one row at a time
+    """
+    def write(self, value):
+        return value
+
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def export_games(games, format=NDJSON, chunk_size=CHUNK_SIZE):
+    """
+    Returns an iterator over the lines of the export of `games`
+    """
+    if format not in CONTENT_TYPES:
+        raise Exception('Invalid format %s. It should be one of: %s' %
+                        (format, ', '.join(sorted(CONTENT_TYPES))))
+    return _export_lines(games, format, chunk_size)
+
+
+def _export_lines(games, format, chunk_size):
+    if format == CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(CSV_HEADER)
+
+    for game, moves in iter_games(games, chunk_size):
+        record = game_record(game, moves)
+        if format == CSV:
+            record['moves'] = simplejson.dumps(record['moves'])
+            yield writer.writerow([_encode(record[f]) for f in CSV_HEADER])
+        else:
+            yield simplejson.dumps(record) + '\n'
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Server-Sent Events feed of the moves made in the games being played.
+
+Every spectator gets its own bounded queue of pending events. If a
+spectator can't keep up, its oldest pending events are discarded: each
+event carries the whole board, so it catches up with the next one it
+receives.
+
+The events of the moves (and of the turns lost and the games finished) are
+delivered right away to the spectators connected to the same process.
+The changes made by other processes (eg. the game workers) are found by
+reading the watched games every POLL_INTERVAL seconds.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from django.utils import simplejson
+from othello.models import Game, WHITE, BLACK
+from othello.signals import game_finished, move_made, turn_lost
+
+MAX_PENDING_EVENTS = 32
+# Seconds without events after which a comment is sent to keep the
+# connection open
+KEEPALIVE_INTERVAL = 15
+# Seconds between the reads of the watched games
+POLL_INTERVAL = 1.0
+
+
+def game_event(game, move=None):
+    """
+    Returns the event describing the current state of `game`
+    """
+    turn = None
+    if not game.game_finished():
+        turn = (game.player1 if game.player1_turn else game.player2).name
+    return {
+        'game': unicode(game),
+        'move': list(move) if move else None,
+        'board': game.board,
+        'turn': turn,
+        'score_player1': game.board.count(str(WHITE)),
+        'score_player2': game.board.count(str(BLACK)),
+        'winner': game.winner.name if game.winner is not None else None,
+    }
+
+
+def _event_key(event):
+    """
+    Returns what changes in a game between two events of it
+    """
+    return event['board'], event['turn'], event['winner']
+
+
+def sse_message(event):
+    return 'event: move\ndata: %s\n\n' % simplejson.dumps(event)
+
+
+class Subscription(object):
+    def __init__(self, feed, game_id=None, max_pending=MAX_PENDING_EVENTS):
+        self.feed = feed
+        self.game_id = game_id
+        self.pending = deque(maxlen=max_pending)
+        # Amount of events discarded because the spectator was too slow
+        self.dropped = 0
+        self._condition = threading.Condition()
+
+    def put(self, event):
+        with self._condition:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(event)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Returns the next event, or None if none arrived within `timeout`
+        seconds
+        """
+        with self._condition:
+            if not self.pending:
+                self._condition.wait(timeout)
+            if self.pending:
+                return self.pending.popleft()
+            return None
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class MoveFeed(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Subscriptions by game id. None is used for the ones watching
+        # all the games
+        self._subscriptions = {}
+
+    def subscribe(self, game_id=None, max_pending=MAX_PENDING_EVENTS):
+        s = Subscription(self, game_id, max_pending)
+        with self._lock:
+            self._subscriptions.setdefault(game_id, []).append(s)
+        return s
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.game_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.game_id, None)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = self._subscriptions.get(event['game'], []) + \
+                self._subscriptions.get(None, [])
+        for s in subscriptions:
+            s.put(event)
+
+    def stream(self, game_id=None, keepalive=KEEPALIVE_INTERVAL,
+               poll=POLL_INTERVAL):
+        """
+        Yields the SSE messages for the spectator of `game_id` (or of all
+        the active games, if not provided)
+
+        The current board of the games is sent first. When watching a single
+        game, the stream ends once the game finishes.
+        """
+        subscription = self.subscribe(game_id)
+        # Game id: (key, time) of the last event sent, so the changes seen
+        # both as events and when reading the games are only sent once
+        sent = {}
+
+        def fresh(event):
+            key = _event_key(event)
+            if sent.get(event['game'], (None,))[0] == key:
+                return False
+            sent[event['game']] = (key, time.time())
+            return True
+
+        try:
+            polled = datetime.now()
+            for event in self._read_games(game_id):
+                fresh(event)
+                yield sse_message(event)
+                if game_id is not None and event['winner']:
+                    return
+
+            last_sent = last_poll = time.time()
+            while 1:
+                events = []
+                event = subscription.get(min(keepalive, poll))
+                if event is not None:
+                    events.append(event)
+                if time.time() - last_poll >= poll:
+                    last_poll = time.time()
+                    # The games changed by other processes since the last
+                    # read (with a margin for the clocks of the processes)
+                    since = polled - timedelta(seconds=poll)
+                    polled = datetime.now()
+                    events.extend(self._read_games(game_id, since))
+                    # The finished games aren't read again after the margin
+                    for id, (key, seen) in sent.items():
+                        if key[2] and last_poll - seen > 3 * poll:
+                            del sent[id]
+
+                events = [e for e in events if fresh(e)]
+                for event in events:
+                    yield sse_message(event)
+                    if game_id is not None and event['winner']:
+                        return
+                if events:
+                    last_sent = time.time()
+                elif time.time() - last_sent >= keepalive:
+                    last_sent = time.time()
+                    yield ': keepalive\n\n'
+        finally:
+            subscription.close()
+
+    def _read_games(self, game_id=None, since=None):
+        """
+        Returns the events of the current state of the game `game_id` (or
+        of the active games, or the ones whose turn changed since `since`)
+        """
+        if game_id is not None:
+            return [game_event(Game.objects.get_by_id(game_id))]
+        if since is None:
+            games = Game.objects.active()
+        else:
+            games = Game.objects.filter(timeout_turn_change__gte=since)
+        return [game_event(g) for g in
+                games.select_related('player1', 'player2', 'winner')]
+
+
+feed = MoveFeed()
+
+
+def publish_move(sender, game, player, move, **kwargs):
+    feed.publish(game_event(game, move))
+
+
+def publish_turn_lost(sender, game, **kwargs):
+    # The games finished by it are published by `publish_finished`
+    if not game.game_finished():
+        feed.publish(game_event(game))
+
+
+def publish_finished(sender, game, reason, **kwargs):
+    # The games finished by a move are published by `publish_move`
+    if reason != 'end':
+        feed.publish(game_event(game))
+
+move_made.connect(publish_move, dispatch_uid='othello.feed.publish_move')
+turn_lost.connect(publish_turn_lost,
+                  dispatch_uid='othello.feed.publish_turn_lost')
+game_finished.connect(publish_finished,
+                      dispatch_uid='othello.feed.publish_finished')
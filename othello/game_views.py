@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Views of the game API (the ones served by the game workers, see
+worker_urls.py). They only need the games, so this module doesn't import
+the ones of the other views.
+"""
+from django.http import HttpResponse
+from django.utils import simplejson
+from othello.encoding import encode
+from othello.lobby import lobby
+from othello.models import Game
+from othello.tokens import issue_token
+
+
+def connect(request):
+    if request.method != 'GET':
+        return game_response(request, error='GET method should be used '
+                                             'instead of POST')
+    if not 'p1' in request.GET or not 'p2' in request.GET:
+        return game_response(
+            request,
+            error='Incorrect parameters. It should be: p1=juan&p2=pedro'
+        )
+    p1 = request.GET['p1']
+    p2 = request.GET['p2']
+    player = request.GET.get('player')
+    # Checked before connecting, so no game is created or started for it
+    if player and player not in (p1, p2):
+        return game_response(request, error='The player %s is not playing '
+                                            'in this game' % player)
+    try:
+        game_id = Game.objects.connect(p1, p2)
+        # The player that connects gets its token
+        if player:
+            token = issue_token(game_id, player)
+            return game_response(request, game=game_id, token=token)
+    except Exception, e:
+        return game_response(request, error=e.message)
+
+    return game_response(request, game=game_id)
+
+
+def join_lobby(request):
+    if request.method != 'GET':
+        return ajax_response(error='GET method should be used instead of POST')
+    if not 'player' in request.GET:
+        return ajax_response(
+            error='Incorrect parameters. It should be: player=juan'
+        )
+    try:
+        game_id = lobby.join(request.GET['player'],
+                             request.GET.get('band', ''))
+        if game_id is not None:
+            token = issue_token(game_id, request.GET['player'])
+    except Exception, e:
+        return ajax_response(error=e.message)
+
+    if game_id is None:
+        return ajax_response(status='waiting')
+    return ajax_response(game=game_id, token=token)
+
+
+def get_board(request):
+    if request.method != 'GET':
+        return game_response(request, error='GET method should be used '
+                                             'instead of POST')
+    if not 'game' in request.GET and not 'token' in request.GET:
+        return game_response(
+            request,
+            error='Incorrect parameters. It should be: game=juan-pedro-1'
+        )
+    try:
+        since = parse_since(request)
+        ply = parse_ply(request)
+        if 'token' in request.GET:
+            g = Game.objects.get_by_token(request.GET['token'])
+        else:
+            g = Game.objects.get_by_id(request.GET['game'])
+        if ply is not None:
+            # Imported here because it needs the solver, which most calls
+            # don't
+            from othello.history import board_at
+            board = board_at(g, ply)
+    except Exception, e:
+        return game_response(request, error=e.message)
+
+    if ply is not None:
+        return game_response(request, board=board)
+    if since is not None:
+        return game_response(request, **g.board_delta(since))
+    return game_response(request, board=g.board)
+
+
+def is_turn(request):
+    if request.method != 'GET':
+        return game_response(request, error='GET method should be used '
+                                             'instead of POST')
+    if not 'token' in request.GET and (not 'game' in request.GET or
+                                       not 'player' in request.GET):
+        return game_response(
+            request,
+            error='Incorrect parameters. It should be: '
+                  'game=juan-pedro-1&player=pedro'
+        )
+
+    try:
+        since = parse_since(request)
+        if 'token' in request.GET:
+            result = Game.objects.is_turn_by_token(request.GET['token'],
+                                                   since)
+        else:
+            result = Game.objects.is_turn(request.GET['game'],
+                                          request.GET['player'], since)
+        if since is not None:
+            return game_response(request, status=result[0], **result[1])
+        return game_response(request, status=result[0], board=result[1])
+    except Exception, e:
+        return game_response(request, error=e.message)
+
+
+def move(request):
+    if request.method != 'POST':
+        return game_response(request, error='POST method should be used '
+                                             'instead of GET',
+                             status='failed')
+    if not 'move' in request.POST or not 'token' in request.POST and (
+            not 'game' in request.POST or not 'player' in request.POST):
+        return game_response(
+            request,
+            error='Incorrect parameters. It should be: '
+                  'game=juan-pedro-1&player=juan&move=(x,y)'
+        )
+
+    try:
+        if 'token' in request.POST:
+            Game.objects.move_by_token(request.POST['token'],
+                                       request.POST['move'])
+        else:
+            Game.objects.move(
+                request.POST['game'],
+                request.POST['player'],
+                request.POST['move']
+            )
+        # If it doesn't throw any exception, then it succeed!
+        return game_response(request, status='succeed')
+    except Exception, e:
+        return game_response(request, error=e.message, status='failed')
+
+
+def parse_since(request):
+    """
+    Returns the sequence of the last board seen by the client, if provided
+    """
+    since = request.GET.get('since')
+    if since is None:
+        return None
+    try:
+        return int(since)
+    except ValueError:
+        raise Exception('Invalid sequence %s. It should be a number' % since)
+
+
+def parse_ply(request):
+    """
+    Returns the amount of moves after which the client wants the board, if
+    provided
+    """
+    ply = request.GET.get('ply')
+    if ply is None:
+        return None
+    try:
+        return int(ply)
+    except ValueError:
+        raise Exception('Invalid ply %s. It should be a number' % ply)
+
+
+def game_response(request, error=None, **kwargs):
+    """
+    Same as `ajax_response`, but encoded as the client asks for in the
+    Accept header (see othello.encoding)
+    """
+    d = kwargs
+    if error:
+        d['error'] = error
+    content, content_type = encode(d, request.META.get('HTTP_ACCEPT', ''))
+    response = HttpResponse(content, mimetype=content_type)
+    response['Vary'] = 'Accept'
+    return response
+
+
+def ajax_response(error=None, **kwargs):
+    d = kwargs
+    if error:
+        d['error'] = error
+    response = simplejson.dumps(d)
+    return HttpResponse(response, mimetype='application/json')
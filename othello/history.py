@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Boards of the games after any amount of moves (ply).
+
+The log of the games kept in the database has the board after every
+OTHELLO_SNAPSHOT_INTERVAL moves (see `Move.board`), so a board is rebuilt
+from the last one kept before it, replaying less than that amount of
+moves. The games without them (kept in other stores, imported, or played
+before they were added) are replayed from INIT_BOARD.
+"""
+from othello.models import INIT_BOARD, WHITE, get_store
+from othello.solver import flips, to_bitboards, to_board
+
+
+def replay(board, moves):
+    """
+    Returns the board after playing the (color, row, column) `moves` on
+    `board`
+    """
+    white, black = to_bitboards(board, WHITE)
+    for color, row, column in moves:
+        move = 1 << (row * 8 + column)
+        if color == WHITE:
+            flipped = flips(white, black, move)
+            white, black = white | move | flipped, black & ~flipped
+        else:
+            flipped = flips(black, white, move)
+            white, black = white & ~flipped, black | move | flipped
+    return to_board(white, black, WHITE)
+
+
+def board_at(game, ply):
+    """
+    Returns the board of `game` after `ply` moves
+    """
+    if ply < 0:
+        raise Exception('Invalid ply %d. It should be 0 or more' % ply)
+    if ply == 0:
+        return INIT_BOARD
+    # The current board isn't returned when `ply` is the sequence of the
+    # game: the games being played when the sequence was added have less
+    # than their moves
+    board, snapshot_ply, moves = get_store().get_history(game, ply)
+    if snapshot_ply + len(moves) < ply:
+        raise Exception('The game %s doesn\'t have %d moves' % (game, ply))
+    return replay(board, moves)
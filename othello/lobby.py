@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Matchmaking lobby.
+
+Players join the lobby and are matched with the player that has been
+waiting the longest in the same band, if any. Players who stop polling
+for more than LOBBY_TIMEOUT seconds are dropped from the queue.
+
+The lobby lives in memory, so it needs a single server process: with
+several workers, send all the calls to /lobby to the same one (players
+waiting in different processes are never matched).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from othello.models import Game
+
+# Seconds a waiting player is kept in the queue without calling the lobby
+LOBBY_TIMEOUT = 60
+
+
+class Lobby(object):
+    def __init__(self, timeout=LOBBY_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # band -> {player: (time it joined, last time it called)}, sorted
+        # by the time they joined
+        self._queues = {}
+        # Band where every waiting player is
+        self._bands = {}
+        # Games created for waiting players that they don't know about yet,
+        # as player -> (game id, time it was created). The game id is None
+        # while the game is being created
+        self._matches = {}
+        self.matched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def join(self, player, band=''):
+        """
+        Returns the id of the game `player` has been matched to, or None if
+        it has to keep waiting (and calling this method)
+        """
+        now = time.time()
+        with self._lock:
+            self._expire_matches(now)
+            if player in self._matches:
+                if self._matches[player][0] is None:
+                    # Its game is being created
+                    return None
+                return self._matches.pop(player)[0]
+
+            if player in self._bands:
+                if self._bands[player] == band:
+                    queue = self._queues[band]
+                    queue[player] = (queue[player][0], now)
+                    return None
+                # The player moved to another band
+                self._remove(player)
+
+            queue = self._queues.get(band, {})
+            opponent = self._first_waiting(queue, now)
+            if opponent is None:
+                self._queues.setdefault(band, OrderedDict())[player] = \
+                    (now, now)
+                self._bands[player] = band
+                return None
+
+            wait = now - queue[opponent][0]
+            self._remove(opponent)
+            self._matches[opponent] = (None, now)
+
+        # The game is created without keeping the other players waiting
+        try:
+            game_id = unicode(Game.objects.create_and_start(opponent, player))
+        except:
+            with self._lock:
+                del self._matches[opponent]
+            raise
+        with self._lock:
+            self._matches[opponent] = (game_id, time.time())
+            self.matched += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return game_id
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            self._expire_matches(now)
+            waiting = {}
+            for band, queue in self._queues.iteritems():
+                waiting[band] = len([p for p, (joined, seen) in
+                                     queue.iteritems()
+                                     if now - seen < self.timeout])
+            return {
+                'waiting': sum(waiting.itervalues()),
+                'waiting_by_band': waiting,
+                'matched': self.matched,
+                'average_wait': self.total_wait / self.matched
+                if self.matched else 0.0,
+                'max_wait': self.max_wait,
+            }
+
+    def _first_waiting(self, queue, now):
+        """
+        Returns the player who has been waiting the longest, discarding the
+        ones that stopped calling the lobby
+        """
+        while queue:
+            player = next(iter(queue))
+            if now - queue[player][1] < self.timeout:
+                return player
+            self._remove(player)
+        return None
+
+    def _expire_matches(self, now):
+        """
+        Forgets the games of the players that stopped calling the lobby
+        """
+        for player, (game_id, created) in self._matches.items():
+            if game_id is not None and now - created >= self.timeout:
+                del self._matches[player]
+
+    def _remove(self, player):
+        band = self._bands.pop(player)
+        del self._queues[band][player]
+        if not self._queues[band]:
+            del self._queues[band]
+
+
+lobby = Lobby()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+from django.db.models import get_app, get_models
+
+
+def _literal(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, long)):
+        return str(value)
+    return "'%s'" % unicode(value).replace("'", "''")
+
+
+class Command(NoArgsCommand):
+    help = 'Adds the columns of the othello models missing in a database ' \
+           'created before they were added (syncdb creates them for new ' \
+           'tables)'
+
+    def handle_noargs(self, **options):
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        tables = connection.introspection.table_names()
+        for model in get_models(get_app('othello')):
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            columns = set(c[0] for c in connection.introspection
+                          .get_table_description(cursor, table))
+            for field in model._meta.local_fields:
+                db_type = field.db_type(connection=connection)
+                if field.column in columns or db_type is None:
+                    continue
+                sql = 'ALTER TABLE %s ADD COLUMN %s %s' % (
+                    qn(table), qn(field.column), db_type)
+                if field.null:
+                    sql += ' NULL'
+                else:
+                    sql += ' NOT NULL DEFAULT %s' % \
+                        _literal(field.get_default())
+                cursor.execute(sql)
+                self.stdout.write('%s.%s\n' % (table, field.column))
+        transaction.commit_unless_managed()
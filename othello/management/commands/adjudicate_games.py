@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from othello.models import BLANK, Game
+from othello.solver import MAX_EMPTIES, adjudicate
+
+
+class Command(BaseCommand):
+    help = 'Finishes the games being played with few empty squares left, ' \
+           'with the result they would have if both players played ' \
+           'perfectly'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--max-empties', dest='max_empties', type='int',
+                    default=10,
+                    help='Only games with at most this amount of empty '
+                         'squares (default: 10, maximum: %d)' % MAX_EMPTIES),
+    )
+
+    def handle(self, *args, **options):
+        max_empties = min(options['max_empties'], MAX_EMPTIES)
+        for g in Game.objects.active().iterator():
+            if g.board.count(str(BLANK)) > max_empties:
+                continue
+            adjudicate(g)
+            self.stdout.write('%s: %d-%d\n' % (g, g.score_player1,
+                                               g.score_player2))
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import simplejson
+from othello.analytics import report
+from othello.export import filter_games, parse_date
+
+
+class Command(BaseCommand):
+    help = 'Prints statistics about the finished games as JSON'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--since', dest='since',
+                    help='Only games finished since this date (YYYY-MM-DD)'),
+        make_option('--until', dest='until',
+                    help='Only games finished before this date (YYYY-MM-DD)'),
+        make_option('--player', dest='player',
+                    help='Only games where this player played'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            games = filter_games(since=parse_date(options['since']),
+                                 until=parse_date(options['until']),
+                                 player=options['player'])
+            result = report(games)
+        except Exception, e:
+            raise CommandError(e.message)
+
+        self.stdout.write(simplejson.dumps(result, indent=2) + '\n')
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from othello.models import Game
+from othello.openings import OPENING_PLIES, OpeningBook
+
+
+class Command(BaseCommand):
+    args = '[book file]'
+    help = ('Builds the opening book from the finished games, and saves it '
+            'where the server loads it from (OTHELLO_OPENING_BOOK)')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--plies', dest='plies', type='int',
+                    default=OPENING_PLIES,
+                    help='Moves of every game added to the book'),
+    )
+
+    def handle(self, *args, **options):
+        path = args[0] if args else getattr(settings,
+                                            'OTHELLO_OPENING_BOOK', None)
+        if not path:
+            raise CommandError('Usage: build_openings %s (or set '
+                               'OTHELLO_OPENING_BOOK)' % self.args)
+        book = OpeningBook(options['plies'])
+        try:
+            book.add_games(Game.objects.all())
+            book.save(path)
+        except Exception, e:
+            raise CommandError(e.message or unicode(e))
+        self.stdout.write('%d games, %d positions\n' %
+                          (book.games, len(book.positions)))
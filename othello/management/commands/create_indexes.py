@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import NoArgsCommand
+from django.core.management.color import no_style
+from django.core.management.sql import custom_sql_for_model
+from django.db import connection, transaction
+from django.db.models import Min
+from othello.models import Game, Move
+
+
+class Command(NoArgsCommand):
+    help = 'Creates the indexes in othello/sql on a database created ' \
+           'before they were added (syncdb creates them for new tables)'
+
+    def handle_noargs(self, **options):
+        # Only one game between the same players can be waiting for them to
+        # connect (the 'othello_game_pending' index is unique), so the
+        # older one is kept
+        kept = Game.objects.pending().values('player1', 'player2')\
+            .annotate(first=Min('id')).values_list('first', flat=True)
+        duplicated = Game.objects.pending().exclude(id__in=list(kept))
+        count = duplicated.count()
+        if count:
+            duplicated.delete()
+            self.stdout.write('Deleted %d duplicated games waiting for '
+                              'players\n' % count)
+
+        cursor = connection.cursor()
+        for model in (Game, Move):
+            for statement in custom_sql_for_model(model, no_style(),
+                                                  connection):
+                cursor.execute(statement)
+        transaction.commit_unless_managed()
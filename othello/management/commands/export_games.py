@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from othello.export import (NDJSON, export_games, filter_games, parse_date)
+
+
+class Command(BaseCommand):
+    help = 'Exports the stored games as NDJSON or CSV to the standard output'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default=NDJSON,
+                    help='Output format: ndjson or csv (default: ndjson)'),
+        make_option('--since', dest='since',
+                    help='Only games active since this date (YYYY-MM-DD)'),
+        make_option('--until', dest='until',
+                    help='Only games active before this date (YYYY-MM-DD)'),
+        make_option('--player', dest='player',
+                    help='Only games where this player played'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            games = filter_games(since=parse_date(options['since']),
+                                 until=parse_date(options['until']),
+                                 player=options['player'])
+            lines = export_games(games, options['format'])
+        except Exception, e:
+            raise CommandError(e.message)
+
+        for line in lines:
+            self.stdout.write(line)
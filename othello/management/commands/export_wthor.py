@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from othello.export import filter_games, parse_date
+from othello.wthor import export_games
+
+
+class Command(BaseCommand):
+    args = '<games file>'
+    help = 'Exports the finished games to a WTHOR games file (.wtb)'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--players', dest='players',
+                    help='WTHOR players file where the names of the players '
+                         'are written (eg. WTHOR.JOU)'),
+        make_option('--since', dest='since',
+                    help='Only games finished since this date (YYYY-MM-DD)'),
+        make_option('--until', dest='until',
+                    help='Only games finished before this date (YYYY-MM-DD)'),
+        make_option('--player', dest='player',
+                    help='Only games where this player played'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: export_wthor %s' % self.args)
+
+        players = None
+        try:
+            games = filter_games(since=parse_date(options['since']),
+                                 until=parse_date(options['until']),
+                                 player=options['player'])
+            if options['players']:
+                players = open(options['players'], 'wb')
+            with open(args[0], 'wb') as f:
+                exported, skipped = export_games(games, f, players)
+        except Exception, e:
+            raise CommandError(e.message or unicode(e))
+        finally:
+            if players is not None:
+                players.close()
+        self.stdout.write('%d games exported, %d skipped\n' %
+                          (exported, skipped))
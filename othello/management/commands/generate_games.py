@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from othello.export import parse_date
+from othello.synthetic import RANDOM, generate_games
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with random games, to test the server ' \
+           'with many games'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--games', dest='games', type='int', default=100000,
+                    help='Amount of games (default: 100000)'),
+        make_option('--players', dest='players', type='int', default=1000,
+                    help='Amount of players (default: 1000)'),
+        make_option('--seed', dest='seed', type='int', default=0,
+                    help='The same seed generates the same games '
+                         '(default: 0)'),
+        make_option('--policy', dest='policy', default=RANDOM,
+                    help='How the moves are chosen: random or greedy '
+                         '(default: random)'),
+        make_option('--finished', dest='finished', type='float',
+                    default=0.9,
+                    help='Fraction of games played until the end (default: '
+                         '0.9). The rest are left being played'),
+        make_option('--start', dest='start', default='2012-01-01',
+                    help='Date of the first game (default: 2012-01-01)'),
+        make_option('--days', dest='days', type='int', default=365,
+                    help='Days the games are spread over (default: 365)'),
+        make_option('--without-moves', dest='with_moves',
+                    action='store_false', default=True,
+                    help='Don\'t store the moves of the games'),
+    )
+
+    def handle(self, *args, **options):
+        def log(created):
+            self.stdout.write('%d/%d games\n' % (created, options['games']))
+
+        try:
+            first, last = generate_games(
+                options['games'], options['players'], seed=options['seed'],
+                policy=options['policy'], finished=options['finished'],
+                with_moves=options['with_moves'],
+                start=parse_date(options['start']), days=options['days'],
+                log=log)
+        except Exception, e:
+            raise CommandError(e.message)
+        self.stdout.write('Created the games %d to %d\n' % (first, last))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from othello.wthor import import_games
+
+
+class Command(BaseCommand):
+    args = '<games file>'
+    help = 'Imports the games of a WTHOR games file (.wtb)'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--players', dest='players',
+                    help='WTHOR players file with the names of the players '
+                         '(eg. WTHOR.JOU)'),
+        make_option('--without-moves', dest='with_moves',
+                    action='store_false', default=True,
+                    help='Don\'t store the moves of the games'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: import_wthor %s' % self.args)
+
+        def log(imported, rejected):
+            self.stdout.write('%d games imported, %d with invalid moves\n' %
+                              (imported, rejected))
+
+        players = None
+        try:
+            if options['players']:
+                players = open(options['players'], 'rb')
+            with open(args[0], 'rb') as f:
+                import_games(f, players, with_moves=options['with_moves'],
+                             log=log)
+        except Exception, e:
+            raise CommandError(e.message or unicode(e))
+        finally:
+            if players is not None:
+                players.close()
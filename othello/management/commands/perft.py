@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from othello.models import BLACK, INIT_BOARD, WHITE
+from othello.openings import default_color
+from othello.perft import BITBOARD, ENGINES, KNOWN_COUNTS, divide, perft
+
+
+class Command(BaseCommand):
+    help = ('Counts the positions reached after every possible sequence of '
+            'moves up to a depth, and how many positions per second the move '
+            'generator reaches')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--depth', dest='depth', type='int', default=8,
+                    help='Amount of moves (default: 8)'),
+        make_option('--board', dest='board', default=INIT_BOARD,
+                    help='Board to start from (default: the initial one)'),
+        make_option('--color', dest='color', type='int',
+                    help='Color of the player to move: 1 (white) or 2 '
+                         '(black). By default, the one that would move if '
+                         'nobody passed'),
+        make_option('--engine', dest='engine', default=BITBOARD,
+                    help='Move generator: %s (default: %s)' %
+                         (', '.join(ENGINES), BITBOARD)),
+        make_option('--divide', dest='divide', action='store_true',
+                    default=False,
+                    help='Show the count of every move of the first player'),
+        make_option('--processes', dest='processes', type='int', default=1,
+                    help='Count the moves of the first player in this amount '
+                         'of processes (0: one per core)'),
+    )
+
+    def handle(self, *args, **options):
+        board, depth = options['board'], options['depth']
+        if len(board) != 64 or board.strip('012'):
+            raise CommandError('Invalid board. It should have 64 characters: '
+                               '0 (empty), 1 (white) or 2 (black)')
+        color = options['color'] or default_color(board)
+        if color not in (WHITE, BLACK):
+            raise CommandError('Invalid color %s. It should be 1 (white) or '
+                               '2 (black)' % color)
+        processes = options['processes'] or None
+        started = time.time()
+        try:
+            if options['divide'] or processes != 1:
+                counts = divide(board, color, depth, options['engine'],
+                                processes)
+                nodes = sum(c for m, c in counts) if counts else 1
+            else:
+                counts = []
+                nodes = perft(board, color, depth, options['engine'])
+        except Exception, e:
+            raise CommandError(e.message or unicode(e))
+        seconds = time.time() - started
+
+        if options['divide']:
+            for move, c in counts:
+                self.stdout.write('%s: %d\n' % (
+                    '(%d,%d)' % move if move else 'pass', c))
+        self.stdout.write('Nodes: %d\nSeconds: %.3f\nNodes per second: %d\n'
+                          % (nodes, seconds, nodes / seconds if seconds
+                             else 0))
+
+        # Regression check of the rules
+        if board == INIT_BOARD and color == default_color(board) and \
+                depth in KNOWN_COUNTS:
+            if nodes != KNOWN_COUNTS[depth]:
+                raise CommandError('Wrong count: it should be %d' %
+                                   KNOWN_COUNTS[depth])
+            self.stdout.write('Count OK\n')
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import simplejson
+from othello.recording import read_trace, replay
+
+
+class Command(BaseCommand):
+    args = '<trace file>'
+    help = 'Makes the calls recorded by RecordingMiddleware again, and ' \
+           'prints their latency and error rate by view as JSON'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--speed', dest='speed', type='float', default=1.0,
+                    help='How many times faster than recorded the calls '
+                         'are made. 0 makes them as fast as possible '
+                         '(default: 1)'),
+        make_option('--threads', dest='threads', type='int', default=4,
+                    help='Calls made at the same time (default: 4)'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: replay_traffic %s' % self.args)
+        try:
+            result = replay(read_trace(args[0]), speed=options['speed'],
+                            threads=options['threads'])
+        except Exception, e:
+            raise CommandError(e.message)
+
+        self.stdout.write(simplejson.dumps(result, indent=2) + '\n')
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from othello.shards import ShardedGameStore, iter_orm_games, stored_shards
+
+
+class Command(BaseCommand):
+    args = '[shards directory]'
+    help = ('Moves the games of the sharded store (see othello/shards.py) '
+            'to another amount of shards, or the games of the database to '
+            'the shards. Run it with the server stopped')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--shards', dest='shards', type='int',
+                    help='Amount of shards (the one in '
+                         'OTHELLO_GAME_STORE_OPTIONS by default)'),
+        make_option('--from-database', dest='from_database',
+                    action='store_true', default=False,
+                    help='Moves the games of the database instead (they '
+                         'are kept in the database too)'),
+    )
+
+    def handle(self, *args, **options):
+        store_options = getattr(settings, 'OTHELLO_GAME_STORE_OPTIONS', {})
+        path = args[0] if args else store_options.get('path')
+        shards = options['shards'] or store_options.get('shards')
+        if not path or not shards:
+            raise CommandError('Usage: shard_games %s --shards N (or set '
+                               'the path and shards in '
+                               'OTHELLO_GAME_STORE_OPTIONS)' % self.args)
+        path = path.rstrip(os.sep)
+        new_path = path + '.new'
+        old_path = path + '.old'
+        if os.path.exists(new_path) or os.path.exists(old_path):
+            raise CommandError('Remove %s and %s first' % (new_path,
+                                                             old_path))
+
+        if options['from_database']:
+            games = iter_orm_games()
+        else:
+            current = stored_shards(path)
+            if current is None:
+                raise CommandError('There are no shards in %s' % path)
+            games = ShardedGameStore(path, current).iter_games()
+
+        try:
+            target = ShardedGameStore(new_path, shards)
+            count = 0
+            for state, moves in games:
+                target.add_game(state, moves)
+                count += 1
+            target.close()
+        except Exception, e:
+            shutil.rmtree(new_path, ignore_errors=True)
+            raise CommandError(e.message or unicode(e))
+
+        if os.path.exists(path):
+            os.rename(path, old_path)
+            self.stdout.write('The previous shards were moved to %s\n' %
+                              old_path)
+        os.rename(new_path, path)
+        self.stdout.write('%d games in %d shards in %s\n' %
+                          (count, shards, path))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import simplejson
+from django.utils.importlib import import_module
+
+# Run by a new interpreter, so nothing has been imported before. It prints
+# how many milliseconds after starting every phase finished
+STARTUP_SCRIPT = '''
+import sys
+import time
+start = time.time()
+phases = []
+
+def finished(phase):
+    phases.append((phase, (time.time() - start) * 1000))
+
+from django.conf import settings
+settings.INSTALLED_APPS
+finished('settings')
+
+from django.db.models.loading import get_apps
+get_apps()
+finished('models')
+
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler().load_middleware()
+finished('middleware')
+
+from django.core.urlresolvers import get_resolver
+get_resolver(None).url_patterns
+finished('urls')
+
+from django.utils import simplejson
+print simplejson.dumps({'phases': phases, 'modules': len(sys.modules)})
+'''
+
+
+class Command(BaseCommand):
+    args = '[settings module ...]'
+    help = 'Reports how long a new process takes to load the settings, ' \
+           'models, middleware and URLs of each settings module (by ' \
+           'default, the current one and the game worker one)'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--runs', dest='runs', type='int', default=3,
+                    help='Times every settings module is loaded. The '
+                         'fastest one is reported (default: 3)'),
+    )
+
+    def handle(self, *modules, **options):
+        if not modules:
+            current = os.environ['DJANGO_SETTINGS_MODULE']
+            package = current.rsplit('.', 1)[0] if '.' in current else ''
+            modules = (current, '.'.join(filter(None, [package,
+                                                       'worker_settings'])))
+
+        for module in modules:
+            report = min((self.measure(module)
+                          for i in xrange(options['runs'])),
+                         key=lambda r: r['phases'][-1][1])
+
+            self.stdout.write('%s (fastest of %d)\n' % (module,
+                                                       options['runs']))
+            previous = 0
+            for phase, elapsed in report['phases']:
+                self.stdout.write('  %-12s %8.1f ms\n' %
+                                  (phase, elapsed - previous))
+                previous = elapsed
+            self.stdout.write('  %-12s %8.1f ms, %d modules loaded\n\n' %
+                              ('total', previous, report['modules']))
+
+    def measure(self, module):
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = module
+        # The directory containing the project isn't in sys.path anymore
+        # (see django.core.management.setup_environ)
+        project = import_module(os.environ['DJANGO_SETTINGS_MODULE'])
+        path = [os.path.dirname(os.path.dirname(
+            os.path.abspath(project.__file__)))] + sys.path
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, path))
+        process = subprocess.Popen([sys.executable, '-c', STARTUP_SCRIPT],
+                                   env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        if process.returncode != 0:
+            raise CommandError('%s could not be loaded:\n%s' % (module, err))
+        return simplejson.loads(out.splitlines()[-1])
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics of the game server, served by /metrics in the Prometheus text
+format.
+
+Counters and histograms are kept in the memory of every process (updating
+one only takes a dictionary update). To add up the metrics of several
+processes, set OTHELLO_METRICS_DIR to a directory shared by all of them:
+every process writes its metrics in a file of that directory (at most once
+every FLUSH_INTERVAL seconds, and when it exits) and /metrics adds up all
+the files. The metrics of the processes that exited are moved to a single
+file (MERGED_FILE), so they are still added up and the counters never go
+down (the processes must run in the same machine). Gauges (like the
+active games) are read from the database when /metrics is called.
+
+Rates (eg. moves per second) are computed by Prometheus from the counters:
+`rate(othello_moves_total[1m])`.
+"""
+import atexit
+import errno
+import fcntl
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import simplejson
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# name: (type, help)
+METRICS = {
+    'othello_moves_total': (COUNTER, 'Valid moves made'),
+    'othello_invalid_moves_total': (
+        COUNTER, 'Turns lost because of an invalid move or a timeout'),
+    'othello_passes_total': (
+        COUNTER, 'Turns kept because the other player couldn\'t play'),
+    'othello_games_started_total': (COUNTER, 'Games started'),
+    'othello_games_finished_total': (COUNTER, 'Games finished'),
+    'othello_active_games': (GAUGE, 'Games being played'),
+    'othello_request_duration_seconds': (
+        HISTOGRAM, 'Time taken to answer the requests, by view'),
+}
+
+# Upper bounds (in seconds) of the buckets of the histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Views whose requests are measured (the rest are measured as 'other')
+VIEWS = ('connect', 'lobby', 'lobby_stats', 'get_board', 'is_turn', 'move',
+         'analyze', 'analytics', 'timings', 'opening', 'export', 'watch',
+         'metrics', 'profile')
+
+# Maximum seconds between writes of the metrics of a process to its file
+FLUSH_INTERVAL = 1.0
+# File with the metrics of the processes that exited
+MERGED_FILE = 'metrics-merged.json'
+
+
+@contextmanager
+def _flock(name):
+    f = open(name, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def _read_state(name):
+    """
+    Returns the metrics saved in the file `name`, or None if it doesn't
+    exist
+    """
+    try:
+        with open(name) as f:
+            return simplejson.loads(f.read())
+    except IOError:
+        return None
+
+
+def _add_up(states):
+    """
+    Returns the (counters, histograms) of the states of several registries
+    (see `Registry.state`)
+    """
+    counters = {}
+    histograms = {}
+    for state in states:
+        for name, labels, value in state['counters']:
+            key = (name, tuple(tuple(l) for l in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in state['histograms']:
+            key = (name, tuple(tuple(l) for l in labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _as_state(counters, histograms):
+    return {
+        'counters': [[n, list(l), v] for (n, l), v in counters.iteritems()],
+        'histograms': [[n, list(l), list(v)] for (n, l), v in
+                       histograms.iteritems()],
+    }
+
+
+def _running(pid):
+    """
+    Returns whether the process with the pid is running
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        # EPERM: it's running, as another user
+        return e.errno != errno.ESRCH
+    return True
+
+
+class Registry(object):
+    def __init__(self, path=None):
+        # Directory shared by all the processes, if any
+        self.path = path
+        self._lock = threading.Lock()
+        # (name, labels): value, where labels is a tuple of (label, value)
+        self._counters = {}
+        # (name, labels): [observations in every bucket, ..., sum, count]
+        self._histograms = {}
+        self._flushed = time.time()
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(BUCKETS) + 3)
+            values[bisect_left(BUCKETS, value)] += 1
+            values[-2] += value
+            values[-1] += 1
+        self._maybe_flush()
+
+    def state(self):
+        """
+        Returns the metrics of this process, in a form that can be saved as
+        JSON
+        """
+        with self._lock:
+            return _as_state(self._counters, self._histograms)
+
+    def _file(self, pid):
+        return os.path.join(self.path, 'metrics-%d.json' % pid)
+
+    def _maybe_flush(self):
+        if self.path and time.time() - self._flushed >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the metrics of this process in its file
+        """
+        if not self.path:
+            return
+        self._flushed = time.time()
+        name = self._file(os.getpid())
+        tmp = '%s.%d.tmp' % (name, threading.current_thread().ident)
+        with open(tmp, 'w') as f:
+            f.write(simplejson.dumps(self.state()))
+        os.rename(tmp, name)
+
+    def collect(self):
+        """
+        Returns the counters and histograms of all the processes, as
+        dictionaries like the ones of the registry
+        """
+        states = [self.state()]
+        if self.path:
+            self.flush()
+            # The files are read (and the ones of the processes that exited
+            # merged) by a single process at a time
+            with _flock(os.path.join(self.path, 'metrics.lock')):
+                states.extend(self._read_states())
+        return _add_up(states)
+
+    def _read_states(self):
+        """
+        Returns the metrics of the other processes. The ones of the
+        processes that exited are added to the merged file and their files
+        deleted, so the counters never go down
+        """
+        own = os.path.basename(self._file(os.getpid()))
+        merged_name = os.path.join(self.path, MERGED_FILE)
+        states = []
+        exited = []
+        for name in os.listdir(self.path):
+            if name in (own, MERGED_FILE) or \
+                    not name.startswith('metrics-') or \
+                    not name.endswith('.json'):
+                continue
+            state = _read_state(os.path.join(self.path, name))
+            if state is None:
+                continue
+            pid = name[len('metrics-'):-len('.json')]
+            if pid.isdigit() and not _running(int(pid)):
+                exited.append((name, state))
+            else:
+                states.append(state)
+
+        merged = _read_state(merged_name)
+        if exited:
+            merged = _as_state(*_add_up(
+                ([merged] if merged is not None else []) +
+                [state for name, state in exited]))
+            tmp = '%s.%d.tmp' % (merged_name, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(simplejson.dumps(merged))
+            os.rename(tmp, merged_name)
+            for name, state in exited:
+                os.remove(os.path.join(self.path, name))
+        if merged is not None:
+            states.append(merged)
+        return states
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _escape(value):
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in labels)
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(counters, histograms, gauges):
+    """
+    Returns the metrics in the Prometheus text format. `gauges` is a
+    dictionary like `counters`
+    """
+    values = dict(counters)
+    values.update(gauges)
+    by_name = {}
+    for key in values.keys() + histograms.keys():
+        by_name.setdefault(key[0], []).append(key)
+
+    lines = []
+    for name in sorted(by_name):
+        kind, description = METRICS.get(name, (COUNTER, ''))
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for key in sorted(by_name[name]):
+            labels = key[1]
+            if kind != HISTOGRAM:
+                lines.append('%s%s %s' % (name, _labels(labels),
+                                          _number(values[key])))
+                continue
+            observations = histograms[key]
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), observations):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (
+                    name, _labels(labels, (('le', bound),)), cumulative))
+            lines.append('%s_sum%s %s' % (name, _labels(labels),
+                                          _number(observations[-2])))
+            lines.append('%s_count%s %d' % (name, _labels(labels),
+                                            observations[-1]))
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(getattr(settings, 'OTHELLO_METRICS_DIR', None))
+atexit.register(registry.flush)
+
+
+def inc(name, labels=(), amount=1):
+    registry.inc(name, labels, amount)
+
+
+def observe(name, value, labels=()):
+    registry.observe(name, value, labels)
+
+
+class MetricsMiddleware(object):
+    """
+    Measures how long the views take to answer
+    """
+    def process_request(self, request):
+        request._metrics_started = time.time()
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is not None:
+            view = request.path.strip('/').split('/')[0]
+            observe('othello_request_duration_seconds',
+                    time.time() - started,
+                    (('view', view if view in VIEWS else 'other'),))
+        return response
@@ -1,10 +1,18 @@
-from django.db import models
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.signals import post_save
 from datetime import datetime
+from othello import metrics
+from othello.signals import game_finished, move_made, turn_lost
+from othello.polling import is_turn_cache, invalidate_is_turn
 
 INIT_BOARD = '0000000000000000000000000001200000021000000000000000000000000000'
 TIMEOUT_IS_TURN = 15
 TIMEOUT_TURN = 60
 MAX_INVALID_MOVES = 3
+# Moves between the boards kept in the log of the games (see
+# othello.history), unless OTHELLO_SNAPSHOT_INTERVAL is set
+SNAPSHOT_INTERVAL = 8
 
 BLANK = 0
 WHITE = 1
@@ -45,25 +53,86 @@ class GameManager(models.Manager):
 
         Example of a game ID: john-peter-3
         """
-        splitted = game_id.strip().split('-')
-        if len(splitted) != 3:
-            raise Exception('Invalid game identifier \'%s\'' % game_id)
-        p1 = splitted[0]
-        p2 = splitted[1]
-        game = splitted[2]
+        return get_store().get(game_id)
 
-        try:
-            return self.get(player1__name=p1, player2__name=p2, id=game)
-        except:
-            raise Exception('Game %s not found' % game_id)
+    def _column(self, name):
+        """
+        Returns the quoted column of the field `name`, with its table
+        """
+        qn = connection.ops.quote_name
+        return '%s.%s' % (qn(self.model._meta.db_table),
+                          qn(self.model._meta.get_field(name).column))
+
+    def pending(self):
+        """
+        Returns the games that haven't been started yet
+        """
+        # The condition isn't a parameter, so the database can use the
+        # 'othello_game_pending' index (see othello/sql)
+        return self.extra(where=['%s = %s' % (self._column('game_started'),
+                                              sql_boolean(False))])
+
+    def active(self):
+        """
+        Returns the games being played
+        """
+        # Filtering by 'winner__isnull' would join the players table. The
+        # condition is the one of the 'othello_game_active' index
+        return self.filter(game_started=True)\
+            .extra(where=['%s IS NULL' % self._column('winner')])
 
-    def is_turn(self, game_id, player):
-        g = self.get_by_id(game_id)
-        return g.is_turn(player)
+    def is_turn(self, game_id, player, since=None):
+        """
+        Returns (whether it's the turn of `player`, board). If `since` is
+        provided, the board changes since that sequence are returned instead
+        of the board (see `Game.board_delta`)
+        """
+        return is_turn_cache.is_turn(game_id, player, self._is_turn, since)
+
+    def _is_turn(self, game_id, player, since=None):
+        store = get_store()
+        with store.lock(game_id):
+            g = store.get(game_id)
+            g._check_without_token()
+            return g._poll(player, since)
+
+    def is_turn_by_token(self, token, since=None):
+        """
+        The same as `is_turn`, for the player with the token `token` (see
+        othello.tokens)
+        """
+        return is_turn_cache.is_turn(token, None, self._is_turn_by_token,
+                                     since)
+
+    def _is_turn_by_token(self, token, player, since=None):
+        pk, color = parse_token(token)
+        store = get_store()
+        with store.lock_by_pk(pk):
+            g = store.get_by_pk(pk)
+            return g._poll(g.get_player(color).name, since)
 
     def move(self, game_id, player, move):
-        g = self.get_by_id(game_id)
-        g.move(player, move)
+        store = get_store()
+        with store.lock(game_id):
+            g = store.get(game_id)
+            g._check_without_token()
+            g.move(player, move)
+
+    def move_by_token(self, token, move):
+        """
+        The same as `move`, for the player with the token `token`
+        """
+        pk, color = parse_token(token)
+        store = get_store()
+        with store.lock_by_pk(pk):
+            g = store.get_by_pk(pk)
+            g.move(g.get_player(color).name, move)
+
+    def get_by_token(self, token):
+        """
+        Returns the game of the player with the token `token`
+        """
+        return get_store().get_by_pk(parse_token(token)[0])
 
     def connect(self, p1, p2):
         """
@@ -72,20 +141,56 @@ class GameManager(models.Manager):
         If the game already exists, it starts the game
         If the game does not exist, it creates a new one
         """
-        try:
-        # Getting a game that hasn't been started with the specified players
-            g = Game.objects.get(player1__name=p1,
-                                 player2__name=p2,
-                                 game_started=False)
+        # A single query with the ORM store, and the same game for both
+        # players even if they connect at the same time (see
+        # BaseGameStore.connect)
+        return get_store().connect(p1, p2)
+
+    @transaction.commit_on_success
+    def create_and_start(self, player1, player2):
+        """
+        Creates a game between the specified players and starts it
+        """
+        store = get_store()
+        # There can only be one game waiting for them (see
+        # othello/sql), so the one they connected to is used
+        g = store.get_pending(player1, player2)
+        if g is None:
+            g = store.create(player1, player2)
+        g.start_game()
+        return g
 
-            # If the game already existed, then the other player is just
-            # connecting to it
-            g.start_game()
-        except Game.DoesNotExist:
-            # If the game does not exist, we create a new one
-            g = Game.objects.create(player1=p1, player2=p2)
 
-        return unicode(g)
+def sql_boolean(value):
+    """
+    Returns the literal of the boolean `value` in the SQL of the database
+    """
+    if connection.vendor == 'postgresql':
+        return 'true' if value else 'false'
+    return '1' if value else '0'
+
+
+def get_store():
+    """
+    Returns the store where the games are kept (see othello.stores)
+    """
+    # Imported here because the stores need the models
+    from othello.stores import get_store
+    return get_store()
+
+
+def parse_token(token):
+    """
+    Returns the (game pk, color) of a player token (see othello.tokens)
+    """
+    # Imported here because the tokens need the models
+    from othello.tokens import parse_token
+    return parse_token(token)
+
+
+def _milliseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000 + \
+        delta.microseconds // 1000
 
 
 class Game(models.Model):
@@ -122,9 +227,22 @@ class Game(models.Model):
     winner = models.ForeignKey(Player, blank=True, null=True,
                                related_name='games_where_won')
 
+    # Amount of valid moves made in the game
+    sequence = models.IntegerField(default=0)
+    # Squares changed by the last valid move ('rc' for every square, the
+    # one where the player played first)
+    last_changes = models.CharField(max_length=40, blank=True, default='')
+
+    # Colors of the players whose token was given (see othello.tokens), as
+    # the sum of WHITE and BLACK
+    issued_tokens = models.IntegerField(default=0)
+
     # Use the custom Mananger we created
     objects = GameManager()
 
+    # Store the game was loaded from, if it isn't kept in the database
+    _store = None
+
     def __init__(self, *args, **kwargs):
         super(Game, self).__init__(*args, **kwargs)
         # If we are creating the model (instead of editing it)
@@ -134,6 +252,22 @@ class Game(models.Model):
             self.player1_turn = False  # Black ones start playing
             self.board = INIT_BOARD
 
+    def save(self, *args, **kwargs):
+        if self._store is None:
+            return super(Game, self).save(*args, **kwargs)
+        self._store.save(self)
+        post_save.send(sender=Game, instance=self, created=False)
+
+    def _check_without_token(self):
+        """
+        Raises an exception if the game can't be played by the names of the
+        players, because their tokens were given (see othello.tokens)
+        """
+        if self.issued_tokens and \
+                getattr(settings, 'OTHELLO_REQUIRE_TOKENS', False):
+            raise Exception('The players of this game have to send their '
+                            'token instead of their name')
+
     def is_turn(self, player):
         """
         Returns True if it is caller's turn
@@ -160,6 +294,16 @@ class Game(models.Model):
 
         return result, self.board
 
+    def _poll(self, player, since=None):
+        """
+        Returns `is_turn`, with the board changes since the sequence `since`
+        instead of the board if it's provided (see `board_delta`)
+        """
+        result, board = self.is_turn(player)
+        if since is None:
+            return result, board
+        return result, self.board_delta(since)
+
     def _is_turn(self, player):
         if player == self.player1.name:
             result = self.player1_turn
@@ -172,6 +316,25 @@ class Game(models.Model):
                             player)
         return result
 
+    def board_delta(self, since):
+        """
+        Returns the changes in the board since the client saw the board
+        with sequence `since`: the move and the flipped squares, if only
+        the last move is missing, or the whole board otherwise
+        """
+        # Games played before the sequence was added have moves but a 0
+        # sequence
+        legacy = self.sequence == 0 and self.board != INIT_BOARD
+        if since == self.sequence and not legacy:
+            return {'sequence': self.sequence, 'move': None, 'flipped': []}
+        if since == self.sequence - 1 and self.last_changes:
+            squares = ['(%s,%s)' % (self.last_changes[i],
+                                    self.last_changes[i + 1])
+                       for i in xrange(0, len(self.last_changes), 2)]
+            return {'sequence': self.sequence, 'move': squares[0],
+                    'flipped': squares[1:]}
+        return {'sequence': self.sequence, 'board': self.board}
+
     def start_game(self):
         """
         Initialize the game.
@@ -183,6 +346,7 @@ class Game(models.Model):
         self.timeout_turn_change = datetime.now()
         self.timeout_is_turn = self.timeout_turn_change
         self.save()
+        metrics.inc('othello_games_started_total')
 
     def game_finished(self):
         return self.winner is not None
@@ -219,8 +383,7 @@ class Game(models.Model):
             timeout = (current_time - self.timeout_is_turn).seconds
             if timeout >= TIMEOUT_IS_TURN:
                 # Turn over!
-                self._set_invalid_move(player)
-                self._change_turn(matrix, player)
+                self._lose_turn(matrix, player, 'is_turn_timeout')
                 raise Exception('%s seconds ellapsed since you called '
                                 '\'is_turn\'' % timeout)
 
@@ -228,22 +391,36 @@ class Game(models.Model):
         timeout = (current_time - self.timeout_turn_change).seconds
         if timeout >= TIMEOUT_TURN:
             # Turn over!
-            self._set_invalid_move(player)
-            self._change_turn(matrix, player)
+            self._lose_turn(matrix, player, 'turn_timeout')
             raise Exception('%s seconds ellapsed since the other player '
                             'played, and you didn\'t call \'is_turn\'' %
                             timeout)
 
+        # How long the player took to play (see othello.timings)
+        timings = {
+            'think_time': _milliseconds(current_time -
+                                        self.timeout_turn_change),
+            'is_turn_time': _milliseconds(current_time -
+                                          self.timeout_is_turn)
+            if self.is_turn_already_called else None,
+        }
+
         self.is_turn_already_called = False
         self.save()
 
         # The player can play!
-        self._move_piece(matrix, player, point)
+        self._move_piece(matrix, player, point, timings, current_time)
         self._change_turn(matrix, player)
 
+        # Let the listeners (eg. spectators) know about the new board
+        move_made.send(sender=Game, game=self, player=player, move=point)
+
     def get_piece_color(self, player):
         return WHITE if player == self.player1.name else BLACK
 
+    def get_player(self, color):
+        return self.player1 if color == WHITE else self.player2
+
     def _get_inverse_piece(self, color):
         return COLORS_RELATIONSHIP[color]
 
@@ -326,13 +503,25 @@ class Game(models.Model):
         # If the next player cannot play, we don't do anything
         other_color = self._get_inverse_piece(color)
         if not self._has_any_move_options(other_color, matrix):
+            if not self.game_finished():
+                metrics.inc('othello_passes_total')
             return
 
         # If the next player can play, then we change the turn.
         self.player1_turn = not self.player1_turn
         self.save()
 
-    def _set_invalid_move(self, player):
+    def _lose_turn(self, matrix, player, reason='invalid_move'):
+        """
+        Gives the turn to the other player, because `player` made an
+        invalid move or ran out of time
+        """
+        self._set_invalid_move(player, reason)
+        self._change_turn(matrix, player)
+        turn_lost.send(sender=Game, game=self, player=player, reason=reason)
+
+    def _set_invalid_move(self, player, reason='invalid_move'):
+        metrics.inc('othello_invalid_moves_total', (('reason', reason),))
         if player == self.player1.name:
             self.invalid_moves_player1 += 1
         if player == self.player2.name:
@@ -350,8 +539,12 @@ class Game(models.Model):
             self.winner = self.player1 \
                 if self.invalid_moves_player1 < MAX_INVALID_MOVES \
                 else self.player2
+            metrics.inc('othello_games_finished_total',
+                        (('reason', 'invalid_moves'),))
 
         self.save()
+        if self.game_finished():
+            game_finished.send(sender=Game, game=self, reason='invalid_moves')
 
     def update_board(self, matrix, player, move):
         color = self.get_piece_color(player)
@@ -360,6 +553,7 @@ class Game(models.Model):
 
         # Update the cell where the user played
         matrix[move[0]][move[1]] = color
+        changes = ['%d%d' % tuple(move)]
 
         for d in directions:
             k = 0
@@ -369,9 +563,13 @@ class Game(models.Model):
                 y_new = move[1] + self.dy[d] * k
                 if matrix[x_new][y_new] == other_color:
                     matrix[x_new][y_new] = color
+                    changes.append('%d%d' % (x_new, y_new))
                 else:
                     break
 
+        self.sequence += 1
+        self.last_changes = ''.join(changes)
+
         # Update the board on db
         self._update_board_from_matrix(matrix)
 
@@ -383,16 +581,30 @@ class Game(models.Model):
         self.board = "".join(board)
         self.save()
 
-    def _move_piece(self, matrix, player, point):
+    def _move_piece(self, matrix, player, point, timings=None,
+                    started=None):
         # If the move is invalid
         color = self.get_piece_color(player)
         if not self._is_cell_available(matrix, point, color):
-            self._set_invalid_move(player)
             # The player loses his turn
-            self._change_turn(matrix, player)
+            self._lose_turn(matrix, player)
             raise Exception('Invalid move')
 
         self.update_board(matrix, player, point)
+        metrics.inc('othello_moves_total')
+        # Keep track of the move in the game's log
+        if self._store is None:
+            timings = dict(timings or {})
+            if started is not None:
+                timings['server_time'] = \
+                    _milliseconds(datetime.now() - started)
+            interval = getattr(settings, 'OTHELLO_SNAPSHOT_INTERVAL',
+                               SNAPSHOT_INTERVAL)
+            snapshot = self.board if self.sequence % interval == 0 else None
+            self.moves.create(color=color, row=point[0], column=point[1],
+                              ply=self.sequence, board=snapshot, **timings)
+        else:
+            self._store.add_move(self, color, point[0], point[1])
 
         self._check_if_game_finished(matrix)
 
@@ -416,6 +628,8 @@ class Game(models.Model):
             # Store the winner
             self.winner = self.player1 if white > black else self.player2
             self.save()
+            metrics.inc('othello_games_finished_total', (('reason', 'end'),))
+            game_finished.send(sender=Game, game=self, reason='end')
 
     def __unicode__(self):
         return '{0}-{1}-{2}'.format(
@@ -434,6 +648,42 @@ class Game(models.Model):
         return matrix
 
 
+# The cached 'is_turn' answers of a game are outdated once it changes
+post_save.connect(invalidate_is_turn, sender=Game,
+                  dispatch_uid='othello.polling.invalidate_is_turn')
+
+
+class Move(models.Model):
+    """
+    A disc placed by one of the players of a game.
+
+    Only valid moves are stored, in the order they were made
+    """
+    game = models.ForeignKey(Game, related_name='moves')
+    color = models.IntegerField()
+    row = models.IntegerField()
+    column = models.IntegerField()
+    created = models.DateTimeField(default=datetime.now)
+    # Milliseconds since the turn changed, since the player called
+    # 'is_turn' (if it did), and that the server took from the start of
+    # the move until the board was saved. Not known for imported games
+    think_time = models.IntegerField(null=True, blank=True)
+    is_turn_time = models.IntegerField(null=True, blank=True)
+    server_time = models.IntegerField(null=True, blank=True)
+    # Moves made in the game until this one (included). Not known for the
+    # moves made before it was added
+    ply = models.IntegerField(null=True, blank=True)
+    # Board after the move, every OTHELLO_SNAPSHOT_INTERVAL moves of the
+    # game (see othello.history)
+    board = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        ordering = ('id',)
+
+    def __unicode__(self):
+        return '({0},{1})'.format(self.row, self.column)
+
+
 class Pair(models.Model):
     player1 = models.ForeignKey(Player,
                                 related_name='pairs_being_first_player')
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Opening book built from the first plies of the finished games.
+
+Every position reached in the first OPENING_PLIES moves of a game is kept
+in a dictionary, with the moves played from it and, for every move, the
+games where it was played, the ones won by the player that made it and the
+draws. Positions are keyed by an integer: the board read as a base 3
+number, times 3, plus the color to move (see `position_key`), so a lookup
+is a single dictionary access.
+
+If OTHELLO_OPENING_BOOK is set, the book of each process is read from that
+file (written by 'python manage.py build_openings'), and read again when
+the file changes, so every process sees the games that build_openings
+found. Otherwise it's built from the games in the database, in a thread,
+the first time it's used; until it's built, `loaded` is False. In both
+cases, the games that finish in the process are added to it as they
+finish.
+"""
+import cPickle
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection
+from othello.export import iter_games
+from othello.models import (BLACK, COLORS_RELATIONSHIP, INIT_BOARD, WHITE,
+                            Game, get_store)
+from othello.signals import game_finished
+from othello.solver import _bits, flips, to_bitboards
+
+# Moves of every game that are added to the book
+OPENING_PLIES = 12
+
+# Value of a disc of color 1 on every square (as a bit of a bitboard) in
+# the position keys
+SQUARE_VALUES = dict((1 << i, 3 ** (63 - i)) for i in xrange(64))
+
+
+def position_key(board, color):
+    """
+    Returns the key of `board` with the player with `color` to move
+    """
+    return int(board, 3) * 3 + color
+
+
+def default_color(board):
+    """
+    Returns the color to move in `board` if no player passed before
+    """
+    # Black ones start playing
+    return BLACK if board.count('0') % 2 == 0 else WHITE
+
+
+def winner_color(game):
+    """
+    Returns the color of the winner of the finished `game`, or None if it
+    was a draw
+    """
+    if game.score_player1 == game.score_player2:
+        return None
+    # The players of the games of some stores aren't saved (see
+    # othello.stores), so they are compared by name
+    return WHITE if game.winner.name == game.player1.name else BLACK
+
+
+class OpeningBook(object):
+    def __init__(self, plies=OPENING_PLIES):
+        self.plies = plies
+        self.games = 0
+        # position key: {square: [games, wins, draws]}
+        self.positions = {}
+        self.loaded = False
+        # Modification time of the file the book was loaded from
+        self.mtime = None
+        self._lock = threading.Lock()
+
+    def add_game(self, moves, winner=None):
+        """
+        Adds the first plies of a game, being `moves` the (color, row,
+        column) of its moves and `winner` the color of its winner (None for
+        a draw)
+        """
+        white, black = to_bitboards(INIT_BOARD, WHITE)
+        value = int(INIT_BOARD, 3)
+        with self._lock:
+            self.games += 1
+            for color, row, column in moves[:self.plies]:
+                square = row * 8 + column
+                stats = self.positions.setdefault(value * 3 + color, {})\
+                    .setdefault(square, [0, 0, 0])
+                stats[0] += 1
+                if winner == color:
+                    stats[1] += 1
+                elif winner is None:
+                    stats[2] += 1
+
+                move = 1 << square
+                own, opp = (white, black) if color == WHITE \
+                    else (black, white)
+                flipped = flips(own, opp, move)
+                own, opp = own | move | flipped, opp & ~flipped
+                white, black = (own, opp) if color == WHITE else (opp, own)
+                value += color * SQUARE_VALUES[move]
+                change = color - COLORS_RELATIONSHIP[color]
+                for bit in _bits(flipped):
+                    value += change * SQUARE_VALUES[bit]
+
+    def add_games(self, games):
+        """
+        Adds the finished `games` (a queryset)
+        """
+        games = games.filter(winner__isnull=False)
+        for game, moves in iter_games(games):
+            self.add_game(moves, winner_color(game))
+
+    def lookup(self, board, color=None):
+        """
+        Returns the moves played from `board` with the player with `color`
+        to move, as {square: [games, wins, draws]}. It's empty if the
+        position isn't in the book
+        """
+        if color is None:
+            color = default_color(board)
+        return self.positions.get(position_key(board, color), {})
+
+    def best_move(self, board, color=None):
+        """
+        Returns the (row, column) of the move played more times from the
+        position (the one with more wins on a tie), or None if the position
+        isn't in the book
+        """
+        moves = self.lookup(board, color)
+        if not moves:
+            return None
+        square = max(moves, key=lambda s: (moves[s][0], moves[s][1], -s))
+        return divmod(square, 8)
+
+    def clear(self):
+        with self._lock:
+            self.games = 0
+            self.positions = {}
+            self.loaded = False
+            self.mtime = None
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            cPickle.dump({'plies': self.plies, 'games': self.games,
+                          'positions': self.positions}, f,
+                         cPickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            data = cPickle.load(f)
+        with self._lock:
+            self.plies = data['plies']
+            self.games = data['games']
+            self.positions = data['positions']
+            self.loaded = True
+            self.mtime = mtime
+
+    def update(self, other):
+        """
+        Takes the games and positions of the book `other`
+        """
+        with self._lock:
+            self.plies = other.plies
+            self.games = other.games
+            self.positions = other.positions
+            self.loaded = True
+
+
+book = OpeningBook()
+_load_lock = threading.Lock()
+# Thread building the book from the database
+_builder = None
+
+
+def get_book(wait=False):
+    """
+    Returns the opening book of the process, reading it again if its file
+    changed. Without a file, the book is built in a thread the first time
+    (or in the calling one, if `wait`), so it may still be empty
+    """
+    path = getattr(settings, 'OTHELLO_OPENING_BOOK', None)
+    if path and os.path.exists(path):
+        if os.path.getmtime(path) != book.mtime:
+            _load_book(path)
+    elif not book.loaded:
+        if wait:
+            _build_book()
+        else:
+            _start_build()
+    return book
+
+
+def _load_book(path):
+    with _load_lock:
+        if os.path.getmtime(path) != book.mtime:
+            book.load(path)
+
+
+def _start_build():
+    global _builder
+    with _load_lock:
+        if _builder is None:
+            _builder = threading.Thread(target=_build_in_thread)
+            _builder.daemon = True
+            _builder.start()
+
+
+def _build_in_thread():
+    global _builder
+    try:
+        _build_book()
+    finally:
+        # The thread has its own connection to the database
+        connection.close()
+        # If it failed, the next call tries again
+        _builder = None
+
+
+def _build_book():
+    openings = OpeningBook(book.plies)
+    openings.add_games(Game.objects.all())
+    book.update(openings)
+
+
+def add_finished_game(sender, game, **kwargs):
+    # Until the book is loaded, the games are read when loading it
+    if book.loaded:
+        book.add_game(get_store().get_moves(game), winner_color(game))
+
+game_finished.connect(add_finished_game,
+                  dispatch_uid='othello.openings.add_finished_game')
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Perft: the amount of positions reached after playing every possible
+sequence of moves up to a depth. It measures the speed of the move
+generators, and checks they follow the rules (the counts from INIT_BOARD
+are known, see KNOWN_COUNTS).
+
+A pass counts as a move, and a finished game counts as a position at any
+depth it's reached, as in the published counts.
+
+Engines (the move generator used):
+
+- bitboard: the one of othello.solver.
+- batch: the one of othello.batch, expanding many positions at once (needs
+  NumPy).
+- game: `Game.get_possible_moves` and `Game.update_board`. It's much
+  slower, and it's the reference for the other ones.
+"""
+from multiprocessing import Pool, cpu_count
+
+from othello import batch
+from othello.batch import np
+from othello.models import (BLACK, COLORS_RELATIONSHIP, INIT_BOARD, WHITE,
+                            Game, Player)
+from othello.solver import (_bits, _play, count, legal_moves, to_board,
+                            to_bitboards, to_point)
+
+BITBOARD = 'bitboard'
+BATCH = 'batch'
+GAME = 'game'
+ENGINES = (BITBOARD, BATCH, GAME)
+
+# Positions expanded at once by the batch engine
+CHUNK_SIZE = 100000
+
+# Counts from INIT_BOARD (black to move) for every depth
+KNOWN_COUNTS = {
+    1: 4,
+    2: 12,
+    3: 56,
+    4: 244,
+    5: 1396,
+    6: 8200,
+    7: 55092,
+    8: 390216,
+    9: 3005288,
+    10: 24571284,
+    11: 212258800,
+    12: 1939886636,
+    13: 18429641748,
+    14: 184042084512,
+}
+
+
+def bitboard_perft(own, opp, depth):
+    if depth == 0:
+        return 1
+    moves = legal_moves(own, opp)
+    if not moves:
+        if not legal_moves(opp, own):
+            return 1
+        return bitboard_perft(opp, own, depth - 1)
+    # The positions of the last move don't need to be played
+    if depth == 1:
+        return count(moves)
+    nodes = 0
+    for move in _bits(moves):
+        nodes += bitboard_perft(*_play(own, opp, move), depth=depth - 1)
+    return nodes
+
+
+def batch_perft(own, opp, depth):
+    """
+    `own` and `opp` are arrays with the bitboards of many positions, and
+    the result is the sum of the counts of all of them
+    """
+    if depth == 0:
+        return len(own)
+    moves = batch.legal_moves(own, opp)
+    stuck = moves == 0
+    opp_stuck = batch.legal_moves(opp, own) == 0
+    # Finished games
+    nodes = int((stuck & opp_stuck).sum())
+    passing = stuck & ~opp_stuck
+    if depth == 1:
+        return nodes + int(batch.count(moves).sum()) + int(passing.sum())
+
+    # Play every move of every position
+    flipped = batch.all_flips(own, opp)
+    position, square = np.nonzero((moves[:, None] & batch.SQUARES) != 0)
+    flipped = flipped[position, square]
+    move = batch.SQUARES[square]
+    children_own = np.concatenate((opp[position] & ~flipped,
+                                   opp[passing]))
+    children_opp = np.concatenate((own[position] | move | flipped,
+                                   own[passing]))
+    for i in xrange(0, len(children_own), CHUNK_SIZE):
+        nodes += batch_perft(children_own[i:i + CHUNK_SIZE],
+                             children_opp[i:i + CHUNK_SIZE], depth - 1)
+    return nodes
+
+
+def _save_nothing(*args, **kwargs):
+    pass
+
+
+def game_perft(game, color, depth):
+    if depth == 0:
+        return 1
+    matrix = game._get_matrix()
+    moves = list(game.get_possible_moves(color, matrix))
+    other = COLORS_RELATIONSHIP[color]
+    if not moves:
+        if not list(game.get_possible_moves(other, matrix)):
+            return 1
+        return game_perft(game, other, depth - 1)
+    if depth == 1:
+        return len(moves)
+
+    player = game.player1 if color == WHITE else game.player2
+    board = game.board
+    nodes = 0
+    for move in moves:
+        game.update_board(game._get_matrix(), player.name, move)
+        nodes += game_perft(game, other, depth - 1)
+        game.board = board
+    return nodes
+
+
+def perft(board=INIT_BOARD, color=BLACK, depth=1, engine=BITBOARD):
+    """
+    Returns the amount of positions reached after `depth` moves from
+    `board`, being `color` the one of the player to move
+    """
+    if engine == BITBOARD:
+        return bitboard_perft(*to_bitboards(board, color), depth=depth)
+    if engine == BATCH:
+        batch.check_numpy()
+        white, black = batch.from_boards([board])
+        if color == WHITE:
+            return batch_perft(white, black, depth)
+        return batch_perft(black, white, depth)
+    if engine == GAME:
+        game = Game(player1=Player(name='white'),
+                    player2=Player(name='black'))
+        # New games start from INIT_BOARD
+        game.board = board
+        # The positions are only kept in memory
+        game.save = _save_nothing
+        return game_perft(game, color, depth)
+    raise Exception('Invalid engine %s. It should be one of: %s' %
+                    (engine, ', '.join(ENGINES)))
+
+
+def root_moves(board, color):
+    """
+    Returns (move, board, color to move) of the positions after every move
+    from `board`. The move is None if the player has to pass (and there are
+    no positions if the game finished)
+    """
+    own, opp = to_bitboards(board, color)
+    other = COLORS_RELATIONSHIP[color]
+    moves = legal_moves(own, opp)
+    if not moves:
+        if not legal_moves(opp, own):
+            return []
+        return [(None, board, other)]
+    result = []
+    for move in _bits(moves):
+        child_own, child_opp = _play(own, opp, move)
+        result.append((to_point(move), to_board(child_own, child_opp, other),
+                       other))
+    return result
+
+
+def _perft_child(args):
+    board, color, depth, engine = args
+    return perft(board, color, depth, engine)
+
+
+def divide(board=INIT_BOARD, color=BLACK, depth=1, engine=BITBOARD,
+           processes=1):
+    """
+    Returns the count of every move from `board`, as a list of (move,
+    count), with the moves of `root_moves`. The moves are counted by
+    `processes` processes at the same time (all the cores if None)
+    """
+    if depth < 1:
+        raise Exception('The depth should be at least 1')
+    moves = root_moves(board, color)
+    tasks = [(b, c, depth - 1, engine) for m, b, c in moves]
+    if processes is None:
+        processes = cpu_count()
+    if processes > 1 and len(tasks) > 1:
+        pool = Pool(min(processes, len(tasks)))
+        try:
+            counts = pool.map(_perft_child, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counts = map(_perft_child, tasks)
+    return zip([m for m, b, c in moves], counts)
+
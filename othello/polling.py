@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Coalescing of the 'is_turn' polls.
+
+While a player waits for its turn it keeps calling 'is_turn', getting the
+same answer every time. The "not your turn" answers are kept in memory for
+IS_TURN_TTL seconds (or until the game is saved again, which happens every
+time the turn changes), and concurrent identical polls share a single
+database read.
+
+"Your turn" answers are never kept, so the first one is always recorded in
+the game (see `Game.is_turn`).
+"""
+import threading
+import time
+
+# Maximum amount of seconds a "not your turn" answer is reused. It bounds
+# how stale an answer can be when the game is changed by another process
+IS_TURN_TTL = 0.5
+# Expired answers are discarded once more than this amount of games
+# have some
+MAX_GAMES = 10000
+
+
+class _Call(object):
+    """
+    A database read other identical polls are waiting for
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set if the game changed while reading it
+        self.stale = False
+
+
+class IsTurnCache(object):
+    def __init__(self, ttl=IS_TURN_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # game pk -> {(game id, player, *args): (expiration time, board)}
+        self._snapshots = {}
+        # (game pk, game id, player) -> _Call
+        self._calls = {}
+
+    def is_turn(self, game_id, player, load, *args):
+        """
+        Returns the same as `load(game_id, player, *args)`, reusing a recent
+        "not your turn" answer if there's one
+        """
+        pk = self._get_pk(game_id)
+        if pk is None:
+            # Let `load` raise the proper error
+            return load(game_id, player, *args)
+
+        key = (game_id.strip(), player) + args
+        with self._lock:
+            snapshot = self._snapshots.get(pk, {}).get(key)
+            if snapshot is not None and snapshot[0] > time.time():
+                return False, snapshot[1]
+
+            call = self._calls.get((pk,) + key)
+            leader = call is None
+            if leader:
+                call = self._calls[(pk,) + key] = _Call()
+
+        if not leader:
+            # Somebody else is already reading the game
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = load(game_id, player, *args)
+        except Exception, e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[(pk,) + key]
+                if call.error is None and not call.result[0] and \
+                        not call.stale:
+                    self._store(pk, key, call.result[1])
+            call.done.set()
+        return call.result
+
+    def invalidate(self, pk):
+        """
+        Forgets the answers about the game with the specified pk
+        """
+        with self._lock:
+            self._snapshots.pop(pk, None)
+            for call_key, call in self._calls.iteritems():
+                if call_key[0] == pk:
+                    call.stale = True
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    def _store(self, pk, key, board):
+        now = time.time()
+        if len(self._snapshots) >= MAX_GAMES:
+            for game_pk, snapshots in self._snapshots.items():
+                if all(s[0] <= now for s in snapshots.itervalues()):
+                    del self._snapshots[game_pk]
+        self._snapshots.setdefault(pk, {})[key] = (now + self.ttl, board)
+
+    def _get_pk(self, game_id):
+        splitted = game_id.strip().split('-')
+        if len(splitted) == 1:
+            # A player token (see othello.tokens). It's checked by `load`,
+            # and only its own answers are reused
+            splitted = game_id.strip().split('.')
+            if len(splitted) != 3 or not splitted[0].isdigit():
+                return None
+            return int(splitted[0])
+        if len(splitted) != 3 or not splitted[2].isdigit():
+            return None
+        return int(splitted[2])
+
+
+is_turn_cache = IsTurnCache()
+
+
+def invalidate_is_turn(sender, instance, **kwargs):
+    is_turn_cache.invalidate(instance.pk)
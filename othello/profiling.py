@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling of the views with cProfile, to see where the time goes in a
+slow view (eg. which `Game` methods `move` spends it in).
+
+It's enabled by adding 'othello.profiling.ProfilingMiddleware' to
+MIDDLEWARE_CLASSES and setting:
+
+- OTHELLO_PROFILE_RATE: the fraction of the requests of every view that
+  are profiled (eg. 0.01).
+- OTHELLO_PROFILE_HEADER: if True, the requests with an
+  `X-Othello-Profile` header are profiled too.
+
+If neither of them is set, the middleware removes itself when the server
+starts, so the requests don't go through it.
+
+The profiles of the requests of every view are merged in memory, and
+/profile shows the functions where the process spent more time in every
+view and in the methods of `Game`. `/profile?view=move&format=pstats`
+downloads the merged profile of a view, to explore it with `pstats`. If
+OTHELLO_PROFILE_DIR is set, every process writes its profiles there when
+it exits (`<view>-<pid>.prof`).
+"""
+import atexit
+import cProfile
+import marshal
+import os
+import pstats
+import random
+import threading
+from StringIO import StringIO
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from othello.models import Game
+
+HEADER = 'HTTP_X_OTHELLO_PROFILE'
+
+# Functions shown for every view
+REPORT_LIMIT = 25
+
+
+def enabled():
+    return bool(getattr(settings, 'OTHELLO_PROFILE_RATE', 0) or
+                getattr(settings, 'OTHELLO_PROFILE_HEADER', False))
+
+
+def _game_methods():
+    """
+    Returns {pstats key: name} of the methods of `Game`
+    """
+    methods = {}
+    for name, value in vars(Game).iteritems():
+        code = getattr(value, 'func_code', None)
+        if code is not None:
+            methods[(code.co_filename, code.co_firstlineno,
+                     code.co_name)] = name
+    return methods
+
+
+class _Loaded(object):
+    """
+    Profile already loaded (`pstats.Stats` is only created from profiles
+    or files)
+    """
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiles(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # view: [requests, pstats.Stats]
+        self._views = {}
+
+    def add(self, view, profile):
+        """
+        Merges the (finished) cProfile `profile` of a request of `view`
+        """
+        stats = pstats.Stats(profile)
+        with self._lock:
+            if view in self._views:
+                self._views[view][0] += 1
+                self._views[view][1].add(stats)
+            else:
+                self._views[view] = [1, stats]
+
+    def views(self):
+        with self._lock:
+            return sorted(self._views)
+
+    def requests(self, view):
+        with self._lock:
+            return self._views[view][0] if view in self._views else 0
+
+    def stats(self, view):
+        """
+        Returns the merged profile of the requests of `view` (as the
+        dictionary of `pstats.Stats.stats`)
+        """
+        with self._lock:
+            if view not in self._views:
+                raise Exception('There are no profiles of %s' % view)
+            return dict(self._views[view][1].stats)
+
+    def game_methods(self, view=None):
+        """
+        Returns {method: (calls, own seconds, cumulative seconds)} of the
+        methods of `Game` called by `view` (by all of them if None)
+        """
+        methods = _game_methods()
+        result = {}
+        for name in ([view] if view is not None else self.views()):
+            for key, value in self.stats(name).iteritems():
+                method = methods.get(key)
+                if method is None:
+                    continue
+                calls, own, cumulative = result.get(method, (0, 0.0, 0.0))
+                result[method] = (calls + value[1], own + value[2],
+                                  cumulative + value[3])
+        return result
+
+    def report(self, view=None, limit=REPORT_LIMIT):
+        """
+        Returns the profiles of `view` (of all of them if None) as text
+        """
+        out = StringIO()
+        for name in ([view] if view is not None else self.views()):
+            stats = self.stats(name)
+            total = sum(value[2] for value in stats.itervalues())
+            out.write('%s: %d requests, %.3f seconds\n\n' %
+                      (name, self.requests(name), total))
+            printer = pstats.Stats(_Loaded(stats), stream=out)
+            printer.sort_stats('cumulative').print_stats(limit)
+
+            methods = self.game_methods(name)
+            if methods:
+                out.write('Game methods:\n\n%10s %9s %9s  method\n' %
+                          ('calls', 'tottime', 'cumtime'))
+                for method in sorted(methods, key=lambda m: -methods[m][2]):
+                    calls, own, cumulative = methods[method]
+                    out.write('%10d %9.3f %9.3f  %s\n' %
+                              (calls, own, cumulative, method))
+                out.write('\n')
+        return out.getvalue()
+
+    def dump(self, view):
+        """
+        Returns the profile of `view` in the format of the files read by
+        `pstats`
+        """
+        return marshal.dumps(self.stats(view))
+
+    def save(self, path):
+        """
+        Writes the profile of every view in `path`
+        """
+        for view in self.views():
+            name = os.path.join(path, '%s-%d.prof' % (view, os.getpid()))
+            with open(name, 'wb') as f:
+                f.write(self.dump(view))
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+profiles = Profiles()
+
+
+def _save_profiles():
+    path = getattr(settings, 'OTHELLO_PROFILE_DIR', None)
+    if path:
+        profiles.save(path)
+
+atexit.register(_save_profiles)
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles some of the requests (see the settings above)
+    """
+    def __init__(self):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.rate = getattr(settings, 'OTHELLO_PROFILE_RATE', 0)
+        self.header = getattr(settings, 'OTHELLO_PROFILE_HEADER', False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not (self.header and HEADER in request.META) and \
+                not random.random() < self.rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(view_func, request, *view_args,
+                                   **view_kwargs)
+        finally:
+            profiles.add(view_func.__name__, profile)
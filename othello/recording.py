@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Recording of the calls to the game API, and replay of the recorded traffic.
+
+When OTHELLO_RECORD_FILE is set, `RecordingMiddleware` appends a line to
+that file for every call to the views in RECORDED_VIEWS, with these fields
+separated by tabs:
+
+    time  method  view  parameters  accept  HTTP status  ok|error
+
+`replay()` makes the same calls to the views, with the same time between
+them (or less, with `speed`), and measures how long they take and how many
+fail. Replay the traffic against a copy of the database taken when the
+recording started, so the games in the trace exist.
+"""
+import Queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import QueryDict
+from othello.encoding import decode
+
+RECORDED_VIEWS = ('connect', 'get_board', 'is_turn', 'move')
+
+OK = 'ok'
+ERROR = 'error'
+
+
+def has_error(status, content, content_type):
+    """
+    Returns whether the response of the game API is an error
+    """
+    if status != 200:
+        return True
+    try:
+        return 'error' in decode(content, content_type)
+    except Exception:
+        return True
+
+
+class Call(object):
+    """
+    A recorded call to the game API
+    """
+    def __init__(self, time, method, view, params, accept='', status=200,
+                 result=OK):
+        self.time = time
+        self.method = method
+        self.view = view
+        self.params = params
+        self.accept = accept
+        self.status = status
+        self.result = result
+
+    def to_line(self):
+        return '%.3f\t%s\t%s\t%s\t%s\t%d\t%s\n' % (
+            self.time, self.method, self.view, self.params,
+            self.accept or '-', self.status, self.result)
+
+    @classmethod
+    def from_line(cls, line):
+        try:
+            time, method, view, params, accept, status, result = \
+                line.rstrip('\n').split('\t')
+            return cls(float(time), method, view, params,
+                       '' if accept == '-' else accept, int(status), result)
+        except ValueError:
+            raise Exception('Invalid line in the trace: %s' % line.strip())
+
+
+class RecordingMiddleware(object):
+    def __init__(self):
+        path = getattr(settings, 'OTHELLO_RECORD_FILE', None)
+        if not path:
+            raise MiddlewareNotUsed
+        # Every line is written at once
+        self.file = open(path, 'a', 1)
+        self.lock = threading.Lock()
+
+    def process_request(self, request):
+        request._recording_started = time.time()
+
+    def process_response(self, request, response):
+        view = request.path.strip('/').split('/')[0]
+        started = getattr(request, '_recording_started', None)
+        if view not in RECORDED_VIEWS or started is None:
+            return response
+
+        params = request.POST if request.method == 'POST' else request.GET
+        error = has_error(response.status_code, response.content,
+                          response['Content-Type'])
+        call = Call(started, request.method, view, params.urlencode(),
+                    request.META.get('HTTP_ACCEPT', ''),
+                    response.status_code, ERROR if error else OK)
+        with self.lock:
+            self.file.write(call.to_line())
+        return response
+
+
+def read_trace(path):
+    """
+    Returns the calls recorded in the file `path`
+    """
+    with open(path) as f:
+        return [Call.from_line(line) for line in f if line.strip()]
+
+
+def percentile(values, p):
+    """
+    Returns the value below which are the `p` percent of the sorted
+    `values`
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+class ViewStats(object):
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        # Calls that failed now and not when recorded, or the other way
+        self.mismatches = 0
+
+    def add(self, latency, result, recorded):
+        self.latencies.append(latency)
+        if result == ERROR:
+            self.errors += 1
+        if result != recorded:
+            self.mismatches += 1
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            'calls': len(latencies),
+            'errors': self.errors,
+            'error_rate': round(float(self.errors) / len(latencies), 4)
+            if latencies else 0,
+            'mismatches': self.mismatches,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0,
+        }
+
+
+def make_call(client, call):
+    """
+    Makes the call to the views. Returns (seconds it took, OK or ERROR)
+    """
+    params = dict(QueryDict(call.params).items())
+    headers = {}
+    if call.accept:
+        headers['HTTP_ACCEPT'] = call.accept
+    started = time.time()
+    if call.method == 'POST':
+        response = client.post('/' + call.view, params, **headers)
+    else:
+        response = client.get('/' + call.view, params, **headers)
+    latency = time.time() - started
+    error = has_error(response.status_code, response.content,
+                      response['Content-Type'])
+    return latency, ERROR if error else OK
+
+
+def replay(calls, speed=1.0, threads=1):
+    """
+    Makes the `calls` again, keeping the time between them divided by
+    `speed` (0 makes them as fast as possible). `threads` calls can be
+    made at the same time
+
+    Returns the statistics of every view, and of all of them ('all')
+    """
+    # Imported here so the servers recording the calls don't load the
+    # test framework
+    from django.test.client import Client
+
+    if speed < 0:
+        raise Exception('The speed can\'t be negative')
+    pending = Queue.Queue(maxsize=threads * 2)
+    stats = {'all': ViewStats()}
+    lock = threading.Lock()
+    # The most a call started after its time in the trace
+    lag = [0.0]
+
+    def run(client, call, due):
+        latency, result = make_call(client, call)
+        with lock:
+            lag[0] = max(lag[0], time.time() - latency - due)
+            for key in ('all', call.view):
+                stats.setdefault(key, ViewStats())\
+                    .add(latency, result, call.result)
+
+    def worker():
+        client = Client()
+        while 1:
+            call, due = pending.get()
+            if call is None:
+                break
+            run(client, call, due)
+
+    # With a single thread the calls are made from this one
+    workers = [threading.Thread(target=worker) for i in xrange(threads)] \
+        if threads > 1 else []
+    for w in workers:
+        w.start()
+    client = Client()
+    started = time.time()
+    try:
+        for call in calls:
+            due = started
+            if speed:
+                due += (call.time - calls[0].time) / speed
+                wait = due - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+            if workers:
+                pending.put((call, due))
+            else:
+                run(client, call, due)
+    finally:
+        for w in workers:
+            pending.put((None, None))
+        for w in workers:
+            w.join()
+    elapsed = time.time() - started
+
+    result = dict((view, s.summary()) for view, s in stats.iteritems())
+    result['all']['seconds'] = round(elapsed, 3)
+    result['all']['calls_per_second'] = round(len(calls) / elapsed, 2) \
+        if elapsed else 0
+    result['all']['max_lag_ms'] = round(lag[0] * 1000, 2) if speed else 0
+    return result
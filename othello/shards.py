@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Game store that spreads the games over several SQLite files (shards), so
+the moves of games in different shards are written at the same time
+instead of waiting for the writer of a single database.
+
+To use it, set in `settings.py`:
+
+    OTHELLO_GAME_STORE = 'othello.shards.ShardedGameStore'
+    OTHELLO_GAME_STORE_OPTIONS = {'path': join(ROOT_PATH, 'shards'),
+                                  'shards': 4}
+
+Routing:
+
+- A game is kept in the shard `shard_of(id)`. The ids of the games of a
+  shard are `shard + 1`, `shard + 1 + shards`, `shard + 1 + 2 * shards`...
+  so every shard gives ids without asking the other ones.
+- A new game is created in the shard of its players (`shard_of_players`),
+  which also keeps the game waiting for them, if any. So connecting only
+  needs that shard.
+- The players are kept in the shared catalog: the Player table of the
+  database.
+
+Moving the games of the database to the shards, or to another amount of
+shards, is done by 'python manage.py shard_games' (with the server
+stopped). The games keep their ids.
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+
+from django.utils import simplejson
+from othello.models import Game, Move
+from othello.stores import StateGameStore, _get_player_ids, parse_game_id
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, '
+    'player1 TEXT NOT NULL, player2 TEXT NOT NULL, state TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS moves (game_id INTEGER NOT NULL, '
+    'color INTEGER NOT NULL, "row" INTEGER NOT NULL, '
+    '"column" INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS moves_game ON moves (game_id)',
+    # The game waiting for the players (only in their shard)
+    'CREATE TABLE IF NOT EXISTS pending (player1 TEXT NOT NULL, '
+    'player2 TEXT NOT NULL, id INTEGER NOT NULL, '
+    'PRIMARY KEY (player1, player2))',
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)',
+)
+
+# Seconds to wait for the writer of a shard before failing
+TIMEOUT = 30
+
+
+def shard_of(pk, shards):
+    """
+    Returns the shard of the game with the specified pk
+    """
+    return (int(pk) - 1) % shards
+
+
+def shard_of_players(player1, player2, shards):
+    """
+    Returns the shard where the games between the players are created
+    """
+    key = (u'%s\0%s' % (player1, player2)).encode('utf-8')
+    return (zlib.crc32(key) & 0xffffffff) % shards
+
+
+def shard_file(path, shard):
+    return os.path.join(path, 'shard-%d.db3' % shard)
+
+
+def stored_shards(path):
+    """
+    Returns the amount of shards of the games in `path`, or None if there
+    aren't any
+    """
+    if not os.path.exists(shard_file(path, 0)):
+        return None
+    db = sqlite3.connect(shard_file(path, 0))
+    try:
+        row = db.execute('SELECT value FROM meta WHERE name = ?',
+                         ('shards',)).fetchone()
+    finally:
+        db.close()
+    return int(row[0]) if row is not None else None
+
+
+class ShardedGameStore(StateGameStore):
+    def __init__(self, path, shards=4):
+        self.path = path
+        self.shards = shards
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._local = threading.local()
+        for shard in xrange(shards):
+            self._check_shard(shard)
+
+    def _check_shard(self, shard):
+        with self.transaction(shard) as db:
+            for statement in SCHEMA:
+                db.execute(statement)
+            row = db.execute('SELECT value FROM meta WHERE name = ?',
+                             ('shards',)).fetchone()
+            if row is None:
+                db.execute('INSERT INTO meta VALUES (?, ?)',
+                           ('shards', str(self.shards)))
+            elif int(row[0]) != self.shards:
+                raise Exception(
+                    'The games in %s are in %s shards. Run \'python '
+                    'manage.py shard_games --shards %d\' to move them' %
+                    (self.path, row[0], self.shards))
+
+    def _connection(self, shard):
+        """
+        Returns the connection of this thread to the shard
+        """
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+            self._local.depth = {}
+        db = connections.get(shard)
+        if db is None:
+            # Transactions are started by `transaction`
+            db = sqlite3.connect(shard_file(self.path, shard),
+                                 timeout=TIMEOUT, isolation_level=None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            connections[shard] = db
+            self._local.depth[shard] = 0
+        return db
+
+    @contextmanager
+    def transaction(self, shard):
+        """
+        Runs the block in a transaction of the shard, that keeps the other
+        writers of the shard waiting. Nested blocks are part of the
+        outermost transaction
+        """
+        db = self._connection(shard)
+        depth = self._local.depth
+        if depth[shard]:
+            depth[shard] += 1
+            try:
+                yield db
+            finally:
+                depth[shard] -= 1
+            return
+        db.execute('BEGIN IMMEDIATE')
+        depth[shard] = 1
+        try:
+            yield db
+        except:
+            depth[shard] = 0
+            db.execute('ROLLBACK')
+            raise
+        depth[shard] = 0
+        db.execute('COMMIT')
+
+    def close(self):
+        connections = getattr(self._local, 'connections', {})
+        for db in connections.values():
+            db.close()
+        connections.clear()
+
+    def _load(self, pk):
+        shard = shard_of(pk, self.shards)
+        row = self._connection(shard).execute(
+            'SELECT state FROM games WHERE id = ?', (int(pk),)).fetchone()
+        return simplejson.loads(row[0]) if row is not None else None
+
+    def _next_id(self, db, shard):
+        last = db.execute('SELECT MAX(id) FROM games').fetchone()[0]
+        if last is None:
+            return shard + 1
+        return last + self.shards
+
+    def _insert(self, db, game):
+        db.execute('INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?)',
+                   (game.pk, game.player1.name, game.player2.name,
+                    simplejson.dumps(self.to_state(game))))
+
+    def get(self, game_id):
+        id = parse_game_id(game_id)[2]
+        state = self._load(id) if id.isdigit() else None
+        self.check_players(state, game_id)
+        return self.from_state(state)
+
+    def get_by_pk(self, pk):
+        state = self._load(pk)
+        if state is None:
+            raise Exception('Game not found')
+        return self.from_state(state)
+
+    def get_pending(self, player1, player2):
+        shard = shard_of_players(player1, player2, self.shards)
+        row = self._connection(shard).execute(
+            'SELECT id FROM pending WHERE player1 = ? AND player2 = ?',
+            (player1, player2)).fetchone()
+        state = self._load(row[0]) if row is not None else None
+        if state is None or state['game_started']:
+            return None
+        return self.from_state(state)
+
+    def create(self, player1, player2):
+        # The players are added to the shared catalog before the shard is
+        # locked, so it isn't kept locked while waiting for the database
+        _get_player_ids([player1, player2])
+        return self._create(player1, player2)
+
+    def _create(self, player1, player2):
+        shard = shard_of_players(player1, player2, self.shards)
+        with self.transaction(shard) as db:
+            game = self.new_game(self._next_id(db, shard), player1, player2)
+            self._insert(db, game)
+            db.execute('INSERT OR REPLACE INTO pending VALUES (?, ?, ?)',
+                       (player1, player2, game.pk))
+        return game
+
+    def connect(self, player1, player2):
+        # See `create`
+        _get_player_ids([player1, player2])
+        shard = shard_of_players(player1, player2, self.shards)
+        # The shard of the players keeps the other requests connecting
+        # them waiting
+        with self.transaction(shard) as db:
+            game = self.get_pending(player1, player2)
+            if game is not None:
+                db.execute('DELETE FROM pending WHERE player1 = ? AND '
+                           'player2 = ?', (player1, player2))
+                game.start_game()
+            else:
+                game = self._create(player1, player2)
+        return unicode(game)
+
+    def save(self, game):
+        shard = shard_of(game.pk, self.shards)
+        with self.transaction(shard) as db:
+            self._insert(db, game)
+
+    def add_move(self, game, color, row, column):
+        shard = shard_of(game.pk, self.shards)
+        with self.transaction(shard) as db:
+            db.execute('INSERT INTO moves VALUES (?, ?, ?, ?)',
+                       (game.pk, color, row, column))
+
+    def get_moves(self, game):
+        shard = shard_of(game.pk, self.shards)
+        return self._connection(shard).execute(
+            'SELECT color, "row", "column" FROM moves WHERE game_id = ? '
+            'ORDER BY rowid', (game.pk,)).fetchall()
+
+    def lock_by_pk(self, pk):
+        # The game is read and changed in a single transaction of its shard
+        return self.transaction(shard_of(pk, self.shards))
+
+    def iter_games(self):
+        """
+        Yields the (state, moves) of all the games, ordered by id within
+        every shard
+        """
+        for shard in xrange(self.shards):
+            db = self._connection(shard)
+            for (state,) in db.execute('SELECT state FROM games '
+                                       'ORDER BY id'):
+                state = simplejson.loads(state)
+                moves = db.execute(
+                    'SELECT color, "row", "column" FROM moves WHERE '
+                    'game_id = ? ORDER BY rowid', (state['id'],)).fetchall()
+                yield state, moves
+
+    def add_game(self, state, moves):
+        """
+        Adds a game with its `state` (keeping its id) and `moves`
+        """
+        shard = shard_of(state['id'], self.shards)
+        with self.transaction(shard) as db:
+            db.execute('INSERT INTO games VALUES (?, ?, ?, ?)',
+                       (state['id'], state['player1'], state['player2'],
+                        simplejson.dumps(state)))
+            db.executemany('INSERT INTO moves VALUES (?, ?, ?, ?)',
+                           [(state['id'],) + tuple(m) for m in moves])
+        if not state['game_started']:
+            shard = shard_of_players(state['player1'], state['player2'],
+                                     self.shards)
+            with self.transaction(shard) as db:
+                db.execute('INSERT OR REPLACE INTO pending VALUES (?, ?, ?)',
+                           (state['player1'], state['player2'], state['id']))
+
+
+def iter_orm_games(chunk_size=1000):
+    """
+    Yields the (state, moves) of the games kept in the database
+    """
+    store = StateGameStore()
+    last = 0
+    while True:
+        games = list(Game.objects.select_related('player1', 'player2',
+                                                 'winner')
+                     .filter(id__gt=last).order_by('id')[:chunk_size])
+        if not games:
+            return
+        moves = {}
+        for game_id, color, row, column in Move.objects.filter(
+                game__in=[g.id for g in games]).order_by('id')\
+                .values_list('game', 'color', 'row', 'column'):
+            moves.setdefault(game_id, []).append((color, row, column))
+        for game in games:
+            yield store.to_state(game), moves.get(game.id, [])
+        last = games[-1].id
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from django.dispatch import Signal
+
+# Sent once a player made a valid move and the turn has been updated
+move_made = Signal(providing_args=['game', 'player', 'move'])
+# Sent once a player lost its turn because of an invalid move or a timeout
+# ('reason' is the one of the 'othello_invalid_moves_total' metric)
+turn_lost = Signal(providing_args=['game', 'player', 'reason'])
+# Sent once a game finished and its winner and scores have been saved
+# ('end', 'invalid_moves' or 'adjudicated')
+game_finished = Signal(providing_args=['game', 'reason'])
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Exact endgame solver.
+
+Finds the final disc differential (discs of the player to move minus discs
+of the other player, counted as `Game` does when a game finishes) with
+perfect play from both players, and the best move to get it.
+
+Boards are represented with two 64 bits integers (bitboards), one for the
+discs of the player to move and one for the other player's. The bit
+`row * 8 + column` is the square in the same position of `Game.board`.
+
+The search is a negamax with alpha-beta pruning, a transposition table,
+fastest-first move ordering while many squares are empty and parity
+ordering near the end. When many squares are empty, the moves of the root
+are solved in parallel by a pool of processes.
+"""
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+
+from othello import metrics
+from othello.models import BLACK, BLANK, WHITE, COLORS_RELATIONSHIP, Game
+from othello.signals import game_finished
+
+# Positions with more empty squares than this aren't solved
+MAX_EMPTIES = 20
+# Maximum empty squares of the positions solved for an HTTP request. Each
+# extra empty square makes the search around 2-3 times slower (16 empty
+# squares take several seconds in a single core)
+ANALYZE_MAX_EMPTIES = 16
+# From this amount of empty squares the root moves are solved in parallel
+PARALLEL_EMPTIES = 12
+# Below this amount of empty squares the transposition table isn't used
+TABLE_EMPTIES = 6
+# Above this amount of empty squares the moves are sorted by the mobility
+# they leave to the opponent
+FASTEST_FIRST_EMPTIES = 7
+# The transposition table is emptied when it reaches this amount of entries
+MAX_TABLE_SIZE = 1000000
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_FIRST_COLUMN = 0xFEFEFEFEFEFEFEFE
+NOT_LAST_COLUMN = 0x7F7F7F7F7F7F7F7F
+
+# (bits to shift, mask removing the squares that wrapped around the board)
+# for the directions going to higher and to lower bits
+LEFT_DIRECTIONS = ((1, NOT_FIRST_COLUMN), (8, FULL),
+                   (9, NOT_FIRST_COLUMN), (7, NOT_LAST_COLUMN))
+RIGHT_DIRECTIONS = ((1, NOT_LAST_COLUMN), (8, FULL),
+                    (7, NOT_FIRST_COLUMN), (9, NOT_LAST_COLUMN))
+
+# Masks of the 4 quadrants of the board, used for the parity ordering
+QUADRANTS = (0x000000000F0F0F0F, 0x00000000F0F0F0F0,
+             0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+CORNERS = 0x8100000000000081
+
+
+def count(bits):
+    return bin(bits).count('1')
+
+
+def legal_moves(own, opp):
+    """
+    Returns the squares where the owner of `own` can play
+    """
+    empty = ~(own | opp) & FULL
+    moves = 0
+    # The lines of discs can't be longer than 6 squares, so the shifts are
+    # unrolled
+    for d, mask in LEFT_DIRECTIONS:
+        o = opp & mask
+        x = (own << d) & o
+        x |= (x << d) & o
+        x |= (x << d) & o
+        x |= (x << d) & o
+        x |= (x << d) & o
+        x |= (x << d) & o
+        moves |= (x << d) & mask
+    for d, mask in RIGHT_DIRECTIONS:
+        o = opp & mask
+        x = (own >> d) & o
+        x |= (x >> d) & o
+        x |= (x >> d) & o
+        x |= (x >> d) & o
+        x |= (x >> d) & o
+        x |= (x >> d) & o
+        moves |= (x >> d) & mask
+    return moves & empty
+
+
+def flips(own, opp, move):
+    """
+    Returns the discs of `opp` flipped when playing on `move`
+    """
+    flipped = 0
+    for d, mask in LEFT_DIRECTIONS:
+        line = 0
+        x = (move << d) & mask
+        while x & opp:
+            line |= x
+            x = (x << d) & mask
+        if x & own:
+            flipped |= line
+    for d, mask in RIGHT_DIRECTIONS:
+        line = 0
+        x = (move >> d) & mask
+        while x & opp:
+            line |= x
+            x = (x >> d) & mask
+        if x & own:
+            flipped |= line
+    return flipped
+
+
+def to_bitboards(board, color):
+    """
+    Returns the bitboards (own, opp) of `board` for the player with `color`
+    """
+    own = opp = 0
+    own_color = str(color)
+    for i, cell in enumerate(board):
+        if cell == own_color:
+            own |= 1 << i
+        elif cell != str(BLANK):
+            opp |= 1 << i
+    return own, opp
+
+
+def to_board(own, opp, color):
+    """
+    Returns the board of the bitboards, being `color` the one of `own`
+    """
+    own_color = str(color)
+    opp_color = str(COLORS_RELATIONSHIP[color])
+    board = []
+    for i in xrange(64):
+        bit = 1 << i
+        if own & bit:
+            board.append(own_color)
+        elif opp & bit:
+            board.append(opp_color)
+        else:
+            board.append(str(BLANK))
+    return ''.join(board)
+
+
+def to_point(move):
+    """
+    Returns the (row, column) of the square of `move`
+    """
+    i = move.bit_length() - 1
+    return i // 8, i % 8
+
+
+def _bits(bits):
+    while bits:
+        bit = bits & -bits
+        yield bit
+        bits ^= bit
+
+
+def _play(own, opp, move):
+    """
+    Returns the bitboards after `move`, from the point of view of the next
+    player
+    """
+    flipped = flips(own, opp, move)
+    return opp & ~flipped, own | move | flipped
+
+
+class EndgameSolver(object):
+    def __init__(self):
+        self.table = {}
+        self.nodes = 0
+
+    def solve(self, own, opp):
+        """
+        Returns (differential, best move) for the player to move. The move
+        is None if the player has to pass or the game finished
+        """
+        moves = legal_moves(own, opp)
+        if not moves:
+            return self.value(own, opp), None
+
+        best_value, best_move = -65, None
+        for move in self._sorted(own, opp, moves):
+            next_own, next_opp = _play(own, opp, move)
+            value = -self._negamax(next_own, next_opp, -65, -best_value)
+            if value > best_value:
+                best_value, best_move = value, move
+        return best_value, best_move
+
+    def value(self, own, opp):
+        """
+        Returns the differential of the player to move
+        """
+        return self._negamax(own, opp, -65, 65)
+
+    def _negamax(self, own, opp, alpha, beta):
+        self.nodes += 1
+        empties = 64 - count(own | opp)
+        if empties == 1:
+            return self._last_square(own, opp)
+
+        moves = legal_moves(own, opp)
+        if not moves:
+            if not legal_moves(opp, own):
+                # The game finished
+                return count(own) - count(opp)
+            # Pass
+            return -self._negamax(opp, own, -beta, -alpha)
+
+        use_table = empties >= TABLE_EMPTIES
+        best_move = 0
+        if use_table:
+            key = (own, opp)
+            lower, upper, best_move = self.table.get(key, (-65, 65, 0))
+            if lower >= beta:
+                return lower
+            if upper <= alpha:
+                return upper
+            if lower == upper:
+                return lower
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+
+        best_value = -65
+        for move in self._sorted(own, opp, moves, best_move, empties):
+            next_own, next_opp = _play(own, opp, move)
+            a = max(alpha, best_value)
+            if best_value == -65:
+                value = -self._negamax(next_own, next_opp, -beta, -a)
+            else:
+                # Principal variation search: check with a null window
+                # that the move isn't better than the best one so far
+                value = -self._negamax(next_own, next_opp, -a - 1, -a)
+                if a < value < beta:
+                    value = -self._negamax(next_own, next_opp, -beta,
+                                           -value)
+            if value > best_value:
+                best_value, best_move = value, move
+                if value >= beta:
+                    break
+
+        if use_table:
+            if len(self.table) >= MAX_TABLE_SIZE:
+                self.table.clear()
+            if best_value <= alpha:
+                upper = best_value
+            elif best_value >= beta:
+                lower = best_value
+            else:
+                lower = upper = best_value
+            self.table[key] = (lower, upper, best_move)
+        return best_value
+
+    def _last_square(self, own, opp):
+        """
+        Returns the differential when there is only one empty square
+        """
+        square = ~(own | opp) & FULL
+        flipped = flips(own, opp, square)
+        if flipped:
+            return count(own | flipped) + 1 - count(opp & ~flipped)
+        # The player has to pass
+        flipped = flips(opp, own, square)
+        if flipped:
+            return count(own & ~flipped) - count(opp | flipped) - 1
+        return count(own) - count(opp)
+
+    def _sorted(self, own, opp, moves, first=0, empties=64):
+        """
+        Returns the moves in the order they should be tried
+        """
+        if first & moves:
+            yield first
+            moves &= ~first
+
+        if empties > FASTEST_FIRST_EMPTIES:
+            # The moves that leave fewer options to the opponent first
+            def mobility(move):
+                return count(legal_moves(*_play(own, opp, move))) - \
+                    (4 if move & CORNERS else 0)
+            for move in sorted(_bits(moves), key=mobility):
+                yield move
+        else:
+            # The moves in regions with an odd amount of empty squares
+            # first (so we play last in them)
+            empty = ~(own | opp) & FULL
+            odd = 0
+            for q in QUADRANTS:
+                if count(empty & q) % 2:
+                    odd |= q
+            for bits in (moves & odd, moves & ~odd):
+                for move in _bits(bits):
+                    yield move
+
+
+def _solve_move(args):
+    own, opp, move = args
+    return -EndgameSolver().value(*_play(own, opp, move))
+
+
+def solve(board, color, processes=None, max_empties=MAX_EMPTIES):
+    """
+    Solves `board` (a `Game.board`) for the player with `color`
+
+    Returns (differential, best move), being the move a (row, column) tuple
+    or None if the player can't play
+    """
+    own, opp = to_bitboards(board, color)
+    empties = 64 - count(own | opp)
+    if empties > max_empties:
+        raise Exception('Too many empty squares to solve (%d). The maximum '
+                        'is %d' % (empties, max_empties))
+
+    moves = list(_bits(legal_moves(own, opp)))
+    if processes is None:
+        processes = cpu_count()
+    if processes > 1 and len(moves) > 1 and empties >= PARALLEL_EMPTIES:
+        pool = Pool(min(processes, len(moves)))
+        try:
+            values = pool.map(_solve_move, [(own, opp, m) for m in moves])
+        finally:
+            pool.close()
+            pool.join()
+        value, move = max(zip(values, moves))
+    else:
+        value, move = EndgameSolver().solve(own, opp)
+
+    return value, to_point(move) if move else None
+
+
+def play_out(board, color):
+    """
+    Returns the final board of the game after both players play perfectly,
+    being `color` the one of the player to move
+    """
+    own, opp = to_bitboards(board, color)
+    solver = EndgameSolver()
+    while 1:
+        value, move = solver.solve(own, opp)
+        if move is not None:
+            own, opp = _play(own, opp, move)
+        elif legal_moves(opp, own):
+            # Pass
+            own, opp = opp, own
+        else:
+            break
+        color = COLORS_RELATIONSHIP[color]
+    return to_board(own, opp, color)
+
+
+def adjudicate(game):
+    """
+    Finishes `game` with the result of perfect play from its current board
+    """
+    color = WHITE if game.player1_turn else BLACK
+    board = play_out(game.board, color)
+    white = board.count(str(WHITE))
+    black = board.count(str(BLACK))
+    game.score_player1 = white
+    game.score_player2 = black
+    game.winner = game.player1 if white > black else game.player2
+    # When the game finished (see othello.export and othello.feed)
+    game.timeout_turn_change = datetime.now()
+    game.save()
+    metrics.inc('othello_games_finished_total', (('reason', 'adjudicated'),))
+    game_finished.send(sender=Game, game=game, reason='adjudicated')
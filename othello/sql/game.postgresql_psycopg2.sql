@@ -0,0 +1,17 @@
+-- The indexes of game.sqlite3.sql. Booleans are compared with false here,
+-- as GameManager.pending does (see sql_boolean).
+DROP INDEX IF EXISTS "othello_game_pending";
+CREATE UNIQUE INDEX "othello_game_pending"
+    ON "othello_game" ("player1_id", "player2_id")
+    WHERE "game_started" = false;
+
+-- The same for the games that haven't finished, so the active games (see
+-- GameManager.active) are found without reading the finished ones.
+CREATE INDEX IF NOT EXISTS "othello_game_active"
+    ON "othello_game" ("game_started")
+    WHERE "winner_id" IS NULL;
+
+-- The games whose turn changed lately, read by the spectators to see the
+-- moves made by other processes (see othello/feed.py) and by the exports.
+CREATE INDEX IF NOT EXISTS "othello_game_turn_change"
+    ON "othello_game" ("timeout_turn_change");
@@ -0,0 +1,21 @@
+-- Partial index only containing the games waiting for the second player
+-- to connect (see GameManager.pending), so connecting doesn't get slower
+-- as finished games accumulate. Queries have to repeat the WHERE
+-- condition literally (not as a parameter) for the database to use it.
+-- It's unique, so there's at most one of those games between two players
+-- even if both connect at the same time (see OrmGameStore.connect).
+DROP INDEX IF EXISTS "othello_game_pending";
+CREATE UNIQUE INDEX "othello_game_pending"
+    ON "othello_game" ("player1_id", "player2_id")
+    WHERE "game_started" = 0;
+
+-- The same for the games that haven't finished, so the active games (see
+-- GameManager.active) are found without reading the finished ones.
+CREATE INDEX IF NOT EXISTS "othello_game_active"
+    ON "othello_game" ("game_started")
+    WHERE "winner_id" IS NULL;
+
+-- The games whose turn changed lately, read by the spectators to see the
+-- moves made by other processes (see othello/feed.py) and by the exports.
+CREATE INDEX IF NOT EXISTS "othello_game_turn_change"
+    ON "othello_game" ("timeout_turn_change");
@@ -0,0 +1,5 @@
+-- The moves of a game by ply, so a board is rebuilt reading only the last
+-- snapshot before it and the moves made since then (see
+-- OrmGameStore.get_history).
+CREATE INDEX IF NOT EXISTS "othello_move_ply"
+    ON "othello_move" ("game_id", "ply");
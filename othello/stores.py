@@ -0,0 +1,562 @@
+# -*- coding: utf-8 -*-
+"""
+Game-state stores.
+
+`GameManager` reads and writes the games through the store configured in
+the OTHELLO_GAME_STORE setting (the path of one of the classes below),
+created with the keyword arguments in OTHELLO_GAME_STORE_OPTIONS:
+
+- OrmGameStore (default): the games are rows of the database.
+- MemoryGameStore: the games live in the memory of the process.
+- FileGameStore: every game is a file inside `path`. A game is locked while
+  it is being changed, so several processes on the same host can serve
+  games at the same time without waiting for the database writer.
+
+Players are only stored by name, and only the games in the ORM store are
+seen by the database based features (admin, export, etc.)
+"""
+import fcntl
+import itertools
+import os
+import threading
+import urllib
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import simplejson
+from django.utils.importlib import import_module
+from othello import metrics
+from othello.models import INIT_BOARD, Game, Player, sql_boolean
+from othello.polling import is_turn_cache
+
+DEFAULT_STORE = 'othello.stores.OrmGameStore'
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+STATE_FIELDS = ('player1_turn', 'board', 'game_started',
+                'invalid_moves_player1', 'invalid_moves_player2',
+                'score_player1', 'score_player2', 'is_turn_already_called',
+                'sequence', 'last_changes', 'issued_tokens')
+
+
+def parse_game_id(game_id):
+    """
+    Returns the (player1, player2, id) in a game ID
+
+    Example of a game ID: john-peter-3
+    """
+    splitted = game_id.strip().split('-')
+    if len(splitted) != 3:
+        raise Exception('Invalid game identifier \'%s\'' % game_id)
+    return splitted
+
+
+@contextmanager
+def _no_lock():
+    yield
+
+
+class BaseGameStore(object):
+    def get(self, game_id):
+        """
+        Returns the game that has the specified ID
+        """
+        raise NotImplementedError
+
+    def get_pending(self, player1, player2):
+        """
+        Returns the game between the players that hasn't been started yet,
+        or None if there isn't any
+        """
+        raise NotImplementedError
+
+    def create(self, player1, player2):
+        """
+        Creates a game between the players with the specified names
+        """
+        raise NotImplementedError
+
+    def connect(self, player1, player2):
+        """
+        Starts the game between the players that hasn't been started yet,
+        or creates one if there isn't any. Returns its game ID
+        """
+        with self.connect_lock():
+            game = self.get_pending(player1, player2)
+            if game is not None:
+                game.start_game()
+            else:
+                game = self.create(player1, player2)
+        return unicode(game)
+
+    def connect_lock(self):
+        """
+        Returns a context manager that prevents other requests from
+        connecting players while it's being used, so both players can't
+        create a game each
+        """
+        return _no_lock()
+
+    def save(self, game):
+        raise NotImplementedError
+
+    def add_move(self, game, color, row, column):
+        """
+        Adds a move to the log of the game
+        """
+        raise NotImplementedError
+
+    def get_moves(self, game):
+        """
+        Returns the log of the game, as (color, row, column) of every move
+        """
+        raise NotImplementedError
+
+    def get_history(self, game, ply):
+        """
+        Returns (board, its ply, moves) to rebuild the board of the game
+        after `ply` moves: the last board kept before it, and the moves
+        made since then up to `ply`. There are less moves if the game
+        doesn't have so many
+        """
+        return INIT_BOARD, 0, self.get_moves(game)[:ply]
+
+    def get_by_pk(self, pk):
+        """
+        Returns the game with the specified pk
+        """
+        raise NotImplementedError
+
+    def lock(self, game_id):
+        """
+        Returns a context manager that prevents other requests from
+        changing the game while it's being used
+        """
+        id = parse_game_id(game_id)[2]
+        if not id.isdigit():
+            return _no_lock()
+        return self.lock_by_pk(int(id))
+
+    def lock_by_pk(self, pk):
+        """
+        The same as `lock`, for the game with the specified pk
+        """
+        return _no_lock()
+
+
+class OrmGameStore(BaseGameStore):
+    def get(self, game_id):
+        p1, p2, game = parse_game_id(game_id)
+        try:
+            return Game.objects.get(player1__name=p1, player2__name=p2,
+                                    id=game)
+        except:
+            raise Exception('Game %s not found' % game_id)
+
+    def get_by_pk(self, pk):
+        try:
+            # The names of the players are needed to play
+            return Game.objects.select_related('player1', 'player2')\
+                .get(pk=pk)
+        except Game.DoesNotExist:
+            raise Exception('Game not found')
+
+    def get_pending(self, player1, player2):
+        try:
+            return Game.objects.pending().get(player1__name=player1,
+                                              player2__name=player2)
+        except Game.DoesNotExist:
+            return None
+
+    def create(self, player1, player2):
+        return Game.objects.create(player1=player1, player2=player2)
+
+    def connect(self, player1, player2):
+        ids = _get_player_ids([player1, player2])
+        if _supports_upsert():
+            id, started = _upsert_game(ids[player1], ids[player2])
+        else:
+            id, started = _cas_game(ids[player1], ids[player2])
+        if started:
+            is_turn_cache.invalidate(id)
+            metrics.inc('othello_games_started_total')
+        return u'%s-%s-%s' % (player1, player2, id)
+
+    def save(self, game):
+        game.save()
+
+    def add_move(self, game, color, row, column):
+        game.moves.create(color=color, row=row, column=column,
+                          ply=game.sequence)
+
+    def get_moves(self, game):
+        return list(game.moves.order_by('id')
+                    .values_list('color', 'row', 'column'))
+
+    def get_history(self, game, ply):
+        snapshot = list(game.moves.filter(ply__lte=ply, board__isnull=False)
+                        .order_by('-ply').values_list('board', 'ply')[:1])
+        board, snapshot_ply = snapshot[0] if snapshot else (INIT_BOARD, 0)
+        moves = list(game.moves.filter(ply__gt=snapshot_ply, ply__lte=ply)
+                     .order_by('ply').values_list('color', 'row', 'column'))
+        if snapshot_ply + len(moves) == ply:
+            return board, snapshot_ply, moves
+        # The moves made before the ply was added don't have it, so they're
+        # counted from the first one
+        rows = list(game.moves.order_by('id')
+                    .values_list('board', 'color', 'row', 'column')[:ply])
+        for i in xrange(len(rows) - 1, -1, -1):
+            if rows[i][0] is not None:
+                return rows[i][0], i + 1, [r[1:] for r in rows[i + 1:]]
+        return INIT_BOARD, 0, [r[1:] for r in rows]
+
+
+def _get_player_ids(names):
+    """
+    Returns {name: id} of the players with `names` (creating the ones that
+    don't exist)
+    """
+    ids = dict(Player.objects.filter(name__in=names)
+               .values_list('name', 'id'))
+    for name in names:
+        if name not in ids:
+            ids[name] = Player.objects.get_or_create(name=name)[0].id
+    return ids
+
+
+def _supports_upsert():
+    """
+    Returns whether the database can insert a row or update the one it
+    conflicts with, returning it, in a single statement
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        from django.db.backends.sqlite3.base import Database
+        return Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def _game_columns():
+    qn = connection.ops.quote_name
+    names = dict((f, qn(Game._meta.get_field(f).column)) for f in (
+        'player1', 'player2', 'player1_turn', 'board', 'game_started',
+        'timeout_is_turn', 'timeout_turn_change', 'invalid_moves_player1',
+        'invalid_moves_player2', 'score_player1', 'score_player2',
+        'is_turn_already_called', 'sequence', 'last_changes',
+        'issued_tokens'))
+    names['table'] = qn(Game._meta.db_table)
+    names['id'] = qn(Game._meta.pk.column)
+    return names
+
+
+def _upsert_sql():
+    columns = _game_columns()
+    columns['false'] = sql_boolean(False)
+    return ('INSERT INTO %(table)s (%(player1)s, %(player2)s, '
+            '%(player1_turn)s, %(board)s, %(game_started)s, '
+            '%(invalid_moves_player1)s, %(invalid_moves_player2)s, '
+            '%(score_player1)s, %(score_player2)s, '
+            '%(is_turn_already_called)s, %(sequence)s, %(last_changes)s, '
+            '%(issued_tokens)s) '
+            'VALUES (%%s, %%s, %%s, %%s, %%s, 0, 0, 0, 0, %%s, 0, \'\', 0) '
+            'ON CONFLICT (%(player1)s, %(player2)s) '
+            'WHERE %(game_started)s = %(false)s '
+            'DO UPDATE SET %(game_started)s = %%s, '
+            '%(timeout_turn_change)s = %%s, %(timeout_is_turn)s = %%s '
+            'RETURNING %(id)s, %(game_started)s') % columns
+
+
+def _upsert_game(player1_id, player2_id):
+    """
+    Inserts a game between the players or, if there's one that hasn't been
+    started (the unique 'othello_game_pending' index, see othello/sql),
+    starts it. Returns (id, whether it was started)
+    """
+    sql = _upsert_sql()
+    now = connection.ops.value_to_db_datetime(datetime.now())
+    cursor = connection.cursor()
+    # Black ones start playing (player1_turn is False)
+    cursor.execute(sql, [player1_id, player2_id, False, INIT_BOARD, False,
+                         False, True, now, now])
+    id, started = cursor.fetchone()
+    transaction.commit_unless_managed()
+    return id, bool(started)
+
+
+def _pending_id(player1_id, player2_id):
+    """
+    Returns the id of the game between the players that hasn't been
+    started, or None if there isn't any
+    """
+    ids = Game.objects.pending().filter(player1=player1_id,
+                                        player2=player2_id)\
+        .values_list('id', flat=True)[:1]
+    return ids[0] if ids else None
+
+
+def _cas_game(player1_id, player2_id):
+    """
+    The same as `_upsert_game`, for the databases without upserts: the
+    game is only started if it's still pending, and only created if there
+    isn't another one pending (because of the unique index). If another
+    request won, it's tried again
+    """
+    while True:
+        id = _pending_id(player1_id, player2_id)
+        if id is not None:
+            now = datetime.now()
+            started = Game.objects.pending().filter(id=id).update(
+                game_started=True, timeout_turn_change=now,
+                timeout_is_turn=now)
+            if started:
+                return id, True
+            continue
+        try:
+            game = Game.objects.create(player1_id=player1_id,
+                                       player2_id=player2_id)
+        except IntegrityError:
+            transaction.rollback_unless_managed()
+            continue
+        return game.id, False
+
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value is not None else None
+
+
+def _parse_datetime(value):
+    return datetime.strptime(value, DATETIME_FORMAT) \
+        if value is not None else None
+
+
+class StateGameStore(BaseGameStore):
+    """
+    Base class of the stores that keep every game as a dictionary (its
+    state) instead of a database row
+    """
+    def to_state(self, game):
+        state = dict((f, getattr(game, f)) for f in STATE_FIELDS)
+        state['id'] = game.pk
+        state['player1'] = game.player1.name
+        state['player2'] = game.player2.name
+        state['timeout_is_turn'] = _format_datetime(game.timeout_is_turn)
+        state['timeout_turn_change'] = \
+            _format_datetime(game.timeout_turn_change)
+        state['winner'] = None
+        if game.winner is not None:
+            state['winner'] = 1 if game.winner.name == game.player1.name \
+                else 2
+        return state
+
+    def from_state(self, state):
+        # Games saved by older versions don't have all the fields
+        game = Game(id=state['id'],
+                    **dict((str(f), state[f]) for f in STATE_FIELDS
+                           if f in state))
+        game.player1 = Player(name=state['player1'])
+        game.player2 = Player(name=state['player2'])
+        game.timeout_is_turn = _parse_datetime(state['timeout_is_turn'])
+        game.timeout_turn_change = \
+            _parse_datetime(state['timeout_turn_change'])
+        if state['winner'] is not None:
+            game.winner = game.player1 if state['winner'] == 1 \
+                else game.player2
+        # Make the game save itself in this store
+        game._store = self
+        return game
+
+    def new_game(self, id, player1, player2):
+        game = Game()
+        game.id = id
+        game.player1 = Player(name=player1)
+        game.player2 = Player(name=player2)
+        game._store = self
+        return game
+
+    def check_players(self, state, game_id):
+        p1, p2, id = parse_game_id(game_id)
+        if state is None or state['player1'] != p1 or \
+                state['player2'] != p2:
+            raise Exception('Game %s not found' % game_id)
+
+
+class MemoryGameStore(StateGameStore):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._games = {}
+        self._moves = {}
+        # (player1, player2) -> id of the last game created for them
+        self._pending = {}
+        self._locks = {}
+        self._ids = itertools.count(1)
+
+    def get(self, game_id):
+        id = parse_game_id(game_id)[2]
+        with self._lock:
+            state = self._games.get(int(id)) if id.isdigit() else None
+        self.check_players(state, game_id)
+        return self.from_state(state)
+
+    def get_by_pk(self, pk):
+        with self._lock:
+            state = self._games.get(pk)
+        if state is None:
+            raise Exception('Game not found')
+        return self.from_state(state)
+
+    def get_pending(self, player1, player2):
+        with self._lock:
+            state = self._games.get(self._pending.get((player1, player2)))
+        if state is None or state['game_started']:
+            return None
+        return self.from_state(state)
+
+    def create(self, player1, player2):
+        with self._lock:
+            id = self._ids.next()
+            self._pending[(player1, player2)] = id
+        game = self.new_game(id, player1, player2)
+        game.save()
+        return game
+
+    def save(self, game):
+        state = self.to_state(game)
+        with self._lock:
+            self._games[game.pk] = state
+
+    def add_move(self, game, color, row, column):
+        with self._lock:
+            self._moves.setdefault(game.pk, []).append((color, row, column))
+
+    def get_moves(self, game):
+        with self._lock:
+            return list(self._moves.get(game.pk, []))
+
+    def connect_lock(self):
+        return self._connect_lock
+
+    def lock_by_pk(self, pk):
+        with self._lock:
+            if pk not in self._locks:
+                self._locks[pk] = threading.Lock()
+            return self._locks[pk]
+
+
+class FileGameStore(StateGameStore):
+    """
+    Every game is saved in a JSON file (replaced atomically on every save),
+    and its moves are appended to another file
+    """
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _flock(self, name):
+        f = open(self._file(name + '.lock'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def _read(self, name):
+        try:
+            with open(self._file(name)) as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def _write(self, name, content):
+        tmp = self._file('%s.%d.tmp' % (name, os.getpid()))
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.rename(tmp, self._file(name))
+
+    def _load(self, id):
+        content = self._read('game-%s.json' % id)
+        return simplejson.loads(content) if content is not None else None
+
+    def _pending_name(self, player1, player2):
+        return 'pending-%s-%s' % (urllib.quote(player1.encode('utf-8'), ''),
+                                  urllib.quote(player2.encode('utf-8'), ''))
+
+    def get(self, game_id):
+        id = parse_game_id(game_id)[2]
+        state = self._load(id) if id.isdigit() else None
+        self.check_players(state, game_id)
+        return self.from_state(state)
+
+    def get_by_pk(self, pk):
+        state = self._load(pk)
+        if state is None:
+            raise Exception('Game not found')
+        return self.from_state(state)
+
+    def get_pending(self, player1, player2):
+        id = self._read(self._pending_name(player1, player2))
+        state = self._load(id) if id is not None else None
+        if state is None or state['game_started']:
+            return None
+        return self.from_state(state)
+
+    def create(self, player1, player2):
+        with self._flock('store'):
+            id = int(self._read('next_id') or 1)
+            self._write('next_id', str(id + 1))
+            game = self.new_game(id, player1, player2)
+            game.save()
+            self._write(self._pending_name(player1, player2), str(id))
+        return game
+
+    def save(self, game):
+        self._write('game-%s.json' % game.pk,
+                    simplejson.dumps(self.to_state(game)))
+
+    def add_move(self, game, color, row, column):
+        with open(self._file('game-%s.moves' % game.pk), 'a') as f:
+            f.write('%d %d %d\n' % (color, row, column))
+
+    def get_moves(self, game):
+        content = self._read('game-%s.moves' % game.pk) or ''
+        return [tuple(int(x) for x in line.split())
+                for line in content.splitlines()]
+
+    def connect_lock(self):
+        return self._flock('connect')
+
+    def lock_by_pk(self, pk):
+        return self._flock('game-%s' % pk)
+
+
+_store = None
+
+
+def get_store():
+    """
+    Returns the store configured in the settings
+    """
+    global _store
+    if _store is None:
+        path = getattr(settings, 'OTHELLO_GAME_STORE', DEFAULT_STORE)
+        module, name = path.rsplit('.', 1)
+        options = getattr(settings, 'OTHELLO_GAME_STORE_OPTIONS', {})
+        _store = getattr(import_module(module), name)(**options)
+    return _store
+
+
+def set_store(store):
+    """
+    Replaces the store used by `GameManager` (None goes back to the one
+    configured in the settings)
+    """
+    global _store
+    _store = store
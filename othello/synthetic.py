@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Generation of big amounts of games, to test the server with a realistic
+database size.
+
+Games are played in chunks of CHUNK_SIZE at the same time with the batch
+move generation of othello.batch, and every chunk is inserted with a few
+queries. The same seed always generates the same games.
+
+Policies (how the players choose their moves):
+
+- random: any of the valid moves.
+- greedy: the move that flips more discs, preferring corners and avoiding
+  the squares next to them.
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from othello import batch
+from othello.batch import check_numpy, np
+from othello.models import BLACK, INIT_BOARD, WHITE, Game, Move, Player
+
+CHUNK_SIZE = 10000
+# A game can't have more moves than this (60 empty squares at the start)
+MAX_PLIES = 60
+
+RANDOM = 'random'
+GREEDY = 'greedy'
+POLICIES = (RANDOM, GREEDY)
+
+# Extra score of the moves on every square for the greedy policy
+if np is not None:
+    SQUARE_BONUS = np.zeros(64)
+    SQUARE_BONUS[[0, 7, 56, 63]] = 10
+    SQUARE_BONUS[[9, 14, 49, 54]] = -5
+
+
+def choose_moves(own, opp, policy, rng):
+    """
+    Returns the square chosen by the player to move in every board. All the
+    boards must have some valid move
+    """
+    legal = (batch.legal_moves(own, opp)[:, None] & batch.SQUARES) != 0
+    # A random number between 0 and 1 breaks the ties
+    scores = rng.random_sample(legal.shape)
+    if policy == GREEDY:
+        flipped = batch.count(batch.all_flips(own, opp).ravel())
+        scores += flipped.reshape(legal.shape) + SQUARE_BONUS
+    scores[~legal] = -np.inf
+    return scores.argmax(axis=1)
+
+
+class PlayedGames(object):
+    """
+    The result of playing many games at the same time (N of them):
+
+    - white, black: bitboards of the final boards.
+    - white_turn: whether the player with the white discs has the turn.
+    - finished: whether the games finished.
+    - squares, colors: square (row * 8 + column) and color of every move.
+      N x MAX_PLIES arrays, with -1 after the last move of each game.
+    - last_flipped: discs flipped by the last move.
+    - valid: False for the games where a given move wasn't valid (they
+      were stopped before it).
+    """
+    def __init__(self, n):
+        self.white, self.black = batch.from_boards([INIT_BOARD] * n)
+        # Black ones start playing
+        self.white_turn = np.zeros(n, dtype=bool)
+        self.finished = np.zeros(n, dtype=bool)
+        self.squares = np.empty((n, MAX_PLIES), dtype=np.int8)
+        self.squares.fill(-1)
+        self.colors = self.squares.copy()
+        self.last_flipped = np.zeros(n, dtype=np.uint64)
+        self.valid = np.ones(n, dtype=bool)
+
+    def subset(self, selected):
+        """
+        Returns the games `selected` (a boolean array or an array of
+        indexes)
+        """
+        games = PlayedGames(0)
+        for name, value in self.__dict__.iteritems():
+            setattr(games, name, value[selected])
+        return games
+
+    def sequence(self):
+        """
+        Returns the amount of moves of every game
+        """
+        return (self.squares >= 0).sum(axis=1)
+
+    def last_changes(self):
+        """
+        Returns the `Game.last_changes` of every game
+        """
+        sequence = self.sequence()
+        last = self.squares[np.arange(len(sequence)), sequence - 1]
+        flipped = (self.last_flipped[:, None] & batch.SQUARES) != 0
+        result = []
+        for i in xrange(len(sequence)):
+            if not sequence[i]:
+                result.append('')
+                continue
+            changed = [last[i]] + np.flatnonzero(flipped[i]).tolist()
+            result.append(''.join('%d%d' % divmod(s, 8) for s in changed))
+        return result
+
+
+def play_games(n, policy=RANDOM, rng=None, plies=None, moves=None):
+    """
+    Plays `n` games at the same time, and returns them as `PlayedGames`.
+    `plies` is the maximum amount of moves of each game (all of them are
+    played until they finish if not provided)
+
+    If `moves` (a N x MAX_PLIES array of squares, with -1 after the last
+    move of each game) is provided, those moves are played instead of
+    choosing them with `policy`. The player of every move is the one the
+    rules give (the other player if the one that just played can't play)
+    """
+    check_numpy()
+    if rng is None:
+        rng = np.random.RandomState()
+    if moves is not None:
+        plies = (moves >= 0).sum(axis=1)
+    elif plies is None:
+        plies = np.empty(n, dtype=np.int64)
+        plies.fill(MAX_PLIES)
+
+    g = PlayedGames(n)
+    for ply in xrange(MAX_PLIES):
+        playing = np.flatnonzero(~g.finished & g.valid & (plies > ply))
+        if not len(playing):
+            break
+        is_white = g.white_turn[playing]
+        w, b = g.white[playing], g.black[playing]
+        own = np.where(is_white, w, b)
+        opp = np.where(is_white, b, w)
+
+        if moves is None:
+            square = choose_moves(own, opp, policy, rng)
+        else:
+            square = moves[playing, ply].astype(np.int64)
+            legal = batch.legal_moves(own, opp) & batch.SQUARES[square]
+            invalid = legal == 0
+            if invalid.any():
+                g.valid[playing[invalid]] = False
+                playing, square = playing[~invalid], square[~invalid]
+                is_white, own, opp = \
+                    is_white[~invalid], own[~invalid], opp[~invalid]
+
+        move = batch.SQUARES[square]
+        flipped = batch.flips(own, opp, move)
+        own, opp = own | move | flipped, opp & ~flipped
+        g.last_flipped[playing] = flipped
+        g.white[playing] = np.where(is_white, own, opp)
+        g.black[playing] = np.where(is_white, opp, own)
+        g.squares[playing, ply] = square
+        g.colors[playing, ply] = np.where(is_white, WHITE, BLACK)
+
+        # The turn only changes if the other player can play (see
+        # `Game._change_turn`)
+        opp_can_play = batch.legal_moves(opp, own) != 0
+        g.white_turn[playing] = is_white ^ opp_can_play
+        g.finished[playing] = ~opp_can_play & \
+            (batch.legal_moves(own, opp) == 0)
+    return g
+
+
+def insert_rows(table, columns, rows):
+    """
+    Inserts `rows` (tuples with the values of `columns`) in `table`
+    """
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(table), ', '.join(qn(c) for c in columns),
+        ', '.join(['%s'] * len(columns)))
+    connection.cursor().executemany(sql, rows)
+    transaction.commit_unless_managed()
+
+
+def get_player_ids(names):
+    """
+    Returns the ids of the players with `names` (creating the ones that
+    don't exist)
+    """
+    ids = {}
+    for i in xrange(0, len(names), CHUNK_SIZE):
+        chunk = names[i:i + CHUNK_SIZE]
+        ids.update(Player.objects.filter(name__in=chunk)
+                   .values_list('name', 'id'))
+        missing = set(name for name in chunk if name not in ids)
+        if missing:
+            insert_rows(Player._meta.db_table, ['name'],
+                        [(name,) for name in missing])
+            ids.update(Player.objects.filter(name__in=chunk)
+                       .values_list('name', 'id'))
+    return [ids[name] for name in names]
+
+
+def create_players(amount, prefix='bot'):
+    """
+    Returns the ids of `amount` players (creating the ones that don't exist)
+    """
+    return get_player_ids(['%s%d' % (prefix, i + 1) for i in xrange(amount)])
+
+
+def next_game_id():
+    return (Game.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+
+def insert_games(first_id, player1, player2, changed, games,
+                 finish=False, with_moves=True):
+    """
+    Inserts the `PlayedGames` `games` (with consecutive ids from
+    `first_id`) between the players with the ids `player1` and `player2`.
+    `changed` is the last time the turn changed in every game
+
+    If `finish` is set, all the games are saved as finished, with the
+    score of their final board
+    """
+    to_db = connection.ops.value_to_db_datetime
+    game_columns = [Game._meta.get_field(f).column for f in (
+        'id', 'player1', 'player2', 'player1_turn', 'board', 'game_started',
+        'timeout_turn_change', 'invalid_moves_player1',
+        'invalid_moves_player2', 'score_player1', 'score_player2',
+        'is_turn_already_called', 'winner', 'sequence', 'last_changes',
+        'issued_tokens')]
+    move_columns = [Move._meta.get_field(f).column for f in (
+        'game', 'color', 'row', 'column', 'created', 'ply')]
+
+    n = len(player1)
+    ids = np.arange(first_id, first_id + n)
+    done = games.finished | finish
+    boards = batch.to_boards(games.white, games.black)
+    score1 = batch.count(games.white)
+    score2 = batch.count(games.black)
+    winner = np.where(score1 > score2, player1, player2)
+    sequence = games.sequence()
+    last_changes = games.last_changes()
+
+    rows = []
+    for i in xrange(n):
+        rows.append((
+            int(ids[i]), int(player1[i]), int(player2[i]),
+            bool(games.white_turn[i]), boards[i], True, to_db(changed[i]),
+            0, 0, int(score1[i]) if done[i] else 0,
+            int(score2[i]) if done[i] else 0,
+            False, int(winner[i]) if done[i] else None,
+            int(sequence[i]), last_changes[i], 0))
+
+    with transaction.commit_on_success():
+        insert_rows(Game._meta.db_table, game_columns, rows)
+        # The ids aren't given by the database, so its sequence (if it has
+        # one, like PostgreSQL) is moved after them for the next games
+        cursor = connection.cursor()
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Game]):
+            cursor.execute(sql)
+        if with_moves:
+            game, ply = np.nonzero(games.squares >= 0)
+            row, column = np.divmod(games.squares[game, ply], 8)
+            # One second between moves, the last one when the turn changed
+            created = [to_db(changed[g] - timedelta(seconds=s))
+                       for g, s in zip(game.tolist(),
+                                       (sequence[game] - ply - 1).tolist())]
+            insert_rows(Move._meta.db_table, move_columns,
+                        zip(ids[game].tolist(),
+                            games.colors[game, ply].tolist(),
+                            row.tolist(), column.tolist(), created,
+                            (ply + 1).tolist()))
+
+
+def generate_games(games, players, seed=0, policy=RANDOM, finished=0.9,
+                   with_moves=True, start=datetime(2012, 1, 1), days=365,
+                   chunk_size=CHUNK_SIZE, log=None):
+    """
+    Creates `games` games between `players` players. Around the `finished`
+    fraction of them is played until the end, and the rest is left being
+    played after a random amount of moves
+
+    The games are spread over `days` days since `start`. Returns the ids
+    of the first and last games created
+    """
+    check_numpy()
+    if policy not in POLICIES:
+        raise Exception('Invalid policy %s. It should be one of: %s' %
+                        (policy, ', '.join(POLICIES)))
+    if players < 2:
+        raise Exception('At least 2 players are needed')
+
+    rng = np.random.RandomState(seed)
+    player_ids = np.array(create_players(players))
+    first_id = next_game_id()
+
+    for first in xrange(0, games, chunk_size):
+        n = min(chunk_size, games - first)
+        player1 = rng.randint(players, size=n)
+        player2 = (player1 + rng.randint(1, players, size=n)) % players
+        player1, player2 = player_ids[player1], player_ids[player2]
+        plies = np.where(rng.random_sample(n) < finished, MAX_PLIES,
+                         rng.randint(1, MAX_PLIES, size=n))
+        seconds = rng.randint(days * 24 * 60 * 60, size=n)
+        changed = [start + timedelta(seconds=s) for s in seconds.tolist()]
+
+        played = play_games(n, policy, rng, plies)
+        insert_games(first_id + first, player1, player2, changed, played,
+                     with_moves=with_moves)
+
+        if log is not None:
+            log(first + n)
+    return first_id, first_id + games - 1
@@ -2,3 +2,23 @@
 
 from othello.tests.models import *
 from othello.tests.views import *
+from othello.tests.export import *
+from othello.tests.feed import *
+from othello.tests.polling import *
+from othello.tests.lobby import *
+from othello.tests.stores import *
+from othello.tests.solver import *
+from othello.tests.encoding import *
+from othello.tests.analytics import *
+from othello.tests.batch import *
+from othello.tests.synthetic import *
+from othello.tests.recording import *
+from othello.tests.wthor import *
+from othello.tests.openings import *
+from othello.tests.perft import *
+from othello.tests.tokens import *
+from othello.tests.timings import *
+from othello.tests.metrics import *
+from othello.tests.shards import *
+from othello.tests.history import *
+from othello.tests.profiling import *
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import random
+from django.core.cache import cache
+from django.test.testcases import TestCase
+from django.utils.unittest import skipIf
+from othello.analytics import (CACHE_KEY, cached_report, differentials,
+                               load_moves, mobility, openings, report)
+from othello.batch import np
+from othello.models import BLACK, WHITE, Game
+from othello.tests.utils import create_game, create_player
+
+
+def play_random_game(game, seed):
+    """
+    Plays random moves until `game` finishes. Returns the amount of moves
+    available to the player to move before every move
+    """
+    r = random.Random(seed)
+    available = []
+    while not game.game_finished():
+        player = game.player1 if game.player1_turn else game.player2
+        color = WHITE if game.player1_turn else BLACK
+        moves = list(game.get_possible_moves(color))
+        available.append(len(moves))
+        game.move(player.name, '(%d,%d)' % r.choice(moves))
+    return available
+
+
+@skipIf(np is None, 'NumPy is not installed')
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.john = create_player('john')
+        self.peter = create_player('peter')
+
+    def test_report(self):
+        curves = []
+        for seed in xrange(3):
+            g = create_game(self.john, self.peter, start_it=True)
+            curves.append(play_random_game(g, seed))
+        # Not finished
+        create_game(self.john, self.peter, start_it=True)\
+            .move('peter', '(3,2)')
+
+        result = report()
+        games = list(Game.objects.filter(winner__isnull=False))
+        self.assertEqual(result['games'], 3)
+
+        white = sum(g.board[0] == str(WHITE) for g in games) / 3.0
+        self.assertAlmostEqual(result['heatmap_white'][0][0], white, 4)
+        self.assertAlmostEqual(
+            sum(sum(row) for row in result['heatmap_black']),
+            sum(g.score_player2 for g in games) / 3.0, 2)
+
+        diff = sum(g.score_player1 - g.score_player2 for g in games) / 3.0
+        self.assertEqual(result['players']['john'],
+                         {'games': 3, 'differential': round(diff, 2)})
+        self.assertEqual(result['players']['peter']['differential'],
+                         round(-diff, 2))
+
+        for ply in xrange(5):
+            self.assertAlmostEqual(result['mobility'][ply],
+                                   sum(c[ply] for c in curves) / 3.0, 2)
+        self.assertEqual(len(result['mobility']), max(map(len, curves)))
+        self.assertEqual(sum(o['games'] for o in result['openings']), 3)
+
+    def test_mobility_same_as_game(self):
+        g = create_game(self.john, self.peter, start_it=True)
+        curve = play_random_game(g, 7)
+        squares, colors = load_moves(Game.objects.all())
+        self.assertEqual(mobility(squares, colors), curve)
+
+    def test_openings(self):
+        squares = np.array([[19, 18, 17, 26, 5],
+                            [19, 18, 17, 26, 9],
+                            [37, 45, 53, 44, -1],
+                            [19, 18, -1, -1, -1]])
+        self.assertEqual(openings(squares),
+                         [([19, 18, 17, 26], 2), ([37, 45, 53, 44], 1)])
+
+    def test_differentials(self):
+        ids, games, average = differentials(
+            np.array([1, 2]), np.array([2, 3]), np.array([40, 30]),
+            np.array([24, 34]))
+        self.assertEqual(ids.tolist(), [1, 2, 3])
+        self.assertEqual(games.tolist(), [1, 2, 1])
+        self.assertEqual(average.tolist(), [16, -10, 4])
+
+    def test_no_games(self):
+        result = report()
+        self.assertEqual(result['games'], 0)
+        self.assertEqual(result['openings'], [])
+        self.assertEqual(result['mobility'], [])
+
+    def test_cached_report(self):
+        cache.delete(CACHE_KEY)
+        self.assertEqual(cached_report()['games'], 0)
+        g = create_game(self.john, self.peter, start_it=True)
+        play_random_game(g, 1)
+        self.assertEqual(cached_report()['games'], 0)
+        cache.delete(CACHE_KEY)
+        self.assertEqual(cached_report()['games'], 1)
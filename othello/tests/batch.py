@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from django.test.testcases import TestCase
+from django.utils.unittest import skipIf
+from othello.batch import (all_flips, count, from_boards, generate, np,
+                           to_bitboards, to_boards)
+from othello.models import BLACK, INIT_BOARD, WHITE
+from othello.solver import to_board
+from othello.tests.solver import random_position
+from othello.tests.utils import create_game
+
+
+def random_boards(n):
+    boards = []
+    for seed in xrange(n):
+        own, opp = random_position(60 - seed % 60, seed)
+        boards.append(to_board(own, opp, WHITE))
+    return boards
+
+
+@skipIf(np is None, 'NumPy is not installed')
+class BatchTests(TestCase):
+    def test_same_as_game(self):
+        g = create_game(start_it=True)
+        boards = random_boards(40)
+        for color, player in ((WHITE, 'john'), (BLACK, 'peter')):
+            moves, flipped, discs = generate(boards, color)
+            for i, board in enumerate(boards):
+                g.board = board
+                points = sorted(g.get_possible_moves(color))
+                self.assertEqual([divmod(s, 8) for s in xrange(64)
+                                  if int(moves[i]) >> s & 1], points)
+                self.assertEqual(discs[i].tolist(), [board.count('1'),
+                                                     board.count('2')])
+
+                white, black = to_bitboards([board])
+                for row, column in points:
+                    g.board = board
+                    g.update_board(g._get_matrix(), player, (row, column))
+                    f = flipped[i, row * 8 + column]
+                    move = np.uint64(1 << (row * 8 + column))
+                    if color == WHITE:
+                        after = (white | move | f, black & ~f)
+                    else:
+                        after = (white & ~f, black | move | f)
+                    self.assertEqual(to_boards(*after)[0], g.board)
+                # Invalid moves don't flip anything
+                self.assertEqual(
+                    int((flipped[i] != 0).sum()), len(points))
+
+    def test_board_forms(self):
+        boards = random_boards(5)
+        white, black = from_boards(boards)
+        cells = np.frombuffer(''.join(boards), dtype=np.uint8)\
+            .reshape(-1, 64) - ord('0')
+        expected = generate(boards, BLACK)
+        for form in (cells, np.column_stack((white, black))):
+            result = generate(form, BLACK)
+            for a, b in zip(result, expected):
+                self.assertTrue((a == b).all())
+        self.assertEqual(to_boards(white, black), boards)
+
+    def test_color_by_board(self):
+        moves = generate([INIT_BOARD, INIT_BOARD], [BLACK, WHITE])[0]
+        self.assertEqual(moves.tolist(),
+                         [generate([INIT_BOARD], BLACK)[0][0],
+                          generate([INIT_BOARD], WHITE)[0][0]])
+
+    def test_invalid_shape(self):
+        with self.assertRaises(Exception) as ex:
+            to_bitboards(np.zeros((3, 8)))
+        self.assertEqual(ex.exception.message,
+                         'Invalid boards shape (3, 8). It should be (N, 2) '
+                         'or (N, 64)')
+
+    def test_all_flips(self):
+        white, black = from_boards([INIT_BOARD])
+        flipped = all_flips(black, white)
+        self.assertEqual(np.flatnonzero(flipped[0]).tolist(),
+                         [19, 26, 37, 44])
+        self.assertEqual(count(flipped[0]).sum(), 4)
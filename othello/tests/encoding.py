@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from django.test.testcases import TestCase
+from django.utils import simplejson
+from othello.encoding import (BINARY, JSON, MSGPACK, decode_binary, encode,
+                              msgpack, negotiate, pack_board, unpack_board)
+from othello.models import INIT_BOARD
+from othello.tests import utils
+
+
+class EncodingTests(TestCase):
+    def test_negotiate(self):
+        self.assertEqual(negotiate(''), JSON)
+        self.assertEqual(negotiate('*/*'), JSON)
+        self.assertEqual(negotiate('application/x-othello, */*;q=0.1'),
+                         BINARY)
+        self.assertEqual(negotiate('application/x-msgpack'),
+                         MSGPACK if msgpack is not None else JSON)
+        self.assertEqual(negotiate('text/html, application/*;q=0.9'), JSON)
+        self.assertEqual(negotiate('text/html'), JSON)
+        self.assertEqual(negotiate('text/javascript, text/plain'), JSON)
+        # The highest q wins, whatever the order
+        self.assertEqual(negotiate('application/json;q=0.5, '
+                                   'application/x-othello'), BINARY)
+        self.assertEqual(negotiate('application/x-othello;q=0.2, '
+                                   'application/json;q=0.8'), JSON)
+        self.assertEqual(negotiate('application/x-othello;q=0, */*'), JSON)
+
+    def test_pack_board(self):
+        b = '1111011100210200000122200001200000022200002002000200000000000002'
+        self.assertEqual(len(pack_board(b)), 16)
+        self.assertEqual(unpack_board(pack_board(b)), b)
+        self.assertEqual(unpack_board(pack_board(INIT_BOARD)), INIT_BOARD)
+
+    def test_binary(self):
+        data = {'status': True, 'board': INIT_BOARD}
+        content, content_type = encode(data, BINARY)
+        self.assertEqual(content_type, BINARY)
+        self.assertEqual(len(content), 17)
+        self.assertEqual(decode_binary(content), data)
+
+    def test_binary_error(self):
+        data = {'status': 'failed', 'error': u'Game a-b-1 not found'}
+        content, content_type = encode(data, BINARY)
+        self.assertEqual(decode_binary(content),
+                         {'status': False, 'error': 'Game a-b-1 not found'})
+
+    def test_binary_game(self):
+        content, content_type = encode({'game': 'john-peter-1'}, BINARY)
+        self.assertEqual(decode_binary(content), {'game': 'john-peter-1'})
+
+    def test_binary_unknown_fields(self):
+        content, content_type = encode({'differential': 2}, BINARY)
+        self.assertEqual(content_type, JSON)
+
+    def test_is_turn_view(self):
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/is_turn?game=john-peter-1&player=peter',
+                            HTTP_ACCEPT=BINARY)
+
+        self.assertEqual(r['Content-Type'], BINARY)
+        self.assertEqual(decode_binary(r.content),
+                         {'status': True, 'board': INIT_BOARD})
+
+    def test_other_types_get_json(self):
+        r = self.client.get(path='/get_board?game=a-b-1',
+                            HTTP_ACCEPT='text/html, text/plain')
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['Content-Type'], JSON)
+        self.assertEqual(simplejson.loads(r.content),
+                         {'error': 'Game a-b-1 not found'})
+
+    def test_json_is_the_default(self):
+        r = self.client.get(path='/get_board?game=a-b-1')
+
+        self.assertEqual(r['Content-Type'], JSON)
+        self.assertEqual(simplejson.loads(r.content),
+                         {'error': 'Game a-b-1 not found'})
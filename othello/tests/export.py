@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from django.test.testcases import TestCase
+from django.utils import simplejson
+from othello.export import (CSV, export_games, filter_games, iter_games,
+                            parse_date)
+from othello.models import Game
+from othello.tests.utils import create_game, create_player
+
+
+class ExportGamesTests(TestCase):
+    def test_parse_date(self):
+        self.assertEqual(parse_date('2012-03-04'), datetime(2012, 3, 4))
+        self.assertIsNone(parse_date(''))
+
+    def test_parse_date_invalid(self):
+        with self.assertRaises(Exception) as ex:
+            parse_date('04/03/2012')
+        self.assertEqual(ex.exception.message,
+                         'Invalid date 04/03/2012. It should be: YYYY-MM-DD')
+
+    def test_iter_games_in_chunks(self):
+        john = create_player('john')
+        peter = create_player('peter')
+        for i in xrange(5):
+            g = create_game(john, peter, start_it=True)
+        g.move('peter', '(3,2)')
+
+        games = list(iter_games(Game.objects.all(), chunk_size=2))
+        self.assertEqual([g.id for g, moves in games], [1, 2, 3, 4, 5])
+        self.assertEqual(games[-1][1], [(2, 3, 2)])
+        self.assertEqual(games[0][1], [])
+
+    def test_filter_by_player(self):
+        john = create_player('john')
+        create_game(john, create_player('peter'))
+        create_game(create_player('oscar'), john)
+        create_game(create_player('mary'), create_player('chris'))
+        self.assertEqual(filter_games(player='john').count(), 2)
+
+    def test_filter_by_date(self):
+        create_game(start_it=True)
+        self.assertEqual(filter_games(since=datetime(2000, 1, 1)).count(), 1)
+        self.assertEqual(filter_games(until=datetime(2000, 1, 1)).count(), 0)
+
+    def test_ndjson(self):
+        g = create_game(start_it=True)
+        g.move('peter', '(3,2)')
+        lines = list(export_games(Game.objects.all()))
+        self.assertEqual(len(lines), 1)
+        d = simplejson.loads(lines[0])
+        self.assertEqual(d['game'], 'john-peter-1')
+        self.assertEqual(d['winner'], None)
+        self.assertEqual(d['moves'], [[2, 3, 2]])
+
+    def test_csv(self):
+        create_game()
+        lines = list(export_games(Game.objects.all(), CSV))
+        self.assertEqual(lines[0], 'game,player1,player2,score_player1,'
+                                   'score_player2,winner,board,moves\r\n')
+        self.assertTrue(lines[1].startswith('john-peter-1,john,peter,0,0,,'))
+
+    def test_invalid_format(self):
+        with self.assertRaises(Exception) as ex:
+            export_games(Game.objects.all(), 'xml')
+        self.assertEqual(ex.exception.message,
+                         'Invalid format xml. It should be one of: csv, '
+                         'ndjson')
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from django.test.testcases import TestCase
+from django.utils import simplejson
+from othello.feed import MoveFeed, feed, game_event
+from othello.models import INIT_BOARD, Game
+from othello.tests.utils import create_game
+
+
+def parse_message(message):
+    return simplejson.loads(message.split('data: ', 1)[1])
+
+
+class MoveFeedTests(TestCase):
+    def test_game_event(self):
+        g = create_game(start_it=True)
+        event = game_event(g, (3, 2))
+        self.assertEqual(event['game'], 'john-peter-1')
+        self.assertEqual(event['move'], [3, 2])
+        self.assertEqual(event['board'], INIT_BOARD)
+        self.assertEqual(event['turn'], 'peter')
+        self.assertEqual(event['score_player1'], 2)
+        self.assertEqual(event['score_player2'], 2)
+        self.assertIsNone(event['winner'])
+
+    def test_publish_only_to_the_game_subscribers(self):
+        f = MoveFeed()
+        s1 = f.subscribe('john-peter-1')
+        s2 = f.subscribe('john-peter-2')
+        s_all = f.subscribe()
+        f.publish({'game': 'john-peter-1'})
+        self.assertEqual(s1.get(0), {'game': 'john-peter-1'})
+        self.assertIsNone(s2.get(0))
+        self.assertEqual(s_all.get(0), {'game': 'john-peter-1'})
+
+    def test_slow_subscriber_drops_oldest_events(self):
+        f = MoveFeed()
+        s = f.subscribe(max_pending=2)
+        for i in xrange(5):
+            f.publish({'game': 'john-peter-1', 'move': i})
+        self.assertEqual(s.dropped, 3)
+        self.assertEqual(s.get(0)['move'], 3)
+        self.assertEqual(s.get(0)['move'], 4)
+
+    def test_unsubscribe(self):
+        f = MoveFeed()
+        s = f.subscribe('john-peter-1')
+        s.close()
+        f.publish({'game': 'john-peter-1'})
+        self.assertIsNone(s.get(0))
+
+    def test_stream_move(self):
+        g = create_game(start_it=True)
+        stream = feed.stream('john-peter-1', keepalive=0)
+
+        # The current board is sent first
+        self.assertEqual(parse_message(stream.next())['board'], INIT_BOARD)
+        self.assertEqual(stream.next(), ': keepalive\n\n')
+
+        g.move('peter', '(3,2)')
+        event = parse_message(stream.next())
+        self.assertEqual(event['move'], [3, 2])
+        self.assertEqual(event['turn'], 'john')
+        self.assertEqual(event['score_player2'], 4)
+        stream.close()
+
+    def test_stream_finished_game(self):
+        g = create_game(start_it=True)
+        g.winner = g.player1
+        g.save()
+        stream = feed.stream('john-peter-1')
+        self.assertEqual(parse_message(stream.next())['winner'], 'john')
+        with self.assertRaises(StopIteration):
+            stream.next()
+
+    def test_stream_lost_turns(self):
+        create_game(start_it=True)
+        stream = feed.stream('john-peter-1', keepalive=0, poll=100)
+        stream.next()
+        # Until peter makes 3 invalid moves
+        for player in ('peter', 'john', 'peter', 'john', 'peter'):
+            with self.assertRaises(Exception):
+                Game.objects.move('john-peter-1', player, '(0,0)')
+        turns = [parse_message(stream.next())['turn'] for i in xrange(4)]
+        self.assertEqual(turns, ['john', 'peter', 'john', 'peter'])
+        event = parse_message(stream.next())
+        self.assertEqual(event['winner'], 'john')
+        with self.assertRaises(StopIteration):
+            stream.next()
+
+    def test_stream_changes_of_other_processes(self):
+        g = create_game(start_it=True)
+        stream = feed.stream('john-peter-1', keepalive=100, poll=0)
+        all_games = feed.stream(keepalive=100, poll=0)
+        stream.next()
+        all_games.next()
+        # Saved without sending any signal
+        Game.objects.filter(id=g.id).update(
+            player1_turn=True, timeout_turn_change=datetime.now())
+        self.assertEqual(parse_message(stream.next())['turn'], 'john')
+        self.assertEqual(parse_message(all_games.next())['turn'], 'john')
+        stream.close()
+        all_games.close()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.test.testcases import TestCase
+from othello.history import board_at, replay
+from othello.models import BLACK, INIT_BOARD, WHITE, Move
+from othello.stores import MemoryGameStore, get_store, set_store
+from othello.tests.utils import create_game
+
+
+def play(game, plies):
+    """
+    Plays the first valid move `plies` times, and returns the boards after
+    every move
+    """
+    boards = [game.board]
+    for i in xrange(plies):
+        player = game.player1 if game.player1_turn else game.player2
+        color = WHITE if game.player1_turn else BLACK
+        move = list(game.get_possible_moves(color))[0]
+        game.move(player.name, '(%d,%d)' % move)
+        boards.append(game.board)
+    return boards
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.interval = settings.OTHELLO_SNAPSHOT_INTERVAL
+        settings.OTHELLO_SNAPSHOT_INTERVAL = 4
+
+    def tearDown(self):
+        settings.OTHELLO_SNAPSHOT_INTERVAL = self.interval
+        set_store(None)
+
+    def test_replay(self):
+        self.assertEqual(replay(INIT_BOARD, [(2, 3, 2), (1, 2, 2)]),
+                         '0000000000000000001000000021200000021000'
+                         '000000000000000000000000')
+
+    def test_snapshots(self):
+        g = create_game(start_it=True)
+        boards = play(g, 10)
+        snapshots = list(Move.objects.order_by('id')
+                         .values_list('board', flat=True))
+        self.assertEqual(snapshots, [None, None, None, boards[4],
+                                     None, None, None, boards[8],
+                                     None, None])
+
+    def test_board_at(self):
+        g = create_game(start_it=True)
+        boards = play(g, 10)
+        for ply, board in enumerate(boards):
+            self.assertEqual(board_at(g, ply), board)
+
+        # Less moves than the interval are replayed
+        self.assertEqual(get_store().get_history(g, 7),
+                         (boards[4], 4, list(Move.objects.filter(id__gt=4)
+                          .values_list('color', 'row', 'column')[:3])))
+
+    def test_moves_without_ply(self):
+        g = create_game(start_it=True)
+        boards = play(g, 10)
+        self.assertEqual(list(Move.objects.order_by('id')
+                              .values_list('ply', flat=True)), range(1, 11))
+        # Moves made before the ply was added
+        Move.objects.filter(id__lte=6).update(ply=None)
+        for ply, board in enumerate(boards):
+            self.assertEqual(board_at(g, ply), board)
+        Move.objects.update(ply=None)
+        for ply, board in enumerate(boards):
+            self.assertEqual(board_at(g, ply), board)
+
+    def test_board_at_legacy_sequence(self):
+        g = create_game(start_it=True)
+        boards = play(g, 6)
+        # The game was being played when the sequence was added
+        g.sequence = 2
+        self.assertEqual(board_at(g, 2), boards[2])
+        self.assertEqual(board_at(g, 6), boards[6])
+
+    def test_board_at_without_snapshots(self):
+        set_store(MemoryGameStore())
+        g = get_store().create('john', 'peter')
+        g.start_game()
+        boards = play(g, 6)
+        for ply, board in enumerate(boards):
+            self.assertEqual(board_at(g, ply), board)
+
+    def test_invalid_ply(self):
+        g = create_game(start_it=True)
+        play(g, 2)
+        for ply, message in ((-1, 'Invalid ply -1. It should be 0 or more'),
+                             (3, 'The game john-peter-1 doesn\'t have 3 '
+                                 'moves')):
+            with self.assertRaises(Exception) as ex:
+                board_at(g, ply)
+            self.assertEqual(ex.exception.message, message)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from django.test.testcases import TestCase
+from othello.lobby import Lobby
+from othello.models import Game
+
+
+class LobbyTests(TestCase):
+    def test_match(self):
+        l = Lobby()
+        self.assertIsNone(l.join('john'))
+        self.assertIsNone(l.join('john'))
+        game_id = l.join('peter')
+        self.assertEqual(game_id, 'john-peter-1')
+
+        # The waiting player gets the same game
+        self.assertEqual(l.join('john'), game_id)
+
+        g = Game.objects.get_by_id(game_id)
+        self.assertTrue(g.game_started)
+        self.assertEqual(Game.objects.count(), 1)
+
+    def test_several_matches(self):
+        l = Lobby()
+        l.join('john')
+        l.join('peter')
+        self.assertIsNone(l.join('mary'))
+        self.assertEqual(l.join('chris'), 'mary-chris-2')
+
+    def test_bands(self):
+        l = Lobby()
+        l.join('john', 'a')
+        self.assertIsNone(l.join('peter', 'b'))
+        self.assertEqual(l.join('mary', 'b'), 'peter-mary-1')
+
+    def test_changing_band(self):
+        l = Lobby()
+        l.join('john', 'a')
+        l.join('john', 'b')
+        self.assertEqual(l.stats()['waiting_by_band'], {'b': 1})
+
+    def test_players_that_stopped_waiting_are_dropped(self):
+        l = Lobby(timeout=0)
+        l.join('john')
+        self.assertIsNone(l.join('peter'))
+        self.assertEqual(Game.objects.count(), 0)
+
+    def test_stats(self):
+        l = Lobby()
+        l.join('john')
+        l.join('mary', 'a')
+        stats = l.stats()
+        self.assertEqual(stats['waiting'], 2)
+        self.assertEqual(stats['matched'], 0)
+
+        l.join('peter')
+        stats = l.stats()
+        self.assertEqual(stats['waiting'], 1)
+        self.assertEqual(stats['matched'], 1)
+        self.assertTrue(stats['max_wait'] >= stats['average_wait'] > 0)
+
+    def test_game_is_created_without_the_lock(self):
+        l = Lobby()
+        l.join('john')
+        create_and_start = Game.objects.create_and_start
+        joins = []
+
+        def create(player1, player2):
+            # Other players can join meanwhile, and the waiting player
+            # keeps waiting for its game
+            joins.append((l.join('mary'), l.join('john')))
+            return create_and_start(player1, player2)
+        Game.objects.create_and_start = create
+        try:
+            self.assertEqual(l.join('peter'), 'john-peter-1')
+        finally:
+            del Game.objects.create_and_start
+        self.assertEqual(joins, [(None, None)])
+        self.assertEqual(l.join('john'), 'john-peter-1')
+        self.assertEqual(l.stats()['waiting'], 1)
+
+    def test_matches_expire(self):
+        l = Lobby()
+        l.join('john')
+        l.join('peter')
+        # John never came back for its game
+        l.timeout = 0
+        l.stats()
+        l.timeout = 60
+        self.assertIsNone(l.join('john'))
+        self.assertEqual(l.stats()['waiting'], 1)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import tempfile
+from django.test.testcases import TestCase
+from othello.metrics import BUCKETS, Registry, registry, render
+from othello.tests.analytics import play_random_game
+from othello.tests.utils import create_game, create_player
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_game_metrics(self):
+        g = create_game(start_it=True)
+        moves = len(play_random_game(g, 2))
+        g = create_game(create_player('mary'), create_player('chris'),
+                        start_it=True)
+        with self.assertRaises(Exception):
+            g.move('chris', '(0,0)')
+
+        counters = registry.collect()[0]
+        self.assertEqual(counters[('othello_moves_total', ())], moves)
+        self.assertEqual(counters[('othello_games_started_total', ())], 2)
+        self.assertEqual(counters[('othello_games_finished_total',
+                                   (('reason', 'end'),))], 1)
+        self.assertEqual(counters[('othello_invalid_moves_total',
+                                   (('reason', 'invalid_move'),))], 1)
+
+    def test_render(self):
+        r = Registry()
+        r.inc('othello_moves_total', amount=3)
+        r.observe('othello_request_duration_seconds', 0.01,
+                  (('view', 'move'),))
+        r.observe('othello_request_duration_seconds', 20,
+                  (('view', 'move'),))
+        counters, histograms = r.collect()
+        text = render(counters, histograms,
+                      {('othello_active_games', ()): 2})
+        lines = text.splitlines()
+        self.assertTrue('# TYPE othello_moves_total counter' in lines)
+        self.assertTrue('othello_moves_total 3' in lines)
+        self.assertTrue('othello_active_games 2' in lines)
+        self.assertTrue('othello_request_duration_seconds_bucket'
+                        '{view="move",le="0.005"} 0' in lines)
+        self.assertTrue('othello_request_duration_seconds_bucket'
+                        '{view="move",le="0.01"} 1' in lines)
+        self.assertTrue('othello_request_duration_seconds_bucket'
+                        '{view="move",le="+Inf"} 2' in lines)
+        self.assertTrue('othello_request_duration_seconds_count'
+                        '{view="move"} 2' in lines)
+        self.assertEqual(len([l for l in lines if '_bucket' in l]),
+                         len(BUCKETS) + 1)
+
+    def test_processes(self):
+        path = tempfile.mkdtemp()
+        try:
+            first, second = Registry(path), Registry(path)
+            first.inc('othello_moves_total', amount=2)
+            first.flush()
+            # Another process writing to the same directory
+            second._file = lambda pid: '%s/metrics-0.json' % path
+            second.inc('othello_moves_total')
+            second.observe('othello_request_duration_seconds', 0.2)
+            second.flush()
+
+            counters, histograms = first.collect()
+            self.assertEqual(counters[('othello_moves_total', ())], 3)
+            self.assertEqual(
+                histograms[('othello_request_duration_seconds', ())][-1], 1)
+        finally:
+            shutil.rmtree(path)
+
+    def test_finished_processes(self):
+        path = tempfile.mkdtemp()
+        try:
+            process = subprocess.Popen(['true'])
+            process.wait()
+            first, second = Registry(path), Registry(path)
+            first.inc('othello_moves_total', amount=2)
+            # A process that already exited
+            second._file = lambda pid: first._file(process.pid)
+            second.inc('othello_moves_total')
+            second.observe('othello_request_duration_seconds', 0.2)
+            second.flush()
+
+            # Its metrics are kept in the merged file
+            for i in xrange(2):
+                counters, histograms = first.collect()
+                self.assertEqual(counters[('othello_moves_total', ())], 3)
+                self.assertEqual(
+                    histograms[('othello_request_duration_seconds', ())][-1],
+                    1)
+            self.assertEqual(sorted(os.listdir(path)),
+                             ['metrics-%d.json' % os.getpid(),
+                              'metrics-merged.json', 'metrics.lock'])
+
+            # And added to the ones of the processes that exit later
+            second.flush()
+            counters = first.collect()[0]
+            self.assertEqual(counters[('othello_moves_total', ())], 4)
+        finally:
+            shutil.rmtree(path)
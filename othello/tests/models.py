@@ -2,6 +2,7 @@ from django.test.testcases import TestCase
 import time
 from othello.models import *
 from othello.tests.utils import create_player, create_game
+from django.db import connection
 
 
 class GameTests(TestCase):
@@ -151,6 +152,31 @@ class GameTests(TestCase):
         )
         self.assertTrue(g.player1_turn)
 
+    def test_move_updates_sequence(self):
+        g = self.create()
+        g.move('peter', '(3,2)')
+        g = Game.objects.get(id=1)
+        self.assertEqual(g.sequence, 1)
+        self.assertEqual(g.last_changes, '3233')
+
+    def test_board_delta(self):
+        g = self.create()
+        g.move('peter', '(3,2)')
+        g.move('john', '(2,2)')
+        g = Game.objects.get(id=1)
+        self.assertEqual(g.board_delta(1), {'sequence': 2, 'move': '(2,2)',
+                                            'flipped': ['(3,3)']})
+        self.assertEqual(g.board_delta(2), {'sequence': 2, 'move': None,
+                                            'flipped': []})
+        # Too far behind
+        self.assertEqual(g.board_delta(0), {'sequence': 2,
+                                            'board': g.board})
+
+    def test_board_delta_legacy_game(self):
+        g = self.create(board='0' * 27 + '22200000021' + '0' * 27)
+        self.assertEqual(g.board_delta(0), {'sequence': 0,
+                                            'board': g.board})
+
     def test_move_game_not_started(self):
         g = self.create(start_it=False)
         with self.assertRaises(Exception) as ex:
@@ -337,3 +363,35 @@ class GameManagerTests(TestCase):
 
         # This game already started!
         self.assertEqual(g.game_started, True)
+
+    def test_pending(self):
+        create_game()
+        create_game(create_player('mary'), create_player('chris'),
+                    start_it=True)
+        self.assertEqual([unicode(g) for g in Game.objects.pending()],
+                         ['john-peter-1'])
+
+    def test_active(self):
+        g = create_game(start_it=True)
+        create_game(create_player('mary'), create_player('chris'))
+        self.assertEqual(list(Game.objects.active()), [g])
+        g.winner = g.player1
+        g.save()
+        self.assertEqual(Game.objects.active().count(), 0)
+
+    def test_pending_index_is_used(self):
+        qs = Game.objects.pending().filter(player1__name='john',
+                                           player2__name='peter')
+        sql, params = qs.query.get_compiler(qs.db).as_sql()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertTrue('othello_game_pending' in plan)
+
+    def test_active_index_is_used(self):
+        qs = Game.objects.active()
+        sql, params = qs.query.get_compiler(qs.db).as_sql()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertTrue('othello_game_active' in plan)
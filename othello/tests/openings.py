@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import threading
+from django.conf import settings
+from django.test.testcases import TestCase
+from othello import openings as openings_module
+from othello.models import BLACK, INIT_BOARD, WHITE, Game, get_store
+from othello.openings import (OpeningBook, book, default_color, get_book,
+                              position_key, winner_color)
+from othello.stores import MemoryGameStore
+from othello.tests.analytics import play_random_game
+from othello.tests.utils import create_game, create_player
+
+
+class OpeningBookTests(TestCase):
+    def setUp(self):
+        self.john = create_player('john')
+        self.peter = create_player('peter')
+        book.clear()
+
+    def tearDown(self):
+        book.clear()
+
+    def test_positions_same_as_game(self):
+        g = create_game(self.john, self.peter, start_it=True)
+        play_random_game(g, 3)
+        moves = get_store().get_moves(g)
+        openings = OpeningBook(plies=60)
+        openings.add_games(Game.objects.all())
+        self.assertEqual(openings.games, 1)
+
+        # Replay the game, looking up every position
+        g = create_game(self.john, self.peter, start_it=True)
+        winner = winner_color(Game.objects.get(winner__isnull=False))
+        for color, row, column in moves:
+            stats = openings.lookup(g.board, color)
+            self.assertEqual(stats.keys(), [row * 8 + column])
+            self.assertEqual(stats[row * 8 + column],
+                             [1, int(winner == color), int(winner is None)])
+            player = g.player1 if color == WHITE else g.player2
+            g.move(player.name, '(%d,%d)' % (row, column))
+        self.assertEqual(len(openings.positions), len(moves))
+
+    def test_counts(self):
+        openings = OpeningBook(plies=2)
+        openings.add_game([(BLACK, 2, 3), (WHITE, 2, 2), (BLACK, 2, 1)],
+                          BLACK)
+        openings.add_game([(BLACK, 2, 3), (WHITE, 2, 4)], WHITE)
+        openings.add_game([(BLACK, 2, 3), (WHITE, 2, 2)], None)
+        self.assertEqual(openings.lookup(INIT_BOARD), {19: [3, 1, 1]})
+        board = ('0000000000000000000200000002200000021000'
+                 '000000000000000000000000')
+        self.assertEqual(openings.lookup(board, WHITE),
+                         {18: [2, 0, 1], 20: [1, 1, 0]})
+        self.assertEqual(openings.best_move(board), (2, 2))
+        # Only the first 2 moves are added
+        self.assertEqual(len(openings.positions), 2)
+        self.assertEqual(openings.lookup(board, BLACK), {})
+        self.assertIsNone(openings.best_move(INIT_BOARD, WHITE))
+
+    def test_keys(self):
+        self.assertEqual(default_color(INIT_BOARD), BLACK)
+        self.assertNotEqual(position_key(INIT_BOARD, WHITE),
+                            position_key(INIT_BOARD, BLACK))
+
+    def test_finished_games_are_added(self):
+        self.assertEqual(get_book(wait=True).games, 0)
+        g = create_game(self.john, self.peter, start_it=True)
+        play_random_game(g, 5)
+        self.assertEqual(book.games, 1)
+        self.assertEqual(sum(s[0] for s in book.lookup(INIT_BOARD).values()),
+                         1)
+
+    def test_forfeited_games_are_added(self):
+        get_book(wait=True)
+        g = create_game(self.john, self.peter, start_it=True)
+        g.move('peter', '(2,3)')
+        for i in xrange(3):
+            g.player1_turn = True
+            g.save()
+            with self.assertRaises(Exception):
+                g.move('john', '(0,0)')
+        self.assertTrue(g.game_finished())
+        self.assertEqual(book.games, 1)
+        self.assertEqual(book.lookup(INIT_BOARD), {19: [1, 1, 0]})
+
+    def test_winner_color_of_stored_games(self):
+        g = MemoryGameStore().create('john', 'peter')
+        g.score_player1, g.score_player2 = 20, 44
+        g.winner = g.player2
+        self.assertEqual(winner_color(g), BLACK)
+        g.score_player1, g.score_player2 = 44, 20
+        g.winner = g.player1
+        self.assertEqual(winner_color(g), WHITE)
+
+    def test_save_and_load(self):
+        openings = OpeningBook(plies=4)
+        openings.add_game([(BLACK, 2, 3), (WHITE, 2, 2)], BLACK)
+        f, path = tempfile.mkstemp()
+        os.close(f)
+        try:
+            openings.save(path)
+            loaded = OpeningBook()
+            loaded.load(path)
+        finally:
+            os.remove(path)
+        self.assertTrue(loaded.loaded)
+        self.assertEqual((loaded.plies, loaded.games), (4, 1))
+        self.assertEqual(loaded.positions, openings.positions)
+
+    def test_built_in_a_thread(self):
+        build_book = openings_module._build_book
+        started = threading.Event()
+        built = []
+
+        def build():
+            # The thread can't see the test database
+            started.wait()
+            built.append(True)
+            book.update(OpeningBook())
+        openings_module._build_book = build
+        try:
+            self.assertFalse(get_book().loaded)
+            builder = openings_module._builder
+            self.assertFalse(get_book().loaded)
+            started.set()
+            builder.join()
+        finally:
+            openings_module._build_book = build_book
+        self.assertTrue(get_book().loaded)
+        self.assertEqual(built, [True])
+        self.assertIsNone(openings_module._builder)
+
+    def test_reloaded_when_the_file_changes(self):
+        openings = OpeningBook(plies=4)
+        openings.add_game([(BLACK, 2, 3), (WHITE, 2, 2)], BLACK)
+        f, path = tempfile.mkstemp()
+        os.close(f)
+        old_path = settings.OTHELLO_OPENING_BOOK
+        settings.OTHELLO_OPENING_BOOK = path
+        try:
+            openings.save(path)
+            self.assertEqual(get_book().games, 1)
+            self.assertEqual(get_book().lookup(INIT_BOARD), {19: [1, 1, 0]})
+
+            openings.add_game([(BLACK, 4, 5)], WHITE)
+            openings.save(path)
+            mtime = os.path.getmtime(path) + 10
+            os.utime(path, (mtime, mtime))
+            self.assertEqual(get_book().games, 2)
+            self.assertEqual(get_book().lookup(INIT_BOARD),
+                             {19: [1, 1, 0], 37: [1, 0, 0]})
+        finally:
+            settings.OTHELLO_OPENING_BOOK = old_path
+            os.remove(path)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from django.test.testcases import TestCase
+from othello.batch import np
+from othello.models import BLACK, INIT_BOARD, WHITE
+from othello.perft import (BATCH, BITBOARD, GAME, KNOWN_COUNTS, divide,
+                           perft, root_moves)
+from othello.solver import to_board
+from othello.tests.solver import random_position
+
+
+class PerftTests(TestCase):
+    def test_known_counts(self):
+        engines = [(BITBOARD, 6), (GAME, 4)]
+        if np is not None:
+            engines.append((BATCH, 7))
+        for engine, max_depth in engines:
+            for depth in xrange(1, max_depth + 1):
+                self.assertEqual(perft(depth=depth, engine=engine),
+                                 KNOWN_COUNTS[depth])
+
+    def test_same_count_in_all_engines(self):
+        engines = (BITBOARD, GAME, BATCH) if np is not None \
+            else (BITBOARD, GAME)
+        for seed in xrange(4):
+            # Positions near the end, where players pass and games finish
+            own, opp = random_position(8, seed)
+            board = to_board(own, opp, WHITE)
+            counts = [perft(board, WHITE, 3, engine) for engine in engines]
+            self.assertEqual(len(set(counts)), 1)
+
+    def test_divide(self):
+        counts = divide(depth=5)
+        self.assertEqual([m for m, c in counts],
+                         [(2, 3), (3, 2), (4, 5), (5, 4)])
+        self.assertEqual(sum(c for m, c in counts), KNOWN_COUNTS[5])
+        self.assertEqual(divide(depth=5, processes=2), counts)
+
+    def test_pass(self):
+        # White can't play, and black can
+        board = '01' + '2' * 62
+        self.assertEqual(root_moves(board, WHITE), [(None, board, BLACK)])
+        self.assertEqual(perft(board, WHITE, 1), 1)
+        self.assertEqual(perft(board, WHITE, 2), 1)
+
+    def test_invalid_engine(self):
+        with self.assertRaises(Exception) as ex:
+            perft(INIT_BOARD, BLACK, 2, 'fast')
+        self.assertEqual(ex.exception.message,
+                         'Invalid engine fast. It should be one of: '
+                         'bitboard, batch, game')
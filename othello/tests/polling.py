@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from django.test.testcases import TestCase
+from othello.models import Game
+from othello.polling import IsTurnCache
+from othello.tests.utils import create_game
+
+
+class CountingLoader(object):
+    def __init__(self, result, delay=0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, game_id, player):
+        self.calls += 1
+        time.sleep(self.delay)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class IsTurnCacheTests(TestCase):
+    def test_not_your_turn_is_reused(self):
+        cache = IsTurnCache()
+        load = CountingLoader((False, 'board'))
+        for i in xrange(3):
+            self.assertEqual(cache.is_turn('john-peter-1', 'john', load),
+                             (False, 'board'))
+        self.assertEqual(load.calls, 1)
+
+    def test_your_turn_is_not_reused(self):
+        cache = IsTurnCache()
+        load = CountingLoader((True, 'board'))
+        cache.is_turn('john-peter-1', 'peter', load)
+        cache.is_turn('john-peter-1', 'peter', load)
+        self.assertEqual(load.calls, 2)
+
+    def test_errors_are_not_reused(self):
+        cache = IsTurnCache()
+        load = CountingLoader(Exception('Game john-peter-1 not found'))
+        for i in xrange(2):
+            with self.assertRaises(Exception):
+                cache.is_turn('john-peter-1', 'john', load)
+        self.assertEqual(load.calls, 2)
+
+    def test_expired(self):
+        cache = IsTurnCache(ttl=0)
+        load = CountingLoader((False, 'board'))
+        cache.is_turn('john-peter-1', 'john', load)
+        cache.is_turn('john-peter-1', 'john', load)
+        self.assertEqual(load.calls, 2)
+
+    def test_invalidate(self):
+        cache = IsTurnCache()
+        load = CountingLoader((False, 'board'))
+        cache.is_turn('john-peter-1', 'john', load)
+        cache.invalidate(2)
+        cache.is_turn('john-peter-1', 'john', load)
+        self.assertEqual(load.calls, 1)
+        cache.invalidate(1)
+        cache.is_turn('john-peter-1', 'john', load)
+        self.assertEqual(load.calls, 2)
+
+    def test_invalid_game_id_is_not_cached(self):
+        cache = IsTurnCache()
+        load = CountingLoader((False, 'board'))
+        cache.is_turn('john-peter', 'john', load)
+        cache.is_turn('john-peter', 'john', load)
+        self.assertEqual(load.calls, 2)
+
+    def test_concurrent_polls_share_the_read(self):
+        cache = IsTurnCache()
+        load = CountingLoader((True, 'board'), delay=0.2)
+        results = []
+
+        def poll():
+            results.append(cache.is_turn('john-peter-1', 'peter', load))
+        threads = [threading.Thread(target=poll) for i in xrange(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(load.calls, 1)
+        self.assertEqual(results, [(True, 'board')] * 5)
+
+    def test_game_manager(self):
+        g = create_game(start_it=True)
+        self.assertFalse(Game.objects.is_turn('john-peter-1', 'john')[0])
+        self.assertTrue(Game.objects.is_turn('john-peter-1', 'peter')[0])
+        timeout_is_turn = Game.objects.get(id=1).timeout_is_turn
+        self.assertTrue(Game.objects.is_turn('john-peter-1', 'peter')[0])
+        self.assertEqual(Game.objects.get(id=1).timeout_is_turn,
+                         timeout_is_turn)
+
+        # Once the turn changes, the answer changes too
+        g = Game.objects.get(id=1)
+        g.move('peter', '(3,2)')
+        self.assertTrue(Game.objects.is_turn('john-peter-1', 'john')[0])
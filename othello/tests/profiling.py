@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import cProfile
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.test.testcases import TestCase
+from othello.profiling import Profiles, ProfilingMiddleware
+from othello.tests.utils import create_game
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.rate = settings.OTHELLO_PROFILE_RATE
+        self.header = settings.OTHELLO_PROFILE_HEADER
+
+    def tearDown(self):
+        settings.OTHELLO_PROFILE_RATE = self.rate
+        settings.OTHELLO_PROFILE_HEADER = self.header
+
+    def profile_move(self, profiles, g, player, move):
+        profile = cProfile.Profile()
+        profile.runcall(g.move, player, move)
+        profiles.add('move', profile)
+
+    def test_merged_profiles(self):
+        profiles = Profiles()
+        g = create_game(start_it=True)
+        self.profile_move(profiles, g, 'peter', '(3,2)')
+        methods = profiles.game_methods('move')
+        self.assertEqual(methods['move'][0], 1)
+        self.assertEqual(methods['update_board'][0], 1)
+        self.assertTrue(methods['move'][2] >= methods['update_board'][2])
+
+        self.profile_move(profiles, g, 'john', '(2,2)')
+        self.assertEqual(profiles.views(), ['move'])
+        self.assertEqual(profiles.requests('move'), 2)
+        self.assertEqual(profiles.game_methods()['move'][0], 2)
+
+        report = profiles.report()
+        self.assertTrue(report.startswith('move: 2 requests'))
+        self.assertTrue('Game methods:' in report)
+        self.assertTrue('update_board' in report)
+
+    def test_no_profiles(self):
+        with self.assertRaises(Exception) as ex:
+            Profiles().stats('move')
+        self.assertEqual(ex.exception.message, 'There are no profiles of move')
+
+    def test_disabled(self):
+        settings.OTHELLO_PROFILE_RATE = 0
+        settings.OTHELLO_PROFILE_HEADER = False
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from django.conf import settings
+from django.http import QueryDict
+from django.test.client import Client
+from django.test.testcases import TestCase
+from othello.recording import (ERROR, OK, Call, percentile, read_trace,
+                               replay)
+
+
+class RecordingTests(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        settings.OTHELLO_RECORD_FILE = self.path
+
+    def tearDown(self):
+        settings.OTHELLO_RECORD_FILE = None
+        os.remove(self.path)
+
+    def test_call_line(self):
+        call = Call(1350000000.5, 'GET', 'is_turn',
+                    'game=john-peter-1&player=john', '', 200, ERROR)
+        line = call.to_line()
+        self.assertEqual(line, '1350000000.500\tGET\tis_turn\t'
+                               'game=john-peter-1&player=john\t-\t200\t'
+                               'error\n')
+        parsed = Call.from_line(line)
+        self.assertEqual((parsed.time, parsed.view, parsed.accept,
+                          parsed.status, parsed.result),
+                         (1350000000.5, 'is_turn', '', 200, ERROR))
+
+    def test_invalid_line(self):
+        with self.assertRaises(Exception) as ex:
+            Call.from_line('1350000000.5 GET is_turn\n')
+        self.assertEqual(ex.exception.message,
+                         'Invalid line in the trace: 1350000000.5 GET '
+                         'is_turn')
+
+    def test_record(self):
+        # The middleware is loaded by the first request of a new client
+        client = Client()
+        client.get('/connect', {'p1': 'john', 'p2': 'peter'})
+        client.get('/connect', {'p1': 'john', 'p2': 'peter'})
+        client.get('/get_board', {'game': 'john-peter-1'},
+                   HTTP_ACCEPT='application/x-othello')
+        client.get('/is_turn', {'game': 'john-peter-1', 'player': 'oscar'})
+        client.post('/move', {'game': 'john-peter-1', 'player': 'peter',
+                              'move': '(3,2)'})
+        client.get('/lobby_stats')
+
+        calls = read_trace(self.path)
+        self.assertEqual([c.view for c in calls],
+                         ['connect', 'connect', 'get_board', 'is_turn',
+                          'move'])
+        self.assertEqual([c.result for c in calls],
+                         [OK, OK, OK, ERROR, OK])
+        self.assertEqual(calls[2].accept, 'application/x-othello')
+        self.assertEqual(calls[4].method, 'POST')
+        self.assertEqual(dict(QueryDict(calls[4].params).items()),
+                         {'game': 'john-peter-1', 'player': 'peter',
+                          'move': '(3,2)'})
+
+    def test_replay(self):
+        calls = [
+            Call(10, 'GET', 'connect', 'p1=john&p2=peter'),
+            Call(10.1, 'GET', 'connect', 'p1=john&p2=peter'),
+            Call(10.2, 'GET', 'is_turn', 'game=john-peter-1&player=peter'),
+            Call(10.3, 'POST', 'move',
+                 'game=john-peter-1&player=peter&move=(3,2)'),
+            Call(10.4, 'POST', 'move',
+                 'game=john-peter-1&player=peter&move=(3,2)'),
+        ]
+        result = replay(calls, speed=10)
+        self.assertEqual(result['all']['calls'], 5)
+        self.assertEqual(result['all']['errors'], 1)
+        self.assertEqual(result['all']['mismatches'], 1)
+        self.assertEqual(result['move']['error_rate'], 0.5)
+        self.assertEqual(result['connect']['calls'], 2)
+        self.assertTrue(result['all']['seconds'] >= 0.04)
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 99), 100)
+        self.assertEqual(percentile([], 90), 0)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from StringIO import StringIO
+from django.core.management import call_command
+from django.test.testcases import TestCase
+from othello import shards
+from othello.models import Game, Player
+from othello.shards import (ShardedGameStore, shard_file, shard_of,
+                            shard_of_players, stored_shards)
+from othello.stores import set_store
+from othello.tests.stores import StoreTestsMixin
+from othello.tests.utils import create_game
+
+
+class ShardedGameStoreTests(StoreTestsMixin, TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = ShardedGameStore(self.path, 1)
+        set_store(self.store)
+
+    def tearDown(self):
+        super(ShardedGameStoreTests, self).tearDown()
+        self.store.close()
+        shutil.rmtree(self.path)
+
+
+class ShardsTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = ShardedGameStore(self.path, 3)
+        set_store(self.store)
+
+    def tearDown(self):
+        set_store(None)
+        self.store.close()
+        shutil.rmtree(self.path)
+
+    def test_routing(self):
+        self.assertEqual([shard_of(pk, 3) for pk in xrange(1, 8)],
+                         [0, 1, 2, 0, 1, 2, 0])
+        shard = shard_of_players('john', 'peter', 3)
+        self.assertEqual(shard, shard_of_players('john', 'peter', 3))
+
+        game_id = Game.objects.connect('john', 'peter')
+        self.assertEqual(game_id, 'john-peter-%d' % (shard + 1))
+        self.assertEqual(Game.objects.connect('john', 'peter'), game_id)
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-%d' % (shard + 4))
+        # The players are in the catalog, the games aren't
+        self.assertEqual(sorted(Player.objects.values_list('name',
+                                                           flat=True)),
+                         ['john', 'peter'])
+        self.assertEqual(Game.objects.count(), 0)
+
+    def test_games_between_many_players(self):
+        ids = set()
+        for i in xrange(20):
+            game_id = Game.objects.connect('p%d' % i, 'q%d' % i)
+            Game.objects.connect('p%d' % i, 'q%d' % i)
+            ids.add(int(game_id.split('-')[2]))
+            Game.objects.move(game_id, 'q%d' % i, '(3,2)')
+        self.assertEqual(len(ids), 20)
+        # They are spread over all the shards
+        self.assertEqual(set(shard_of(id, 3) for id in ids), set([0, 1, 2]))
+        for id in ids:
+            g = self.store.get_by_pk(id)
+            self.assertEqual(g.sequence, 1)
+            self.assertEqual(self.store.get_moves(g), [(2, 3, 2)])
+
+    def test_other_shards_are_not_locked(self):
+        game = self.store.get_by_pk(
+            int(Game.objects.connect('john', 'peter').split('-')[2]))
+        shard = shard_of(game.pk, 3)
+        other = self.store.new_game(shard + 2 if shard < 2 else 1,
+                                    'mary', 'chris')
+        locked = threading.Event()
+        release = threading.Event()
+
+        def play():
+            with self.store.lock_by_pk(game.pk):
+                locked.set()
+                release.wait(10)
+            self.store.close()
+        thread = threading.Thread(target=play)
+        thread.start()
+        try:
+            locked.wait(10)
+            self.store.save(other)
+            self.store.add_move(other, 2, 3, 2)
+            db = sqlite3.connect(shard_file(self.path, shard), timeout=0)
+            with self.assertRaises(sqlite3.OperationalError):
+                db.execute('BEGIN IMMEDIATE')
+            db.close()
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(self.store.get_moves(other), [(2, 3, 2)])
+
+    def test_players_are_added_before_locking(self):
+        depths = []
+
+        def get_player_ids(names):
+            depths.append(sum(self.store._local.depth.values()))
+            return get_ids(names)
+        get_ids = shards._get_player_ids
+        shards._get_player_ids = get_player_ids
+        try:
+            Game.objects.connect('john', 'peter')
+            Game.objects.connect('john', 'peter')
+            self.store.create('mary', 'chris')
+        finally:
+            shards._get_player_ids = get_ids
+        self.assertEqual(depths, [0, 0, 0])
+
+    def test_other_amount_of_shards(self):
+        with self.assertRaises(Exception) as ex:
+            ShardedGameStore(self.path, 2)
+        self.assertEqual(ex.exception.message,
+                         'The games in %s are in 3 shards. Run \'python '
+                         'manage.py shard_games --shards 2\' to move them' %
+                         self.path)
+
+
+class ShardGamesTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_shard_games(self):
+        g = create_game(start_it=True)
+        Game.objects.move('john-peter-1', 'peter', '(3,2)')
+        # Waiting for the players
+        create_game(g.player1, g.player2)
+        # The games of the database are moved to 2 shards
+        path = os.path.join(self.path, 'games')
+        call_command('shard_games', path, shards=2, from_database=True,
+                     stdout=StringIO())
+        self.assertEqual(stored_shards(path), 2)
+        store = ShardedGameStore(path, 2)
+        g = store.get('john-peter-1')
+        self.assertTrue(g.game_started)
+        self.assertEqual(g.board, Game.objects.get(id=1).board)
+        self.assertEqual(store.get_moves(g), [(2, 3, 2)])
+        self.assertEqual(store.connect('john', 'peter'), 'john-peter-2')
+        store.close()
+
+        # And then to 3 of them, keeping their ids
+        call_command('shard_games', path, shards=3, stdout=StringIO())
+        self.assertEqual(stored_shards(path), 3)
+        self.assertTrue(os.path.exists(path + '.old'))
+        store = ShardedGameStore(path, 3)
+        self.assertEqual(store.get_moves(store.get('john-peter-1')),
+                         [(2, 3, 2)])
+        self.assertTrue(store.get('john-peter-2').game_started)
+        id = int(store.connect('john', 'peter').split('-')[2])
+        self.assertTrue(id > 2)
+        self.assertEqual(shard_of(id, 3),
+                         shard_of_players('john', 'peter', 3))
+        store.close()
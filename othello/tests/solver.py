@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import random
+from django.test.testcases import TestCase
+from othello.models import BLACK, INIT_BOARD, WHITE, Game
+from othello.solver import (EndgameSolver, adjudicate, count, flips,
+                            legal_moves, play_out, solve, to_bitboards,
+                            to_board, to_point, _play)
+from othello.tests.utils import create_game
+
+
+def random_position(empties, seed):
+    """
+    Returns the bitboards of a random game with `empties` empty squares
+    """
+    r = random.Random(seed)
+    own, opp = to_bitboards(INIT_BOARD, BLACK)
+    while 64 - count(own | opp) > empties:
+        moves = [1 << i for i in xrange(64) if legal_moves(own, opp) >> i & 1]
+        if moves:
+            own, opp = _play(own, opp, r.choice(moves))
+        elif legal_moves(opp, own):
+            own, opp = opp, own
+        else:
+            break
+    return own, opp
+
+
+def minimax(own, opp):
+    moves = legal_moves(own, opp)
+    if not moves:
+        if not legal_moves(opp, own):
+            return count(own) - count(opp)
+        return -minimax(opp, own)
+    return max(-minimax(*_play(own, opp, 1 << i))
+               for i in xrange(64) if moves >> i & 1)
+
+
+class SolverTests(TestCase):
+    def test_bitboards(self):
+        own, opp = to_bitboards(INIT_BOARD, BLACK)
+        self.assertEqual(count(own), 2)
+        self.assertEqual(to_board(own, opp, BLACK), INIT_BOARD)
+
+    def test_legal_moves_same_as_game(self):
+        g = create_game(start_it=True)
+        for seed in xrange(5):
+            own, opp = random_position(30, seed)
+            g.board = to_board(own, opp, WHITE)
+            for color in (WHITE, BLACK):
+                own, opp = to_bitboards(g.board, color)
+                moves = legal_moves(own, opp)
+                self.assertEqual(
+                    sorted(to_point(1 << i) for i in xrange(64)
+                           if moves >> i & 1),
+                    sorted(g.get_possible_moves(color)))
+
+    def test_flips_same_as_game(self):
+        g = create_game(start_it=True)
+        own, opp = random_position(30, 1)
+        g.board = to_board(own, opp, BLACK)
+        moves = legal_moves(own, opp)
+        move = moves & -moves
+        matrix = g._get_matrix()
+        g.update_board(matrix, 'peter', to_point(move))
+        flipped = flips(own, opp, move)
+        self.assertEqual(g.board,
+                         to_board(own | move | flipped, opp & ~flipped,
+                                  BLACK))
+
+    def test_same_as_minimax(self):
+        for seed in xrange(10):
+            own, opp = random_position(7, seed)
+            self.assertEqual(EndgameSolver().value(own, opp),
+                             minimax(own, opp))
+
+    def test_solve(self):
+        b = '0222222122222222222222222222222222222222222222222222222222222222'
+        self.assertEqual(solve(b, WHITE), (-48, (0, 0)))
+        # Black has to pass
+        self.assertEqual(solve(b, BLACK), (48, None))
+
+    def test_solve_in_parallel(self):
+        own, opp = random_position(12, 3)
+        board = to_board(own, opp, BLACK)
+        self.assertEqual(solve(board, BLACK, processes=2),
+                         solve(board, BLACK, processes=1))
+
+    def test_too_many_empties(self):
+        with self.assertRaises(Exception) as ex:
+            solve(INIT_BOARD, BLACK)
+        self.assertEqual(ex.exception.message, 'Too many empty squares to '
+                                               'solve (60). The maximum is 20')
+
+    def test_play_out(self):
+        own, opp = random_position(8, 4)
+        board = play_out(to_board(own, opp, BLACK), BLACK)
+        differential = board.count(str(BLACK)) - board.count(str(WHITE))
+        self.assertEqual(differential, EndgameSolver().value(own, opp))
+
+    def test_adjudicate(self):
+        g = create_game(start_it=True)
+        g.board = '0222222122222222222222222222222222222222222222222222222222' \
+                  '222222'
+        g.player1_turn = True
+        adjudicate(g)
+        g = Game.objects.get(id=1)
+        self.assertEqual(g.winner, g.player2)
+        self.assertEqual((g.score_player1, g.score_player2), (8, 56))
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.core.management.sql import custom_sql_for_model
+from django.db import IntegrityError, connection
+from django.test.testcases import TestCase, TransactionTestCase
+from othello import stores
+from othello.models import Game, INIT_BOARD
+from othello.stores import FileGameStore, MemoryGameStore, set_store
+from othello.tests.utils import create_game
+
+
+class StoreTestsMixin(object):
+    def tearDown(self):
+        set_store(None)
+
+    def test_connect(self):
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-1')
+        self.assertFalse(Game.objects.get_by_id('john-peter-1').game_started)
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-1')
+        self.assertTrue(Game.objects.get_by_id('john-peter-1').game_started)
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-2')
+
+        # Nothing is stored in the database
+        self.assertEqual(Game.objects.count(), 0)
+
+    def test_not_found(self):
+        Game.objects.connect('john', 'peter')
+        for game_id in ('john-peter-2', 'peter-john-1', 'john-peter-x'):
+            with self.assertRaises(Exception) as ex:
+                Game.objects.get_by_id(game_id)
+            self.assertEqual(ex.exception.message,
+                             'Game %s not found' % game_id)
+
+    def test_play(self):
+        game_id = Game.objects.create_and_start('john', 'peter')
+        game_id = unicode(game_id)
+        self.assertFalse(Game.objects.is_turn(game_id, 'john')[0])
+        self.assertEqual(Game.objects.is_turn(game_id, 'peter'),
+                         (True, INIT_BOARD))
+        Game.objects.move(game_id, 'peter', '(3,2)')
+
+        g = Game.objects.get_by_id(game_id)
+        self.assertEqual(
+            g.board,
+            '0000000000000000000000000022200000021000000000000000000000000000'
+        )
+        self.assertTrue(g.player1_turn)
+        self.assertIsNotNone(g.timeout_turn_change)
+        self.assertEqual(self.store.get_moves(g), [(2, 3, 2)])
+
+    def test_get_by_pk(self):
+        g = Game.objects.create_and_start('john', 'peter')
+        self.assertEqual(unicode(self.store.get_by_pk(g.pk)), unicode(g))
+        with self.assertRaises(Exception) as ex:
+            self.store.get_by_pk(g.pk + 1)
+        self.assertEqual(ex.exception.message, 'Game not found')
+
+    def test_winner(self):
+        g = Game.objects.create_and_start('john', 'peter')
+        g.winner = g.player2
+        g.save()
+        g = Game.objects.get_by_id(unicode(g))
+        self.assertTrue(g.game_finished())
+        self.assertEqual(g.winner.name, 'peter')
+
+
+class MemoryGameStoreTests(StoreTestsMixin, TestCase):
+    def setUp(self):
+        self.store = MemoryGameStore()
+        set_store(self.store)
+
+
+class FileGameStoreTests(StoreTestsMixin, TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = FileGameStore(self.path)
+        set_store(self.store)
+
+    def tearDown(self):
+        super(FileGameStoreTests, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def test_shared_between_stores(self):
+        Game.objects.connect('john', 'peter')
+        # Another process using the same directory
+        other = FileGameStore(self.path)
+        self.assertEqual(unicode(other.create('mary', 'chris')),
+                         'mary-chris-2')
+        self.assertEqual(other.get('john-peter-1').player1.name, 'john')
+
+
+class OrmGameStoreTests(TestCase):
+    def setUp(self):
+        self.supports_upsert = stores._supports_upsert
+        self.pending_id = stores._pending_id
+
+    def tearDown(self):
+        stores._supports_upsert = self.supports_upsert
+        stores._pending_id = self.pending_id
+
+    def check_connect(self):
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-1')
+        self.assertFalse(Game.objects.get(id=1).game_started)
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-1')
+        g = Game.objects.get(id=1)
+        self.assertTrue(g.game_started)
+        self.assertTrue(g.timeout_turn_change is not None)
+        self.assertEqual(g.board, INIT_BOARD)
+        self.assertTrue(g.is_turn('peter'))
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-2')
+        self.assertEqual(Game.objects.connect('peter', 'john'),
+                         'peter-john-3')
+        self.assertEqual(Game.objects.pending().count(), 2)
+
+    def test_connect(self):
+        self.check_connect()
+
+    def test_connect_without_upsert(self):
+        stores._supports_upsert = lambda: False
+        self.check_connect()
+
+    def test_connect_after_losing_the_race(self):
+        stores._supports_upsert = lambda: False
+        g = create_game()
+        calls = []
+
+        def pending_id(player1_id, player2_id):
+            calls.append(1)
+            if len(calls) > 1:
+                return self.pending_id(player1_id, player2_id)
+            # The other player starts the game after it's read, and
+            # connects again
+            g.start_game()
+            create_game(g.player1, g.player2)
+            return g.id
+        stores._pending_id = pending_id
+
+        self.assertEqual(Game.objects.connect('john', 'peter'),
+                         'john-peter-2')
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(Game.objects.get(id=2).game_started)
+
+    def test_create_and_start_pending_game(self):
+        Game.objects.connect('john', 'peter')
+        g = Game.objects.create_and_start('john', 'peter')
+        self.assertEqual(unicode(g), 'john-peter-1')
+        self.assertTrue(Game.objects.get(id=1).game_started)
+
+    def test_only_one_pending_game(self):
+        g = create_game()
+        with self.assertRaises(IntegrityError):
+            create_game(g.player1, g.player2)
+
+
+class VendorSqlTests(TestCase):
+    def setUp(self):
+        self.settings_dict = connection.settings_dict
+
+    def tearDown(self):
+        del connection.vendor
+        connection.settings_dict = self.settings_dict
+
+    def use_vendor(self, vendor, engine):
+        connection.vendor = vendor
+        connection.settings_dict = dict(self.settings_dict, ENGINE=engine)
+
+    def check_sql(self, false):
+        condition = '"othello_game"."game_started" = %s' % false
+        self.assertTrue(str(Game.objects.pending().query).endswith(
+            'WHERE %s' % condition))
+        self.assertTrue(' WHERE "game_started" = %s DO UPDATE ' % false in
+                        stores._upsert_sql())
+        statements = custom_sql_for_model(Game, no_style(), connection)
+        self.assertTrue('WHERE "game_started" = %s' % false in
+                        ' '.join(statements))
+        self.assertTrue('"othello_game_active"' in ' '.join(statements))
+
+    def test_sqlite(self):
+        self.use_vendor('sqlite', 'django.db.backends.sqlite3')
+        self.check_sql('0')
+
+    def test_postgresql(self):
+        self.use_vendor('postgresql',
+                        'django.db.backends.postgresql_psycopg2')
+        self.check_sql('false')
+
+    def test_other_databases(self):
+        # The partial indexes are only created where they are supported
+        self.use_vendor('mysql', 'django.db.backends.mysql')
+        self.assertEqual(custom_sql_for_model(Game, no_style(), connection),
+                         [])
+
+
+class CreateIndexesTests(TransactionTestCase):
+    def test_duplicated_games_are_deleted(self):
+        # A database created before the index was unique (the index is
+        # dropped outside of the transaction of the test)
+        connection.cursor().execute('DROP INDEX "othello_game_pending"')
+        g = create_game()
+        create_game(g.player1, g.player2)
+        call_command('create_indexes')
+        self.assertEqual(list(Game.objects.values_list('id', flat=True)),
+                         [1])
+        with self.assertRaises(IntegrityError):
+            create_game(g.player1, g.player2)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from django.db import connection
+from django.test.testcases import TestCase
+from django.utils.unittest import skipIf
+from othello.batch import np
+from othello.models import BLACK, INIT_BOARD, WHITE, Game, Player
+from othello.synthetic import GREEDY, generate_games, play_games
+
+
+@skipIf(np is None, 'NumPy is not installed')
+class SyntheticGamesTests(TestCase):
+    def assertLegal(self, game):
+        """
+        Replays the moves of `game` with the rules of `Game`
+        """
+        replay = Game(player1=game.player1, player2=game.player2)
+        replay.board = INIT_BOARD
+        # Only one game between the players can be waiting for them
+        replay.game_started = True
+        color = BLACK
+        for m in game.moves.all():
+            if not replay._has_any_move_options(color):
+                color = WHITE if color == BLACK else BLACK
+            self.assertEqual(m.color, color)
+            self.assertEqual(m.ply, replay.sequence + 1)
+            self.assertIn((m.row, m.column),
+                          list(replay.get_possible_moves(color)))
+            player = game.player1 if color == WHITE else game.player2
+            replay.update_board(replay._get_matrix(), player.name,
+                                (m.row, m.column))
+            color = WHITE if color == BLACK else BLACK
+        self.assertEqual(replay.board, game.board)
+        self.assertEqual(replay.sequence, game.sequence)
+        self.assertEqual(sorted(replay.last_changes[i:i + 2] for i in
+                                xrange(0, len(replay.last_changes), 2)),
+                         sorted(game.last_changes[i:i + 2] for i in
+                                xrange(0, len(game.last_changes), 2)))
+
+    def test_generate_games(self):
+        first, last = generate_games(30, 5, seed=1, finished=0.5,
+                                     chunk_size=8)
+        self.assertEqual((first, last), (1, 30))
+        self.assertEqual(Player.objects.count(), 5)
+
+        games = Game.objects.all()
+        finished = [g for g in games if g.game_finished()]
+        self.assertTrue(0 < len(finished) < 30)
+        for g in games:
+            self.assertNotEqual(g.player1_id, g.player2_id)
+            self.assertTrue(g.game_started)
+            self.assertLegal(g)
+        for g in finished:
+            self.assertEqual(g.score_player1, g.board.count(str(WHITE)))
+            self.assertEqual(g.score_player2, g.board.count(str(BLACK)))
+            self.assertEqual(len(list(g.get_possible_moves(WHITE))), 0)
+            self.assertEqual(len(list(g.get_possible_moves(BLACK))), 0)
+
+        # Players can play all of the games being played
+        g = Game.objects.active()[0]
+        color = WHITE if g.player1_turn else BLACK
+        self.assertTrue(g._has_any_move_options(color))
+
+    def test_sequence_is_reset(self):
+        calls = []
+        connection.ops.sequence_reset_sql = \
+            lambda style, models: calls.append(models) or []
+        try:
+            generate_games(3, 2, with_moves=False)
+        finally:
+            del connection.ops.sequence_reset_sql
+        self.assertEqual(calls, [[Game]])
+        self.assertEqual(Game.objects.connect('bot1', 'bot2'), 'bot1-bot2-4')
+
+    def test_same_seed_same_games(self):
+        generate_games(10, 3, seed=4, with_moves=False)
+        generate_games(10, 3, seed=4, with_moves=False)
+        boards = list(Game.objects.order_by('id')
+                      .values_list('board', 'player1', 'player2',
+                                   'timeout_turn_change'))
+        self.assertEqual(boards[:10], boards[10:])
+        self.assertEqual(Player.objects.count(), 3)
+
+    def test_greedy(self):
+        rng = np.random.RandomState(0)
+        games = play_games(20, GREEDY, rng)
+        self.assertTrue(games.finished.all())
+        self.assertEqual(games.colors[:, 0].tolist(), [BLACK] * 20)
+        self.assertTrue((games.sequence() > 50).all())
+
+    def test_invalid_policy(self):
+        with self.assertRaises(Exception) as ex:
+            generate_games(1, 2, policy='smart')
+        self.assertEqual(ex.exception.message,
+                         'Invalid policy smart. It should be one of: '
+                         'random, greedy')
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from django.test.testcases import TestCase
+from othello.models import Move
+from othello.timings import BUCKETS, FIELDS, histograms
+from othello.tests.utils import create_game
+
+
+class TimingsTests(TestCase):
+    def test_move_timings(self):
+        g = create_game(start_it=True)
+        g.timeout_turn_change = datetime.now() - timedelta(seconds=5)
+        g.save()
+        g.move('peter', '(3,2)')
+        g.is_turn('john')
+        g.move('john', '(2,2)')
+
+        first, second = Move.objects.order_by('id')
+        self.assertTrue(5000 <= first.think_time < 6000)
+        self.assertIsNone(first.is_turn_time)
+        self.assertTrue(0 <= first.server_time < 1000)
+        self.assertTrue(0 <= second.is_turn_time <= second.think_time)
+
+    def test_histograms(self):
+        g = create_game(start_it=True)
+        for think_time, color in ((5, 2), (20, 1), (20000, 2), (None, 1)):
+            Move.objects.create(game=g, color=color, row=0, column=0,
+                                think_time=think_time, server_time=3)
+
+        result = histograms()
+        self.assertEqual(sorted(result), sorted(FIELDS))
+        think = result['think_time']
+        self.assertEqual(think['moves'], 3)
+        self.assertEqual(think['max_ms'], 20000)
+        self.assertAlmostEqual(think['mean_ms'], 6675.0)
+        counts = dict((b['le'], b['moves']) for b in think['buckets'])
+        self.assertEqual(len(think['buckets']), len(BUCKETS) + 1)
+        self.assertEqual((counts[10], counts[25], counts[30000],
+                          counts[None]), (1, 1, 1, 0))
+        self.assertEqual(result['is_turn_time']['moves'], 0)
+
+        # Peter plays with the black discs
+        peter = histograms('peter')
+        self.assertEqual(peter['think_time']['moves'], 2)
+        self.assertEqual(peter['server_time']['moves'], 2)
+        self.assertEqual(histograms('john')['think_time']['max_ms'], 20)
+
+    def test_player_not_found(self):
+        with self.assertRaises(Exception) as ex:
+            histograms('oscar')
+        self.assertEqual(ex.exception.message, 'Player oscar not found')
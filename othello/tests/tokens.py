@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.test.testcases import TestCase
+from othello.models import BLACK, INIT_BOARD, WHITE, Game
+from othello.polling import is_turn_cache
+from othello.tokens import issue_token, make_token, parse_token
+from othello.tests.utils import create_game
+
+
+class TokenTests(TestCase):
+    def tearDown(self):
+        is_turn_cache.clear()
+
+    def test_parse(self):
+        self.assertEqual(parse_token(make_token(12, BLACK)), (12, BLACK))
+
+    def test_invalid(self):
+        pk, color, signature = make_token(1, WHITE).split('.')
+        for token in ('1.1', '%s.%s.%s' % (pk, BLACK, signature),
+                      '%s.%s.%s' % (2, color, signature), 'x.1.abc'):
+            with self.assertRaises(Exception) as ex:
+                parse_token(token)
+            self.assertEqual(ex.exception.message,
+                             'Invalid token \'%s\'' % token)
+
+        create_game()
+        with self.assertRaises(Exception) as ex:
+            issue_token('john-peter-1', 'oscar')
+        self.assertEqual(ex.exception.message,
+                         'The player oscar is not playing in this game')
+
+    def test_play(self):
+        g = create_game(start_it=True)
+        john, peter = make_token(g.pk, WHITE), make_token(g.pk, BLACK)
+        self.assertEqual(Game.objects.is_turn_by_token(john), (False,
+                                                               INIT_BOARD))
+        self.assertTrue(Game.objects.is_turn_by_token(peter)[0])
+        Game.objects.move_by_token(peter, '(3,2)')
+        self.assertEqual(Game.objects.is_turn_by_token(john, 0),
+                         (True, {'sequence': 1, 'move': '(3,2)',
+                                 'flipped': ['(3,3)']}))
+
+        with self.assertRaises(Exception) as ex:
+            Game.objects.move_by_token(peter, '(2,2)')
+        self.assertEqual(ex.exception.message, 'You must wait for your turn')
+        self.assertEqual(Game.objects.get_by_token(john).board,
+                         Game.objects.get(pk=g.pk).board)
+
+    def test_game_not_found(self):
+        with self.assertRaises(Exception) as ex:
+            Game.objects.is_turn_by_token(make_token(5, WHITE))
+        self.assertEqual(ex.exception.message, 'Game not found')
+
+    def test_issued_once(self):
+        create_game()
+        self.assertEqual(issue_token('john-peter-1', 'john'),
+                         make_token(1, WHITE))
+        with self.assertRaises(Exception) as ex:
+            issue_token('john-peter-1', 'john')
+        self.assertEqual(ex.exception.message,
+                         'The token of john in this game was already given')
+        self.assertEqual(issue_token('john-peter-1', 'peter'),
+                         make_token(1, BLACK))
+        self.assertEqual(Game.objects.get(id=1).issued_tokens, WHITE + BLACK)
+
+
+class RequireTokensTests(TestCase):
+    def setUp(self):
+        settings.OTHELLO_REQUIRE_TOKENS = True
+        self.game = create_game(start_it=True)
+
+    def tearDown(self):
+        settings.OTHELLO_REQUIRE_TOKENS = False
+        is_turn_cache.clear()
+
+    def test_names_without_tokens(self):
+        self.assertTrue(Game.objects.is_turn('john-peter-1', 'peter')[0])
+        Game.objects.move('john-peter-1', 'peter', '(3,2)')
+
+    def test_names_rejected(self):
+        peter = issue_token('john-peter-1', 'peter')
+        message = 'The players of this game have to send their token ' \
+                  'instead of their name'
+        for call in (lambda: Game.objects.is_turn('john-peter-1', 'peter'),
+                     lambda: Game.objects.move('john-peter-1', 'john',
+                                               '(3,2)')):
+            with self.assertRaises(Exception) as ex:
+                call()
+            self.assertEqual(ex.exception.message, message)
+        self.assertEqual(Game.objects.get(id=1).sequence, 0)
+
+        Game.objects.move_by_token(peter, '(3,2)')
+        self.assertEqual(Game.objects.get(id=1).sequence, 1)
@@ -1,8 +1,18 @@
 # -*- coding: utf-8 -*-
+import marshal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import Resolver404, resolve
 from django.test.testcases import TestCase
 from django.utils import simplejson
+from OthelloServer import worker_settings
 from othello.tests import utils
-from othello.models import INIT_BOARD
+from othello.models import INIT_BOARD, Game
+from othello.analytics import CACHE_KEY
+from othello import openings
+from othello.openings import book
+from othello.profiling import profiles
+from othello.tokens import make_token
 
 
 class ConnectTests(TestCase):
@@ -47,6 +57,35 @@ class ConnectTests(TestCase):
         self.assertEqual(d['game'], 'john-peter-1')
 
 
+class ConnectTokenTests(TestCase):
+    def test_token(self):
+        r = self.client.get(path='/connect?p1=john&p2=peter&player=john')
+        d = simplejson.loads(r.content)
+        self.assertEqual(d, {'game': 'john-peter-1',
+                             'token': make_token(1, 1)})
+
+        r = self.client.get(path='/connect?p1=john&p2=peter&player=peter')
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['token'], make_token(1, 2))
+
+    def test_token_of_the_other_player(self):
+        # The first one to connect asks for the token of the other one
+        self.client.get(path='/connect?p1=john&p2=peter&player=peter')
+        r = self.client.get(path='/connect?p1=john&p2=peter&player=peter')
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['error'], 'The token of peter in this game was '
+                                     'already given')
+
+    def test_other_player(self):
+        r = self.client.get(path='/connect?p1=john&p2=peter&player=oscar')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'The player oscar is not playing in this'
+                                     ' game')
+        # The game isn't created
+        self.assertFalse(Game.objects.exists())
+
+
 class GetBoardTests(TestCase):
     def test_POST_returns_error(self):
         r = self.client.post(path='/get_board')
@@ -80,6 +119,42 @@ class GetBoardTests(TestCase):
         self.assertFalse('error' in d)
         self.assertTrue(d['board'], INIT_BOARD)
 
+    def test_since(self):
+        g = utils.create_game(start_it=True)
+        g.move('peter', '(3,2)')
+        r = self.client.get(path='/get_board?game=john-peter-1&since=0')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d, {'sequence': 1, 'move': '(3,2)',
+                             'flipped': ['(3,3)']})
+
+    def test_invalid_since(self):
+        utils.create_game()
+        r = self.client.get(path='/get_board?game=john-peter-1&since=last')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Invalid sequence last. It should be a '
+                                     'number')
+
+    def test_ply(self):
+        g = utils.create_game(start_it=True)
+        g.move('peter', '(3,2)')
+        board = g.board
+        g.move('john', '(2,2)')
+        r = self.client.get(path='/get_board?game=john-peter-1&ply=1')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d, {'board': board})
+
+    def test_ply_not_reached(self):
+        g = utils.create_game(start_it=True)
+        g.move('peter', '(3,2)')
+        r = self.client.get(path='/get_board?game=john-peter-1&ply=3')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'The game john-peter-1 doesn\'t have 3 '
+                                     'moves')
+
 
 class IsTurnTests(TestCase):
     def test_POST_returns_error(self):
@@ -132,6 +207,38 @@ class IsTurnTests(TestCase):
         self.assertTrue(d['status'])
         self.assertFalse('error' in d)
 
+    def test_token(self):
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/is_turn', data={'token': make_token(1, 2)})
+        d = simplejson.loads(r.content)
+
+        self.assertTrue(d['status'])
+        self.assertFalse('error' in d)
+
+    def test_invalid_token(self):
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/is_turn', data={'token': '1.2.abc'})
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Invalid token \'1.2.abc\'')
+
+    def test_since(self):
+        g = utils.create_game(start_it=True)
+        g.move('peter', '(3,2)')
+        r = self.client.get(
+            path='/is_turn?game=john-peter-1&player=john&since=0')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d, {'status': True, 'sequence': 1, 'move': '(3,2)',
+                             'flipped': ['(3,3)']})
+
+        r = self.client.get(
+            path='/is_turn?game=john-peter-1&player=peter&since=1')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d, {'status': False, 'sequence': 1, 'move': None,
+                             'flipped': []})
+
 
 class MoveTests(TestCase):
     def test_GET_returns_error(self):
@@ -165,6 +272,25 @@ class MoveTests(TestCase):
         self.assertEqual(d['error'], 'Game john-peter-3 not found')
         self.assertEqual(d['status'], 'failed')
 
+    def test_token(self):
+        utils.create_game(start_it=True)
+        # John can't move for Peter
+        data = {'token': make_token(1, 1), 'move': '(3,2)'}
+        r = self.client.post(path='/move', data=data)
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['error'], 'You must wait for your turn')
+
+        data = {'token': make_token(1, 2), 'move': '(3,2)'}
+        r = self.client.post(path='/move', data=data)
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['status'], 'succeed')
+
+        r = self.client.get(path='/get_board',
+                            data={'token': make_token(1, 1)})
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['board'], '0000000000000000000000000022200000021'
+                                     '000000000000000000000000000')
+
     def test_ok(self):
         utils.create_game(start_it=True)
         data = {'game': 'john-peter-1',
@@ -175,3 +301,333 @@ class MoveTests(TestCase):
 
         self.assertFalse('error' in d)
         self.assertEqual(d['status'], 'succeed')
+
+
+class ExportTests(TestCase):
+    def test_POST_returns_error(self):
+        r = self.client.post(path='/export')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'GET method should be used instead of '
+                                     'POST')
+
+    def test_invalid_date(self):
+        r = self.client.get(path='/export?since=yesterday')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Invalid date yesterday. It should be: '
+                                     'YYYY-MM-DD')
+
+    def test_ok(self):
+        utils.create_game()
+        r = self.client.get(path='/export?format=csv&player=john')
+
+        self.assertEqual(r['Content-Type'], 'text/csv')
+        self.assertEqual(len(r.content.splitlines()), 2)
+
+
+class AnalyticsViewTests(TestCase):
+    def test_POST_returns_error(self):
+        r = self.client.post(path='/analytics')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'GET method should be used instead of '
+                                     'POST')
+
+    def test_ok(self):
+        cache.delete(CACHE_KEY)
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/analytics')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['games'], 0)
+        self.assertEqual(len(d['heatmap_white']), 8)
+
+
+class TimingsViewTests(TestCase):
+    def test_POST_returns_error(self):
+        r = self.client.post(path='/timings')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'GET method should be used instead of '
+                                     'POST')
+
+    def test_ok(self):
+        g = utils.create_game(start_it=True)
+        g.move('peter', '(3,2)')
+        r = self.client.get(path='/timings', data={'player': 'peter'})
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['think_time']['moves'], 1)
+        self.assertEqual(d['is_turn_time']['moves'], 0)
+
+    def test_player_not_found(self):
+        r = self.client.get(path='/timings', data={'player': 'oscar'})
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Player oscar not found')
+
+
+class MetricsViewTests(TestCase):
+    def test_ok(self):
+        utils.create_game(start_it=True)
+        self.client.get(path='/get_board?game=john-peter-1')
+        r = self.client.get(path='/metrics')
+        lines = r.content.splitlines()
+
+        self.assertTrue(r['Content-Type'].startswith('text/plain'))
+        self.assertTrue('othello_active_games 1' in lines)
+        self.assertTrue([l for l in lines if l.startswith(
+            'othello_request_duration_seconds_count{view="get_board"}')])
+
+
+class ProfileViewTests(TestCase):
+    def setUp(self):
+        self.header = settings.OTHELLO_PROFILE_HEADER
+        settings.OTHELLO_PROFILE_HEADER = True
+        profiles.clear()
+
+    def tearDown(self):
+        settings.OTHELLO_PROFILE_HEADER = self.header
+        profiles.clear()
+
+    def test_disabled(self):
+        settings.OTHELLO_PROFILE_HEADER = False
+        r = self.client.get(path='/profile')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Profiling is disabled. Set '
+                                     'OTHELLO_PROFILE_RATE or '
+                                     'OTHELLO_PROFILE_HEADER')
+
+    def test_ok(self):
+        utils.create_game()
+        self.client.get(path='/get_board?game=john-peter-1')
+        self.client.get(path='/get_board?game=john-peter-1',
+                        HTTP_X_OTHELLO_PROFILE='1')
+        r = self.client.get(path='/profile')
+
+        self.assertEqual(r['Content-Type'], 'text/plain')
+        self.assertTrue(r.content.startswith('get_board: 1 requests'))
+        self.assertTrue('get_by_id' in r.content)
+
+    def test_pstats(self):
+        self.client.get(path='/metrics', HTTP_X_OTHELLO_PROFILE='1')
+        r = self.client.get(path='/profile?view=metrics&format=pstats')
+
+        self.assertEqual(marshal.loads(r.content),
+                         profiles.stats('metrics'))
+
+    def test_no_profiles(self):
+        r = self.client.get(path='/profile?view=move&format=pstats')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'There are no profiles of move')
+
+
+class OpeningTests(TestCase):
+    def tearDown(self):
+        book.clear()
+
+    def test_POST_returns_error(self):
+        r = self.client.post(path='/opening')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'GET method should be used instead of '
+                                     'POST')
+
+    def test_no_board_provided(self):
+        r = self.client.get(path='/opening')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Incorrect parameters. It should be: '
+                                     'board=000...120...')
+
+    def test_invalid_board(self):
+        r = self.client.get(path='/opening', data={'board': '0123'})
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Invalid board. It should have 64 '
+                                     'characters: 0 (empty), 1 (white) or 2 '
+                                     '(black)')
+
+    def test_invalid_color(self):
+        r = self.client.get(path='/opening',
+                            data={'board': INIT_BOARD, 'color': '3'})
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Invalid color 3. It should be 1 (white) '
+                                     'or 2 (black)')
+
+    def test_book_being_built(self):
+        book.clear()
+        start_build = openings._start_build
+        openings._start_build = lambda: None
+        try:
+            r = self.client.get(path='/opening', data={'board': INIT_BOARD})
+        finally:
+            openings._start_build = start_build
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'The opening book is being built. Try '
+                                     'again later')
+
+    def test_ok(self):
+        book.clear()
+        book.loaded = True
+        book.add_game([(2, 2, 3), (1, 2, 2)], 2)
+        book.add_game([(2, 2, 3)], None)
+        book.add_game([(2, 4, 5)], 1)
+        r = self.client.get(path='/opening', data={'board': INIT_BOARD})
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['color'], 2)
+        self.assertEqual(d['games'], 3)
+        self.assertEqual(d['moves'], [
+            {'move': '(2,3)', 'games': 2, 'wins': 1, 'draws': 1,
+             'win_rate': 0.75},
+            {'move': '(4,5)', 'games': 1, 'wins': 0, 'draws': 0,
+             'win_rate': 0.0},
+        ])
+
+        r = self.client.get(path='/opening',
+                            data={'board': INIT_BOARD, 'color': '1'})
+        self.assertEqual(simplejson.loads(r.content)['moves'], [])
+
+
+class WatchTests(TestCase):
+    def test_POST_returns_error(self):
+        r = self.client.post(path='/watch')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'GET method should be used instead of '
+                                     'POST')
+
+    def test_non_existing_game(self):
+        r = self.client.get(path='/watch?game=john-peter-2')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Game john-peter-2 not found')
+
+    def test_ok(self):
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/watch?game=john-peter-1')
+
+        self.assertEqual(r['Content-Type'], 'text/event-stream')
+        self.assertTrue(iter(r).next().startswith('event: move\n'))
+        r.close()
+
+
+class JoinLobbyTests(TestCase):
+    def test_POST_returns_error(self):
+        r = self.client.post(path='/lobby')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'GET method should be used instead of '
+                                     'POST')
+
+    def test_no_player_provided(self):
+        r = self.client.get(path='/lobby')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Incorrect parameters. It should be: '
+                                     'player=juan')
+
+    def test_ok(self):
+        r = self.client.get(path='/lobby?player=john&band=test')
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['status'], 'waiting')
+
+        r = self.client.get(path='/lobby_stats')
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['waiting_by_band']['test'], 1)
+
+        r = self.client.get(path='/lobby?player=peter&band=test')
+        d = simplejson.loads(r.content)
+        self.assertEqual(d['game'], 'john-peter-1')
+        self.assertEqual(d['token'], make_token(1, 2))
+
+
+class WorkerUrlsTests(TestCase):
+    urlconf = 'OthelloServer.worker_urls'
+
+    def test_game_api(self):
+        for path in ('/connect', '/lobby', '/get_board', '/is_turn', '/move'):
+            self.assertTrue(resolve(path, self.urlconf))
+
+    def test_no_admin(self):
+        with self.assertRaises(Resolver404):
+            resolve('/admin/', self.urlconf)
+
+    def test_middleware(self):
+        self.assertTrue('othello.metrics.MetricsMiddleware' in
+                        worker_settings.MIDDLEWARE_CLASSES)
+        self.assertTrue('othello.recording.RecordingMiddleware' in
+                        worker_settings.MIDDLEWARE_CLASSES)
+
+
+class AnalyzeTests(TestCase):
+    def setUp(self):
+        book.clear()
+        book.loaded = True
+
+    def tearDown(self):
+        book.clear()
+
+    def test_no_game_provided(self):
+        r = self.client.get(path='/analyze')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'],
+                         'Incorrect parameters. It should be: '
+                         'game=juan-pedro-1')
+
+    def test_too_many_empties(self):
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/analyze?game=john-peter-1')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['error'], 'Too many empty squares to solve (60). '
+                                     'The maximum is 16')
+
+    def test_book_move(self):
+        book.add_game([(2, 2, 3)], 2)
+        book.add_game([(2, 4, 5)], 1)
+        book.add_game([(2, 4, 5)], 1)
+        utils.create_game(start_it=True)
+        r = self.client.get(path='/analyze?game=john-peter-1')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['turn'], 'peter')
+        self.assertEqual(d['move'], '(4,5)')
+        self.assertIsNone(d['differential'])
+        self.assertIsNone(d['winner'])
+
+    def test_ok(self):
+        g = utils.create_game(start_it=True)
+        g.board = '0222222122222222222222222222222222222222222222222222222222' \
+                  '222222'
+        g.player1_turn = True
+        g.save()
+        r = self.client.get(path='/analyze?game=john-peter-1')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['turn'], 'john')
+        self.assertEqual(d['move'], '(0,0)')
+        self.assertEqual(d['differential'], -48)
+        self.assertEqual(d['winner'], 'peter')
+
+    def test_draw(self):
+        g = utils.create_game(start_it=True)
+        g.board = '02122222111111111111111111111111111112222222222222222222' \
+                  '22222222'
+        g.player1_turn = True
+        g.save()
+        r = self.client.get(path='/analyze?game=john-peter-1')
+        d = simplejson.loads(r.content)
+
+        self.assertEqual(d['turn'], 'john')
+        self.assertEqual(d['move'], '(0,0)')
+        self.assertEqual(d['differential'], 0)
+        # The second player wins on a draw, as when the game finishes
+        self.assertEqual(d['winner'], 'peter')
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+from django.test.testcases import TestCase
+from django.utils.unittest import skipIf
+from othello.batch import np
+from othello.models import Game, Player
+from othello.synthetic import generate_games
+from othello.tests.utils import create_game
+from othello.wthor import (HEADER, RECORD, export_games, import_games,
+                           read_header, read_players, write_header,
+                           write_players)
+
+
+def wthor_file(*games):
+    """
+    Returns a WTHOR games file with the (black, white, moves) `games`
+    """
+    f = StringIO()
+    write_header(f, games=len(games), year=2011)
+    records = np.zeros(len(games), dtype=RECORD)
+    for i, (black, white, moves) in enumerate(games):
+        records[i]['black'] = black
+        records[i]['white'] = white
+        records[i]['moves'][:len(moves)] = moves
+    f.write(records.tostring())
+    f.seek(0)
+    return f
+
+
+@skipIf(np is None, 'NumPy is not installed')
+class WthorTests(TestCase):
+    def test_import(self):
+        players = StringIO()
+        write_players(players, [u'Tamenori', u'Shaman'])
+        players.seek(0)
+        # f5 and c4, d3 and an invalid move, a move outside of the board
+        f = wthor_file((0, 1, [56]), (1, 0, [34, 11]), (0, 1, [99]))
+        self.assertEqual(import_games(f, players, chunk_size=2), (1, 2))
+
+        g = Game.objects.get()
+        self.assertEqual((g.player1.name, g.player2.name),
+                         (u'Shaman', u'Tamenori'))
+        self.assertEqual([(m.color, m.row, m.column) for m in g.moves.all()],
+                         [(2, 4, 5)])
+        self.assertEqual(g.board.count('2'), 4)
+        self.assertTrue(g.game_finished())
+        self.assertEqual(g.winner, g.player2)
+        self.assertEqual(g.timeout_turn_change.year, 2011)
+
+    def test_games_after_importing(self):
+        import_games(wthor_file((3, 7, [56]), (3, 7, [56])))
+        # The new games get the ids after the imported ones
+        self.assertEqual(Game.objects.connect('wthor3', 'wthor7'),
+                         'wthor3-wthor7-3')
+        self.assertEqual(create_game().id, 4)
+
+    def test_import_without_players(self):
+        import_games(wthor_file((3, 7, [56])))
+        self.assertEqual(sorted(Player.objects.values_list('name', flat=True)),
+                         [u'wthor3', u'wthor7'])
+
+    def test_round_trip(self):
+        generate_games(12, 4, seed=2, finished=0.75, chunk_size=5)
+        # A player lost the turn because of a timeout
+        g = create_game(Player.objects.get(name='bot1'),
+                        Player.objects.get(name='bot2'), start_it=True)
+        g.move('bot2', '(3,2)')
+        g.player1_turn = False
+        g.move('bot2', '(5,5)')
+        g.winner = g.player1
+        g.save()
+
+        finished = Game.objects.filter(winner__isnull=False).order_by('id')
+        originals = [(g.player1.name, g.player2.name, g.board,
+                      [(m.color, m.row, m.column) for m in g.moves.all()])
+                     for g in finished]
+        f, players = StringIO(), StringIO()
+        exported, skipped = export_games(Game.objects.all(), f, players,
+                                         chunk_size=4)
+        self.assertEqual((exported, skipped), (len(originals) - 1, 1))
+        self.assertEqual(len(f.getvalue()),
+                         HEADER.size + RECORD.itemsize * exported)
+
+        Game.objects.all().delete()
+        f.seek(0)
+        players.seek(0)
+        header = read_header(f)
+        self.assertEqual(header['games'], exported)
+        f.seek(0)
+        self.assertEqual(import_games(f, players), (exported, 0))
+        imported = [(g.player1.name, g.player2.name, g.board,
+                     [(m.color, m.row, m.column) for m in g.moves.all()])
+                    for g in Game.objects.order_by('id')]
+        self.assertEqual(imported, originals[:-1])
+
+    def test_players(self):
+        f = StringIO()
+        write_players(f, [u'Müller', u'x' * 30])
+        f.seek(0)
+        self.assertEqual(read_players(f), [u'Müller', u'x' * 19])
+
+    def test_invalid_header(self):
+        with self.assertRaises(Exception) as ex:
+            import_games(StringIO('WTHOR'))
+        self.assertEqual(ex.exception.message,
+                         'Invalid WTHOR file: the header is incomplete')
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Histograms of how long the moves took.
+
+Every move of the games kept in the database records (see `Move`):
+
+- think_time: milliseconds since the turn changed. A player loses the turn
+  after TIMEOUT_TURN seconds without calling 'is_turn'.
+- is_turn_time: milliseconds since the player called 'is_turn', if it did.
+  It loses the turn after TIMEOUT_IS_TURN seconds.
+- server_time: milliseconds the server took from the start of the move
+  until the board was saved.
+
+The histograms of the three of them are computed with a single query over
+the moves (of all the players or one of them).
+"""
+from django.db import connection
+from othello.models import BLACK, WHITE, Game, Move, Player
+
+FIELDS = ('think_time', 'is_turn_time', 'server_time')
+# Upper bounds (in milliseconds) of the buckets of the histograms. The
+# last bucket has the slower moves
+BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 15000,
+           30000, 60000)
+
+
+def histograms(player=None):
+    """
+    Returns the histogram of every field in FIELDS, for the moves of
+    `player` (a name) or of all the players:
+
+        {'moves': 120, 'mean_ms': 812.5, 'max_ms': 14020,
+         'buckets': [{'le': 10, 'moves': 3}, ..., {'le': None, 'moves': 0}]}
+
+    Moves without a value (eg. imported ones) aren't counted
+    """
+    qn = connection.ops.quote_name
+    columns = []
+    for field in FIELDS:
+        column = qn(Move._meta.get_field(field).column)
+        for bound in BUCKETS:
+            columns.append('SUM(CASE WHEN %s <= %d THEN 1 ELSE 0 END)' %
+                           (column, bound))
+        columns.extend(['COUNT(%s)' % column, 'AVG(%s)' % column,
+                        'MAX(%s)' % column])
+
+    sql = 'SELECT %s FROM %s' % (', '.join(columns),
+                                 qn(Move._meta.db_table))
+    params = []
+    if player is not None:
+        try:
+            player_id = Player.objects.get(name=player).id
+        except Player.DoesNotExist:
+            raise Exception('Player %s not found' % player)
+        names = {
+            'game': qn(Game._meta.db_table),
+            'id': qn(Game._meta.pk.column),
+            'game_id': qn(Move._meta.get_field('game').column),
+            'color': qn(Move._meta.get_field('color').column),
+            'player1': qn(Game._meta.get_field('player1').column),
+            'player2': qn(Game._meta.get_field('player2').column),
+        }
+        # The moves made with the color of the player in every game
+        sql += (' INNER JOIN %(game)s ON %(game_id)s = %(game)s.%(id)s'
+                ' WHERE (%(color)s = %%s AND %(player1)s = %%s)'
+                ' OR (%(color)s = %%s AND %(player2)s = %%s)') % names
+        params = [WHITE, player_id, BLACK, player_id]
+
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+
+    result = {}
+    size = len(BUCKETS) + 3
+    for i, field in enumerate(FIELDS):
+        values = row[i * size:(i + 1) * size]
+        cumulative = [int(v or 0) for v in values[:len(BUCKETS)]]
+        moves = values[len(BUCKETS)] or 0
+        # Moves in every bucket (and not below it)
+        counts = [c - p for c, p in zip(cumulative + [moves],
+                                        [0] + cumulative)]
+        result[field] = {
+            'moves': moves,
+            'mean_ms': round(values[len(BUCKETS) + 1] or 0, 1),
+            'max_ms': values[len(BUCKETS) + 2] or 0,
+            'buckets': [{'le': bound, 'moves': c} for bound, c in
+                        zip(list(BUCKETS) + [None], counts)],
+        }
+    return result
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Player tokens.
+
+`connect` and `lobby` give every player a token, that can be sent to
+`get_board`, `is_turn` and `move` instead of the game ID and the player
+name. A token has the pk of the game and the color of the player, signed
+with the SECRET_KEY, so it's checked without reading anything and a
+player can't make up the token of the other one:
+
+    <game pk>.<color>.<signature>
+
+Clients shouldn't rely on that format.
+
+The token of every player is only given once (to the call that connects
+it), so the client that connects first can't ask for the token of the
+other player too. With OTHELLO_REQUIRE_TOKENS, once a token of a game is
+given, `is_turn` and `move` only accept the tokens of its players.
+"""
+from django.utils.crypto import constant_time_compare, salted_hmac
+from othello.models import BLACK, WHITE
+from othello.stores import get_store
+
+KEY_SALT = 'othello.tokens'
+# Characters of the signature kept in the token (4 bits each)
+SIGNATURE_LENGTH = 20
+
+
+def _signature(value):
+    return salted_hmac(KEY_SALT, value).hexdigest()[:SIGNATURE_LENGTH]
+
+
+def make_token(game_pk, color):
+    """
+    Returns the token of the player with `color` in the game with the pk
+    `game_pk`
+    """
+    value = '%d.%d' % (game_pk, color)
+    return '%s.%s' % (value, _signature(value))
+
+
+def parse_token(token):
+    """
+    Returns the (game pk, color) of a token
+    """
+    splitted = token.strip().split('.')
+    if len(splitted) != 3 or not splitted[0].isdigit() or \
+            splitted[1] not in (str(WHITE), str(BLACK)) or \
+            not constant_time_compare(
+                str(splitted[2]), _signature('.'.join(splitted[:2]))):
+        raise Exception('Invalid token \'%s\'' % token)
+    return int(splitted[0]), int(splitted[1])
+
+
+def issue_token(game_id, player):
+    """
+    Returns the token of `player` in the game with the ID `game_id`. It
+    can only be asked for once
+    """
+    store = get_store()
+    with store.lock(game_id):
+        game = store.get(game_id)
+        if player == game.player1.name:
+            color = WHITE
+        elif player == game.player2.name:
+            color = BLACK
+        else:
+            raise Exception('The player %s is not playing in this game' %
+                            player)
+        if game.issued_tokens & color:
+            raise Exception('The token of %s in this game was already given'
+                            % player)
+        game.issued_tokens |= color
+        game.save()
+    return make_token(game.pk, color)
@@ -1,84 +1,190 @@
 # Create your views here
 from django.http import HttpResponse
-from django.utils import simplejson
-from othello.models import Game
+from othello.models import Game, WHITE, BLACK
+from othello.export import (CONTENT_TYPES, NDJSON, export_games, filter_games,
+                            parse_date)
+from othello.feed import feed
+from othello.game_views import ajax_response
+from othello.lobby import lobby
+from othello.solver import ANALYZE_MAX_EMPTIES, solve
+from othello.openings import default_color, get_book
+from othello.timings import histograms
+from othello.metrics import registry, render as render_metrics
+from othello.profiling import enabled as profiling_enabled, profiles
 
 
-def connect(request):
+def lobby_stats(request):
+    return ajax_response(**lobby.stats())
+
+
+def analyze(request):
     if request.method != 'GET':
         return ajax_response(error='GET method should be used instead of POST')
-    if not 'p1' in request.GET or not 'p2' in request.GET:
+    if not 'game' in request.GET:
         return ajax_response(
-            error='Incorrect parameters. It should be: p1=juan&p2=pedro'
+            error='Incorrect parameters. It should be: game=juan-pedro-1'
         )
-    p1 = request.GET['p1']
-    p2 = request.GET['p2']
     try:
-        game_id = Game.objects.connect(p1, p2)
+        g = Game.objects.get_by_id(request.GET['game'])
+        if not g.game_started:
+            raise Exception('The game hasn\'t started yet')
+        if g.game_finished():
+            raise Exception('This game already finished')
+
+        color = WHITE if g.player1_turn else BLACK
+        player, other = (g.player1, g.player2) if g.player1_turn \
+            else (g.player2, g.player1)
+        # The positions that can't be solved yet may be in the opening book
+        if g.board.count('0') > ANALYZE_MAX_EMPTIES:
+            book_move = get_book().best_move(g.board, color)
+            if book_move:
+                return ajax_response(turn=player.name,
+                                     move='(%d,%d)' % book_move,
+                                     differential=None, winner=None)
+        differential, best_move = solve(g.board, color,
+                                        max_empties=ANALYZE_MAX_EMPTIES)
     except Exception, e:
         return ajax_response(error=e.message)
 
-    return ajax_response(game=game_id)
+    # Like in Game, the second player wins on a draw
+    if differential > 0 or differential == 0 and player == g.player2:
+        winner = player.name
+    else:
+        winner = other.name
+    return ajax_response(
+        turn=player.name,
+        move='(%d,%d)' % best_move if best_move else None,
+        differential=differential,
+        winner=winner,
+    )
 
 
-def get_board(request):
+def export(request):
     if request.method != 'GET':
         return ajax_response(error='GET method should be used instead of POST')
-    if not 'game' in request.GET:
-        return ajax_response(
-            error='Incorrect parameters. It should be: game=juan-pedro-1'
-        )
+
+    format = request.GET.get('format', NDJSON)
     try:
-        g = Game.objects.get_by_id(request.GET['game'])
+        games = filter_games(since=parse_date(request.GET.get('since')),
+                             until=parse_date(request.GET.get('until')),
+                             player=request.GET.get('player'))
+        lines = export_games(games, format)
     except Exception, e:
         return ajax_response(error=e.message)
 
-    return ajax_response(board=g.board)
+    # The lines are generated while the response is being sent
+    return HttpResponse(lines, mimetype=CONTENT_TYPES[format])
 
 
-def is_turn(request):
+def analytics(request):
     if request.method != 'GET':
         return ajax_response(error='GET method should be used instead of POST')
-    if not 'game' in request.GET or not 'player' in request.GET:
-        return ajax_response(
-            error='Incorrect parameters. It should be: '
-                  'game=juan-pedro-1&player=pedro'
-        )
+    # Imported here because it loads NumPy, which the game workers don't
+    # need
+    from othello.analytics import cached_report
+    try:
+        report = cached_report()
+    except Exception, e:
+        return ajax_response(error=e.message)
+    return ajax_response(**report)
+
 
+def timings(request):
+    if request.method != 'GET':
+        return ajax_response(error='GET method should be used instead of POST')
     try:
-        result = Game.objects.is_turn(request.GET['game'],
-                                      request.GET['player'])
-        return ajax_response(status=result[0], board=result[1])
+        result = histograms(request.GET.get('player') or None)
     except Exception, e:
         return ajax_response(error=e.message)
+    return ajax_response(**result)
 
 
-def move(request):
-    if request.method != 'POST':
-        return ajax_response(error='POST method should be used instead of '
-                                   'GET', status='failed')
-    if not 'game' in request.POST or not 'player' in request.POST \
-            or not 'move' in request.POST:
-        return ajax_response(
-            error='Incorrect parameters. It should be: '
-                  'game=juan-pedro-1&player=juan&move=(x,y)'
-        )
+def metrics(request):
+    counters, observations = registry.collect()
+    gauges = {('othello_active_games', ()): Game.objects.active().count()}
+    return HttpResponse(render_metrics(counters, observations, gauges),
+                        mimetype='text/plain; version=0.0.4')
+
 
+def profile(request):
+    if request.method != 'GET':
+        return ajax_response(error='GET method should be used instead of POST')
+    if not profiling_enabled():
+        return ajax_response(error='Profiling is disabled. Set '
+                                   'OTHELLO_PROFILE_RATE or '
+                                   'OTHELLO_PROFILE_HEADER')
+    view = request.GET.get('view')
     try:
-        Game.objects.move(
-            request.POST['game'],
-            request.POST['player'],
-            request.POST['move']
+        if request.GET.get('format') == 'pstats':
+            if not view:
+                raise Exception('Incorrect parameters. It should be: '
+                                'view=move&format=pstats')
+            response = HttpResponse(profiles.dump(view),
+                                    mimetype='application/octet-stream')
+            response['Content-Disposition'] = \
+                'attachment; filename=%s.prof' % view
+            return response
+        return HttpResponse(profiles.report(view), mimetype='text/plain')
+    except Exception, e:
+        return ajax_response(error=e.message)
+
+
+def opening(request):
+    if request.method != 'GET':
+        return ajax_response(error='GET method should be used instead of POST')
+    if not 'board' in request.GET:
+        return ajax_response(
+            error='Incorrect parameters. It should be: board=000...120...'
         )
-        # If it doesn't throw any exception, then it succeed!
-        return ajax_response(status='succeed')
+    board = request.GET['board']
+    try:
+        if len(board) != 64 or board.strip('012'):
+            raise Exception('Invalid board. It should have 64 characters: '
+                            '0 (empty), 1 (white) or 2 (black)')
+        color = request.GET.get('color')
+        if not color:
+            color = default_color(board)
+        elif color in (str(WHITE), str(BLACK)):
+            color = int(color)
+        else:
+            raise Exception('Invalid color %s. It should be 1 (white) or 2 '
+                            '(black)' % color)
+        openings = get_book()
+        if not openings.loaded:
+            raise Exception('The opening book is being built. Try again '
+                            'later')
+        moves = openings.lookup(board, color)
     except Exception, e:
-        return ajax_response(error=e.message, status='failed')
+        return ajax_response(error=e.message)
+
+    result = []
+    for square, (games, wins, draws) in moves.items():
+        result.append({
+            'move': '(%d,%d)' % divmod(square, 8),
+            'games': games,
+            'wins': wins,
+            'draws': draws,
+            'win_rate': round((wins + draws / 2.0) / games, 4),
+        })
+    result.sort(key=lambda m: (-m['games'], -m['win_rate'], m['move']))
+    return ajax_response(color=color, games=sum(m['games'] for m in result),
+                         moves=result)
+
+
+def watch(request):
+    if request.method != 'GET':
+        return ajax_response(error='GET method should be used instead of POST')
 
+    game_id = None
+    if 'game' in request.GET:
+        try:
+            game_id = unicode(Game.objects.get_by_id(request.GET['game']))
+        except Exception, e:
+            return ajax_response(error=e.message)
 
-def ajax_response(error=None, **kwargs):
-    d = kwargs
-    if error:
-        d['error'] = error
-    response = simplejson.dumps(d)
-    return HttpResponse(response, mimetype='application/json')
+    response = HttpResponse(feed.stream(game_id),
+                            mimetype='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let proxies buffer the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Import and export of games in the WTHOR format, used by the public
+databases of tournament games.
+
+A WTHOR games file (.wtb) has a 16 bytes header followed by a record of 68
+bytes for every game: tournament number, black player number, white player
+number, black discs at the end, theoretical black discs and 60 moves (1
+byte each, `10 * row + column` counting from 1, and 0 after the last one).
+The names of the players are in a separate file (WTHOR.JOU) with the same
+header and 20 bytes for every name.
+
+The records are read and written in chunks of CHUNK_SIZE, so the memory
+used doesn't depend on the amount of games. Every move is checked with the
+rules of the game when importing (see `othello.synthetic.play_games`).
+Tournaments aren't kept.
+"""
+import struct
+from datetime import datetime
+
+from othello import batch
+from othello.batch import check_numpy, np
+from othello.export import iter_games
+from othello.synthetic import (MAX_PLIES, get_player_ids, insert_games,
+                               next_game_id, play_games)
+
+CHUNK_SIZE = 10000
+
+# century, year, month and day of creation, number of records, number of
+# records (of the players and tournaments files), year of the games, board
+# size, type of game, depth of the theoretical scores, reserved
+HEADER = struct.Struct('<BBBBIHHBBBB')
+PLAYER_NAME_SIZE = 20
+
+if np is not None:
+    RECORD = np.dtype([('tournament', '<u2'), ('black', '<u2'),
+                       ('white', '<u2'), ('score', 'u1'),
+                       ('theoretical', 'u1'), ('moves', 'u1', MAX_PLIES)])
+
+
+def read_header(f):
+    data = f.read(HEADER.size)
+    if len(data) != HEADER.size:
+        raise Exception('Invalid WTHOR file: the header is incomplete')
+    (century, year, month, day, games, records, games_year, board_size,
+     game_type, depth, reserved) = HEADER.unpack(data)
+    if board_size not in (0, 8):
+        raise Exception('Only 8x8 boards are supported (this file has '
+                        '%dx%d boards)' % (board_size, board_size))
+    return {'created': (century * 100 + year, month, day), 'games': games,
+            'records': records, 'year': games_year}
+
+
+def write_header(f, games=0, records=0, year=None):
+    today = datetime.now()
+    f.write(HEADER.pack(today.year // 100, today.year % 100, today.month,
+                        today.day, games, records, year or today.year, 8, 0,
+                        0, 0))
+
+
+def read_players(f):
+    """
+    Returns the names of the players in a WTHOR players file
+    """
+    header = read_header(f)
+    names = []
+    for i in xrange(header['records']):
+        name = f.read(PLAYER_NAME_SIZE).split('\0')[0]
+        names.append(name.decode('latin-1').strip())
+    return names
+
+
+def write_players(f, names):
+    write_header(f, records=len(names))
+    for name in names:
+        name = name.encode('latin-1', 'replace')[:PLAYER_NAME_SIZE - 1]
+        f.write(name.ljust(PLAYER_NAME_SIZE, '\0'))
+
+
+def iter_records(f, chunk_size=CHUNK_SIZE):
+    """
+    Yields the records after the header of `f`, as arrays of up to
+    `chunk_size` records
+    """
+    while 1:
+        data = f.read(chunk_size * RECORD.itemsize)
+        if len(data) < RECORD.itemsize:
+            break
+        yield np.frombuffer(data[:len(data) - len(data) % RECORD.itemsize],
+                            dtype=RECORD)
+
+
+def to_squares(moves):
+    """
+    Returns the squares (row * 8 + column) of the WTHOR moves, with -1 after
+    the last one, and whether all the moves were correctly encoded
+    """
+    moves = moves.astype(np.int64)
+    row, column = moves // 10 - 1, moves % 10 - 1
+    ended = np.cumsum(moves == 0, axis=1) > 0
+    on_board = (row >= 0) & (row < 8) & (column >= 0) & (column < 8)
+    squares = np.where(ended, -1, row * 8 + column)
+    encoded = (ended | on_board).all(axis=1)
+    # The games with wrong moves aren't played
+    squares[~encoded] = -1
+    return squares, encoded
+
+
+def to_moves(squares):
+    """
+    The opposite of `to_squares`
+    """
+    row, column = np.divmod(squares, 8)
+    return np.where(squares >= 0, (row + 1) * 10 + column + 1, 0)
+
+
+def import_games(f, players=None, chunk_size=CHUNK_SIZE, with_moves=True,
+                 log=None):
+    """
+    Imports the games in the WTHOR games file `f`, with the names of the
+    players in the WTHOR players file `players` (if not provided, the
+    players are called 'wthor' followed by their number)
+
+    All the games are saved as finished. Returns (imported games, games
+    with invalid moves that weren't imported)
+    """
+    check_numpy()
+    header = read_header(f)
+    names = read_players(players) if players is not None else []
+    year = header['year'] or header['created'][0]
+    changed = datetime(year, 1, 1)
+
+    imported = rejected = 0
+    for records in iter_records(f, chunk_size):
+        squares, encoded = to_squares(records['moves'])
+        played = play_games(len(records), moves=squares)
+        # The moves after the end of the game are invalid too
+        valid = encoded & played.valid & \
+            (played.sequence() == (squares >= 0).sum(axis=1))
+        rejected += int((~valid).sum())
+        records = records[valid]
+        if len(records):
+            games = played.subset(valid)
+            numbers = np.concatenate((records['white'], records['black']))
+            unique = np.unique(numbers)
+            ids = np.array(get_player_ids(
+                [names[n] if n < len(names) and names[n] else
+                 u'wthor%d' % n for n in unique.tolist()]))
+            player1 = ids[np.searchsorted(unique, records['white'])]
+            player2 = ids[np.searchsorted(unique, records['black'])]
+            insert_games(next_game_id(), player1, player2,
+                         [changed] * len(records), games, finish=True,
+                         with_moves=with_moves)
+            imported += len(records)
+        if log is not None:
+            log(imported, rejected)
+    return imported, rejected
+
+
+def _score(white, black):
+    """
+    Returns the black discs at the end of the games, counting the empty
+    squares for the winner (as WTHOR does)
+    """
+    w, b = batch.count(white), batch.count(black)
+    empties = 64 - w - b
+    return np.where(b > w, b + empties,
+                    np.where(b < w, b, b + empties // 2))
+
+
+def export_games(games, f, players=None, chunk_size=CHUNK_SIZE, year=None):
+    """
+    Writes the finished `games` in the WTHOR games file `f`, and the names
+    of their players in the WTHOR players file `players`
+
+    Games with moves that the WTHOR format can't represent (the ones where
+    a player lost the turn without having to pass, because of a timeout or
+    an invalid move) are skipped. Returns (exported games, skipped games)
+    """
+    check_numpy()
+    # The amount of games is written once all of them are written
+    start = f.tell()
+    write_header(f, year=year)
+    numbers = {}
+    exported = skipped = 0
+
+    games = games.filter(winner__isnull=False)
+    for game, moves in _chunks(iter_games(games, chunk_size), chunk_size):
+        squares = np.empty((len(game), MAX_PLIES), dtype=np.int64)
+        squares.fill(-1)
+        colors = squares.copy()
+        for i, game_moves in enumerate(moves):
+            for ply, (color, row, column) in enumerate(game_moves):
+                squares[i, ply] = row * 8 + column
+                colors[i, ply] = color
+        played = play_games(len(game), moves=squares)
+        # The players of the moves must be the ones the rules say
+        valid = played.valid & (played.colors == colors).all(axis=1)
+        skipped += int((~valid).sum())
+
+        records = np.zeros(int(valid.sum()), dtype=RECORD)
+        players1 = [g.player1.name for g, v in zip(game, valid) if v]
+        players2 = [g.player2.name for g, v in zip(game, valid) if v]
+        for name in players1 + players2:
+            numbers.setdefault(name, len(numbers))
+        if len(numbers) > 0xFFFF:
+            raise Exception('WTHOR files can\'t have more than 65535 '
+                            'players')
+        records['white'] = [numbers[n] for n in players1]
+        records['black'] = [numbers[n] for n in players2]
+        records['score'] = records['theoretical'] = \
+            _score(played.white[valid], played.black[valid])
+        records['moves'] = to_moves(squares[valid])
+        f.write(records.tostring())
+        exported += len(records)
+
+    end = f.tell()
+    f.seek(start)
+    write_header(f, games=exported, year=year)
+    f.seek(end)
+    if players is not None:
+        write_players(players, sorted(numbers, key=numbers.get))
+    return exported, skipped
+
+
+def _chunks(games, chunk_size):
+    """
+    Yields the (game, moves) of `games` grouped as (games, moves) lists of
+    up to `chunk_size` games
+    """
+    chunk = []
+    for g in games:
+        chunk.append(g)
+        if len(chunk) == chunk_size:
+            yield zip(*chunk)
+            chunk = []
+    if chunk:
+        yield zip(*chunk)
@@ -73,11 +73,15 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'othello.metrics.MetricsMiddleware',
+    'othello.recording.RecordingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # The last one, so the others see the views it profiles
+    'othello.profiling.ProfilingMiddleware',
 )
 
 ROOT_URLCONF = 'OthelloServer.urls'
@@ -98,3 +102,49 @@ INSTALLED_APPS = (
     # 'django.contrib.admindocs',
     'OthelloServer.othello',
 )
+
+# Where the games are kept (see othello/stores.py). Eg. to share the games
+# between several processes on the same host:
+# OTHELLO_GAME_STORE = 'othello.stores.FileGameStore'
+# OTHELLO_GAME_STORE_OPTIONS = {'path': join(ROOT_PATH, 'games')}
+# or to spread them over 4 SQLite files (see othello/shards.py):
+# OTHELLO_GAME_STORE = 'othello.shards.ShardedGameStore'
+# OTHELLO_GAME_STORE_OPTIONS = {'path': join(ROOT_PATH, 'shards'),
+#                               'shards': 4}
+OTHELLO_GAME_STORE = 'othello.stores.OrmGameStore'
+OTHELLO_GAME_STORE_OPTIONS = {}
+
+# File where the calls to the game API are recorded, to replay them later
+# with 'python manage.py replay_traffic' (see othello/recording.py). Eg.:
+# OTHELLO_RECORD_FILE = join(ROOT_PATH, 'traffic.log')
+OTHELLO_RECORD_FILE = None
+
+# File with the opening book built by 'python manage.py build_openings'
+# (see othello/openings.py). Every process reads it again when it changes.
+# If not set, the book is built from the games in the database, in the
+# background, the first time it's used. Eg.:
+# OTHELLO_OPENING_BOOK = join(ROOT_PATH, 'openings.book')
+OTHELLO_OPENING_BOOK = None
+
+# Directory where every process writes its metrics, so /metrics adds up the
+# ones of all of them (see othello/metrics.py). If not set, /metrics only
+# has the ones of the process that answers it. Eg.:
+# OTHELLO_METRICS_DIR = join(ROOT_PATH, 'metrics')
+OTHELLO_METRICS_DIR = None
+
+# If True, once the tokens of a game are given (see othello/tokens.py) its
+# players can't call 'is_turn' and 'move' with their names anymore
+OTHELLO_REQUIRE_TOKENS = False
+
+# Moves between the boards kept in the log of the games, so the board after
+# any move is rebuilt replaying less moves (see othello/history.py)
+OTHELLO_SNAPSHOT_INTERVAL = 8
+
+# Profiling of the views with cProfile (see othello/profiling.py): the
+# fraction of the requests of every view that are profiled, and whether the
+# requests with an 'X-Othello-Profile' header are. The results are shown by
+# /profile, and written in OTHELLO_PROFILE_DIR (if set) when the process
+# exits. Nothing is done if both are disabled.
+OTHELLO_PROFILE_RATE = 0
+OTHELLO_PROFILE_HEADER = False
+OTHELLO_PROFILE_DIR = None
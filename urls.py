@@ -1,5 +1,8 @@
 from django.conf.urls.defaults import *
-from othello.views import connect, get_board, is_turn, move
+from othello.game_views import (connect, get_board, is_turn, move,
+                                join_lobby)
+from othello.views import (export, watch, lobby_stats, analyze, analytics,
+                           opening, timings, metrics, profile)
 
 # Uncomment the next two lines to enable the admin:
 from django.contrib import admin
@@ -8,9 +11,19 @@ admin.autodiscover()
 urlpatterns = patterns(
     '',
     url(r'^connect', connect, name='connect'),
+    url(r'^lobby_stats', lobby_stats, name='lobby_stats'),
+    url(r'^lobby', join_lobby, name='lobby'),
     url(r'^get_board', get_board, name='get_board'),
     url(r'^is_turn', is_turn, name='is_turn'),
     url(r'^move', move, name='move'),
+    url(r'^analyze', analyze, name='analyze'),
+    url(r'^analytics', analytics, name='analytics'),
+    url(r'^timings', timings, name='timings'),
+    url(r'^metrics', metrics, name='metrics'),
+    url(r'^profile', profile, name='profile'),
+    url(r'^opening', opening, name='opening'),
+    url(r'^export', export, name='export'),
+    url(r'^watch', watch, name='watch'),
     # Example:
     # (r'^OthelloServer/', include('OthelloServer.foo.urls')),
 
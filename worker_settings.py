@@ -0,0 +1,26 @@
+# Django settings for the game workers of OthelloServer.
+#
+# They only load what the game API (othello/game_views.py) needs: no admin,
+# sessions, auth, messages or sites, and only the middleware of the
+# metrics, the recording and the profiling (the last two remove themselves
+# unless they are enabled in settings.py). Run a worker with:
+#
+#     $ python manage.py runserver --settings=OthelloServer.worker_settings
+from settings import *
+
+# Don't keep every SQL query in memory
+DEBUG = False
+TEMPLATE_DEBUG = DEBUG
+
+MIDDLEWARE_CLASSES = (
+    'othello.metrics.MetricsMiddleware',
+    'othello.recording.RecordingMiddleware',
+    # The last one, so the others see the views it profiles
+    'othello.profiling.ProfilingMiddleware',
+)
+
+ROOT_URLCONF = 'OthelloServer.worker_urls'
+
+INSTALLED_APPS = (
+    'OthelloServer.othello',
+)
@@ -0,0 +1,13 @@
+from django.conf.urls.defaults import *
+from othello.game_views import (connect, get_board, is_turn, move,
+                                join_lobby)
+
+# Only the game API. See worker_settings.py
+urlpatterns = patterns(
+    '',
+    url(r'^connect', connect, name='connect'),
+    url(r'^lobby', join_lobby, name='lobby'),
+    url(r'^get_board', get_board, name='get_board'),
+    url(r'^is_turn', is_turn, name='is_turn'),
+    url(r'^move', move, name='move'),
+)